@@ -0,0 +1,690 @@
+#!/usr/bin/env python3
+"""
+Gateway benchmark
+Drives /generate, /vision/analyze and /vision/pipeline at fixed concurrency and
+reports latency percentiles, time to first token and tokens/sec
+
+By default it runs offline: a gateway is started on a free port with the
+stub llama_cpp backend in bench/stub_backend and throwaway GGUF files, so
+the numbers measure the gateway itself (HTTP, scheduling, caches, workers)
+and are comparable between commits on the same machine. --model (and
+--vision-model/--mmproj) benchmark real weights with the installed
+llama-cpp-python instead; --url targets a gateway that is already running.
+
+Results are written as JSON. With --baseline they are compared against a
+stored run: latency/TTFT that grew, or throughput that dropped, by more
+than --tolerance is reported as a regression and the exit status is 1.
+With the stream scenario it also checks that a client closing a stream
+cancels its generation; a failed check exits 1 as well.
+
+Examples:
+    python3 bench/gateway_bench.py --concurrency 1,4,8
+    python3 bench/gateway_bench.py --env INFERENCE_WORKERS=2 --scenarios analyze,pipeline
+    python3 bench/gateway_bench.py --model models/tinyllama.gguf --scenarios generate,stream
+    python3 bench/gateway_bench.py --baseline bench/baseline.json --update-baseline
+"""
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+import http.client
+import json
+import os
+import platform
+import shutil
+import socket
+import struct
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.parse
+import urllib.request
+import zlib
+from pathlib import Path
+from typing import Any, Callable, Dict, List, NamedTuple, Optional
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+GATEWAY_DIR = REPO_ROOT / "gateway"
+STUB_BACKEND_DIR = Path(__file__).resolve().parent / "stub_backend"
+sys.path.insert(0, str(REPO_ROOT / "sdks" / "python"))
+
+from insystem_compute.client import Client, GatewayError  # noqa: E402
+
+SCENARIOS = ("generate", "stream", "analyze", "pipeline")
+TEXT_MODEL = "bench-text"
+VISION_MODEL = "bench-vision"
+
+# (metric path, higher is better) checked against the baseline
+COMPARED_METRICS = (
+    (("latency_ms", "p50"), False),
+    (("latency_ms", "p95"), False),
+    (("latency_ms", "p99"), False),
+    (("ttft_ms", "p50"), False),
+    (("ttft_ms", "p95"), False),
+    (("requests_per_sec",), True),
+    (("throughput_tokens_per_sec",), True),
+)
+
+
+class Sample(NamedTuple):
+    latency_ms: float
+    ttft_ms: Optional[float]
+    tokens: int
+    tokens_per_sec: float  # decode rate reported by the gateway
+
+
+# ---------------------------------------------------------------------------
+# Fixtures: GGUF files, registry and images for an offline gateway
+# ---------------------------------------------------------------------------
+
+def _gguf_string(value: str) -> bytes:
+    data = value.encode("utf-8")
+    return struct.pack("<Q", len(data)) + data
+
+
+def write_stub_gguf(path: Path, arch: str, name: str, n_embd: int = 64, n_layer: int = 2, n_ctx: int = 2048):
+    """
+    Write a small but well-formed GGUF file (one f32 tensor) that passes the
+    gateway's header validation; the stub backend never reads the weights
+    """
+    metadata = [
+        ("general.architecture", 8, _gguf_string(arch)),
+        ("general.name", 8, _gguf_string(name)),
+        ("general.file_type", 4, struct.pack("<I", 0)),
+        (f"{arch}.context_length", 4, struct.pack("<I", n_ctx)),
+        (f"{arch}.block_count", 4, struct.pack("<I", n_layer)),
+        (f"{arch}.embedding_length", 4, struct.pack("<I", n_embd)),
+        (f"{arch}.attention.head_count", 4, struct.pack("<I", 4)),
+    ]
+    shape = (n_embd, 32)
+    header = b"GGUF" + struct.pack("<IQQ", 3, 1, len(metadata))
+    header += b"".join(_gguf_string(key) + struct.pack("<I", value_type) + value for key, value_type, value in metadata)
+    header += _gguf_string("token_embd.weight") + struct.pack("<I", len(shape))
+    header += b"".join(struct.pack("<Q", dim) for dim in shape) + struct.pack("<IQ", 0, 0)
+    padding = -len(header) % 32
+    with open(path, "wb") as f:
+        f.write(header + b"\0" * padding + b"\0" * (shape[0] * shape[1] * 4))
+
+
+def _file_entry(path: Path, registry_dir: Path) -> Dict[str, Any]:
+    return {"filename": path.name, "path": os.path.relpath(path, registry_dir), "format": "gguf"}
+
+
+def build_workspace(workspace: Path, args) -> Path:
+    """
+    Create models/ and hub/registry.json for the benchmark gateway
+
+    Returns:
+        Registry path
+    """
+    models_dir = workspace / "models"
+    hub_dir = workspace / "hub"
+    models_dir.mkdir(parents=True)
+    hub_dir.mkdir()
+
+    if args.model:
+        text_weights = Path(args.model).resolve()
+    else:
+        text_weights = models_dir / "bench-text.gguf"
+        write_stub_gguf(text_weights, "llama", "Bench text model")
+
+    if args.vision_model:
+        vision_weights = Path(args.vision_model).resolve()
+        mmproj = Path(args.mmproj).resolve()
+    else:
+        vision_dir = models_dir / "bench-vision"
+        vision_dir.mkdir()
+        vision_weights = vision_dir / "bench-vision.gguf"
+        mmproj = vision_dir / "mmproj-model-f16.gguf"
+        write_stub_gguf(vision_weights, "llama", "Bench vision model")
+        write_stub_gguf(mmproj, "clip", "Bench CLIP projector")
+
+    cards = [
+        {
+            "id": TEXT_MODEL,
+            "name": "Benchmark text model",
+            "task": "text-generation",
+            "tags": ["gguf", "bench"],
+            "targets": [],
+            "downloads": 0,
+            "files": [_file_entry(text_weights, hub_dir)],
+        },
+        {
+            "id": VISION_MODEL,
+            "name": "Benchmark vision model",
+            "task": "vision",
+            "tags": ["gguf", "vision", "bench"],
+            "targets": [],
+            "downloads": 0,
+            "files": [_file_entry(vision_weights, hub_dir), _file_entry(mmproj, hub_dir)],
+        },
+    ]
+    registry_path = hub_dir / "registry.json"
+    registry_path.write_text(json.dumps(cards, indent=2))
+    return registry_path
+
+
+def make_png(width: int, height: int, seed: int) -> bytes:
+    """A gradient PNG, distinct for every seed (so CLIP cannot reuse an embedding)"""
+    rows = []
+    for y in range(height):
+        row = bytearray([0])  # filter: none
+        for x in range(width):
+            row += bytes(((x * 4 + seed) % 256, (y * 4) % 256, (x + y) % 256))
+        rows.append(bytes(row))
+    # The seed itself goes into the first pixel
+    rows[0] = b"\0" + (seed % (1 << 24)).to_bytes(3, "big") + rows[0][4:]
+
+    def chunk(kind: bytes, data: bytes) -> bytes:
+        return struct.pack(">I", len(data)) + kind + data + struct.pack(">I", zlib.crc32(kind + data))
+
+    ihdr = struct.pack(">IIBBBBB", width, height, 8, 2, 0, 0, 0)
+    return (b"\x89PNG\r\n\x1a\n" + chunk(b"IHDR", ihdr)
+            + chunk(b"IDAT", zlib.compress(b"".join(rows))) + chunk(b"IEND", b""))
+
+
+# ---------------------------------------------------------------------------
+# Gateway process
+# ---------------------------------------------------------------------------
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _get_json(url: str, timeout: float = 2) -> Dict[str, Any]:
+    with urllib.request.urlopen(url, timeout=timeout) as response:
+        return json.loads(response.read())
+
+
+class GatewayProcess:
+    """A gateway (uvicorn) subprocess serving the benchmark registry"""
+
+    def __init__(self, workspace: Path, registry_path: Path, stub: bool, env: Dict[str, str]):
+        self.port = _free_port()
+        self.url = f"http://127.0.0.1:{self.port}"
+        self.log_path = workspace / "gateway.log"
+        self.env = dict(os.environ)
+        self.env.update({
+            "HUB_REGISTRY": str(registry_path),
+            "MODELS_DIR": str(workspace / "models"),
+            "MODEL_INDEX_INTERVAL": "0",
+            # Every request must reach the model
+            "RESPONSE_CACHE_ENTRIES": "0",
+        })
+        if stub:
+            self.env["PYTHONPATH"] = os.pathsep.join(
+                p for p in (str(STUB_BACKEND_DIR), self.env.get("PYTHONPATH")) if p
+            )
+        self.env.update(env)
+        self._process: Optional[subprocess.Popen] = None
+
+    def start(self, timeout: float = 120):
+        """Start uvicorn and wait until startup imports and the first index scan are done"""
+        self._log = open(self.log_path, "wb")
+        self._process = subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "gateway_py:app",
+             "--host", "127.0.0.1", "--port", str(self.port), "--log-level", "warning"],
+            cwd=GATEWAY_DIR, env=self.env, stdout=self._log, stderr=subprocess.STDOUT,
+        )
+        deadline = time.time() + timeout
+        while time.time() < deadline:
+            if self._process.poll() is not None:
+                raise RuntimeError(f"Gateway exited with status {self._process.returncode}:\n{self.log_tail()}")
+            try:
+                startup = _get_json(f"{self.url}/api/v1/startup")
+                health = _get_json(f"{self.url}/api/v1/health")
+                if not startup["warmup"]["running"] and health["indexer"]["scans"] >= 1:
+                    return
+            except (OSError, ValueError, KeyError):
+                pass
+            time.sleep(0.2)
+        raise RuntimeError(f"Gateway not ready after {timeout}s:\n{self.log_tail()}")
+
+    def stop(self):
+        if self._process is not None and self._process.poll() is None:
+            self._process.terminate()
+            try:
+                self._process.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                self._process.kill()
+                self._process.wait()
+        if self._process is not None:
+            self._log.close()
+
+    def log_tail(self, lines: int = 30) -> str:
+        try:
+            return "\n".join(self.log_path.read_text(errors="replace").splitlines()[-lines:])
+        except OSError:
+            return ""
+
+
+# ---------------------------------------------------------------------------
+# Scenarios
+# ---------------------------------------------------------------------------
+
+def _prompt(index: int, words: int) -> str:
+    # Distinct from the first token on, so no request reuses another's prefix
+    filler = " ".join(f"w{(index * 31 + i) % 997}" for i in range(max(0, words - 2)))
+    return f"Request {index}: {filler}"
+
+
+def _check(response: Dict[str, Any]) -> Dict[str, Any]:
+    # The gateway reports failures in the body of a 200 response
+    if response.get("error"):
+        raise GatewayError(str(response["error"]))
+    return response
+
+
+def make_scenarios(client: Client, args, images: List[bytes]) -> Dict[str, Callable[[int], Sample]]:
+    """Request functions by scenario name; each sends request `index` and measures it"""
+
+    def image(index: int) -> bytes:
+        return images[index % len(images)]
+
+    def generate(index: int) -> Sample:
+        start = time.perf_counter()
+        response = _check(client.generate(
+            _prompt(index, args.prompt_words), model=args.text_model, max_tokens=args.max_tokens, cache=False
+        ))
+        latency_ms = (time.perf_counter() - start) * 1000
+        decode_ms = response["latency_breakdown_ms"]["decode"]
+        return Sample(latency_ms, latency_ms - decode_ms, response["usage"]["completion_tokens"],
+                      response["tokens_per_sec"])
+
+    def stream(index: int) -> Sample:
+        start = time.perf_counter()
+        ttft_ms = None
+        with client.stream(_prompt(index, args.prompt_words), model=args.text_model, max_tokens=args.max_tokens) as tokens:
+            for _ in tokens:
+                if ttft_ms is None:
+                    ttft_ms = (time.perf_counter() - start) * 1000
+            done = tokens.done
+        latency_ms = (time.perf_counter() - start) * 1000
+        if done is None:
+            raise GatewayError("stream ended without a done event")
+        return Sample(latency_ms, ttft_ms, done["tokens"], done["tokens_per_sec"])
+
+    def analyze(index: int) -> Sample:
+        start = time.perf_counter()
+        response = _check(client.analyze_image(
+            image(index), prompt="What's in this image?", model=args.vision_model_id, max_tokens=args.max_tokens
+        ))
+        latency_ms = (time.perf_counter() - start) * 1000
+        decode_ms = response["latency_breakdown_ms"]["decode"]
+        return Sample(latency_ms, latency_ms - decode_ms, response["usage"]["completion_tokens"],
+                      response["tokens_per_sec"])
+
+    def pipeline(index: int) -> Sample:
+        start = time.perf_counter()
+        response = _check(client.vision_pipeline(
+            image(index), prompt="Describe what you see", model=args.vision_model_id,
+            max_tokens=args.max_tokens, detector=args.detector,
+        ))
+        latency_ms = (time.perf_counter() - start) * 1000
+        decode_ms = response["latency_ms"].get("decode", 0)
+        return Sample(latency_ms, latency_ms - decode_ms, response["usage"].get("completion_tokens", 0),
+                      response["tokens_per_sec"])
+
+    return {"generate": generate, "stream": stream, "analyze": analyze, "pipeline": pipeline}
+
+
+# ---------------------------------------------------------------------------
+# Measurement
+# ---------------------------------------------------------------------------
+
+def percentile(values: List[float], pct: float) -> Optional[float]:
+    """Linear-interpolated percentile (numpy's default method)"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = (len(ordered) - 1) * pct / 100
+    low = int(rank)
+    high = min(low + 1, len(ordered) - 1)
+    return round(ordered[low] + (ordered[high] - ordered[low]) * (rank - low), 2)
+
+
+def _distribution(values: List[float]) -> Dict[str, Optional[float]]:
+    return {
+        "p50": percentile(values, 50),
+        "p95": percentile(values, 95),
+        "p99": percentile(values, 99),
+        "mean": round(sum(values) / len(values), 2) if values else None,
+        "max": round(max(values), 2) if values else None,
+    }
+
+
+def run_level(
+    request: Callable[[int], Sample], concurrency: int, requests: int, warmup: int, first_index: int = 0
+) -> Dict[str, Any]:
+    """
+    Send `requests` requests keeping `concurrency` in flight (closed loop),
+    after `warmup` sequential requests that are not measured. Requests are
+    numbered from first_index, so no two runs share prompts or images.
+    """
+    for i in range(warmup):
+        try:
+            request(first_index + i)
+        except Exception:
+            pass  # failures show up in the measured run
+
+    samples: List[Sample] = []
+    errors: List[str] = []
+
+    def run(index: int):
+        try:
+            samples.append(request(index))
+        except Exception as e:
+            errors.append(f"{type(e).__name__}: {e}")
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        list(executor.map(run, range(first_index + warmup, first_index + warmup + requests)))
+    wall_seconds = time.perf_counter() - start
+
+    tokens = sum(s.tokens for s in samples)
+    return {
+        "concurrency": concurrency,
+        "requests": requests,
+        "errors": len(errors),
+        "error_sample": errors[0] if errors else None,
+        "wall_seconds": round(wall_seconds, 3),
+        "requests_per_sec": round(len(samples) / wall_seconds, 2),
+        "latency_ms": _distribution([s.latency_ms for s in samples]),
+        "ttft_ms": _distribution([s.ttft_ms for s in samples if s.ttft_ms is not None]),
+        "tokens_per_sec": _distribution([s.tokens_per_sec for s in samples if s.tokens_per_sec]),
+        "throughput_tokens_per_sec": round(tokens / wall_seconds, 1),
+        "completion_tokens": tokens,
+    }
+
+
+# ---------------------------------------------------------------------------
+# Checks
+# ---------------------------------------------------------------------------
+
+def check_stream_disconnect(url: str, model: str, max_tokens: int = 300, read_tokens: int = 3,
+                            timeout: float = 30) -> Dict[str, Any]:
+    """
+    Close a stream after a few tokens and count how many more the model's
+    scheduler decodes: a gateway that notices the disconnect cancels the job
+    within a token or two instead of decoding all max_tokens.
+    """
+    def scheduler() -> Dict[str, Any]:
+        return _get_json(f"{url}/api/v1/health").get("schedulers", {}).get(model, {})
+
+    before = scheduler().get("tokens_generated", 0)
+    parts = urllib.parse.urlsplit(url)
+    conn = http.client.HTTPConnection(parts.hostname, parts.port, timeout=timeout)
+    try:
+        body = json.dumps({"model": model, "prompt": _prompt(10**6, 8), "max_tokens": max_tokens})
+        conn.request("POST", "/api/v1/generate/stream", body, {"Content-Type": "application/json"})
+        response = conn.getresponse()
+        received = 0
+        while received < read_tokens:
+            line = response.readline()
+            if not line:
+                break
+            if line.startswith(b"data:"):
+                received += 1
+    finally:
+        conn.close()
+
+    deadline = time.time() + timeout
+    stats = scheduler()
+    while (stats.get("active_sequences") or stats.get("queue_depth")) and time.time() < deadline:
+        time.sleep(0.1)
+        stats = scheduler()
+    decoded = stats.get("tokens_generated", 0) - before
+    # Allow a few tokens in flight between the last read and the cancellation
+    passed = received == read_tokens and decoded <= read_tokens + 5
+    return {"passed": passed, "tokens_read": received, "tokens_decoded": decoded, "max_tokens": max_tokens}
+
+
+# ---------------------------------------------------------------------------
+# Baseline comparison
+# ---------------------------------------------------------------------------
+
+def _metric(result: Dict[str, Any], path) -> Optional[float]:
+    value: Any = result
+    for key in path:
+        if not isinstance(value, dict):
+            return None
+        value = value.get(key)
+    return value if isinstance(value, (int, float)) else None
+
+
+def compare(report: Dict[str, Any], baseline: Dict[str, Any], tolerance: float, min_delta_ms: float) -> Dict[str, Any]:
+    """
+    Compare a run against a baseline run
+
+    Args:
+        tolerance: Relative change beyond which a metric counts (0.1 = 10%)
+        min_delta_ms: Latency changes smaller than this are noise
+
+    Returns:
+        {"regressions": [...], "improvements": [...], "warnings": [...]}
+    """
+    regressions, improvements, warnings = [], [], []
+    for key in ("backend", "max_tokens", "prompt_words", "requests"):
+        if report["config"].get(key) != baseline.get("config", {}).get(key):
+            warnings.append(
+                f"{key} differs from the baseline ({baseline.get('config', {}).get(key)} -> {report['config'].get(key)})"
+            )
+
+    for name, result in report["results"].items():
+        base = baseline.get("results", {}).get(name)
+        if base is None:
+            warnings.append(f"{name}: not in the baseline")
+            continue
+        if result["errors"] > base.get("errors", 0):
+            regressions.append({"result": name, "metric": "errors", "baseline": base.get("errors", 0),
+                                "current": result["errors"], "change_pct": None})
+        for path, higher_is_better in COMPARED_METRICS:
+            old, new = _metric(base, path), _metric(result, path)
+            if not old or new is None:
+                continue
+            change = (new - old) / old
+            if not higher_is_better and abs(new - old) < min_delta_ms:
+                continue
+            entry = {"result": name, "metric": ".".join(path), "baseline": old, "current": new,
+                     "change_pct": round(change * 100, 1)}
+            worse = change < -tolerance if higher_is_better else change > tolerance
+            better = change > tolerance if higher_is_better else change < -tolerance
+            if worse:
+                regressions.append(entry)
+            elif better:
+                improvements.append(entry)
+    return {"regressions": regressions, "improvements": improvements, "warnings": warnings}
+
+
+# ---------------------------------------------------------------------------
+# CLI
+# ---------------------------------------------------------------------------
+
+def _git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=REPO_ROOT, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _print_results(results: Dict[str, Dict[str, Any]]):
+    print(f"\n{'scenario':<22}{'req/s':>8}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}"
+          f"{'ttft p50':>10}{'tok/s':>9}{'errors':>8}")
+    for name, r in results.items():
+        def fmt(value):
+            return f"{value:.1f}" if isinstance(value, (int, float)) else "-"
+        print(f"{name:<22}{fmt(r['requests_per_sec']):>8}{fmt(r['latency_ms']['p50']):>10}"
+              f"{fmt(r['latency_ms']['p95']):>10}{fmt(r['latency_ms']['p99']):>10}"
+              f"{fmt(r['ttft_ms']['p50']):>10}{fmt(r['throughput_tokens_per_sec']):>9}{r['errors']:>8}")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark gateway latency and throughput under concurrency")
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS),
+                        help=f"Comma-separated subset of {', '.join(SCENARIOS)}")
+    parser.add_argument("--concurrency", default="1,4", help="Comma-separated requests in flight, e.g. 1,4,8")
+    parser.add_argument("--requests", type=int, default=32, help="Measured requests per scenario and concurrency")
+    parser.add_argument("--warmup", type=int, default=2, help="Unmeasured requests before each run")
+    parser.add_argument("--max-tokens", type=int, default=32)
+    parser.add_argument("--prompt-words", type=int, default=64)
+    parser.add_argument("--detector", default="n", help="YOLO variant for the pipeline scenario")
+    parser.add_argument("--image", action="append", default=[],
+                        help="Image file for vision scenarios (repeatable; default: generated PNGs, one per request)")
+    parser.add_argument("--model", help="Real text GGUF (uses the installed llama-cpp-python)")
+    parser.add_argument("--vision-model", help="Real vision GGUF (needs --mmproj)")
+    parser.add_argument("--mmproj", help="CLIP projector GGUF for --vision-model")
+    parser.add_argument("--url", help="Benchmark a running gateway instead of starting one")
+    parser.add_argument("--text-model", default=TEXT_MODEL, help="Text model id (with --url)")
+    parser.add_argument("--vision-model-id", default=VISION_MODEL, help="Vision model id (with --url)")
+    parser.add_argument("--env", action="append", default=[], metavar="KEY=VALUE",
+                        help="Extra gateway environment, e.g. INFERENCE_WORKERS=2 (repeatable)")
+    parser.add_argument("--output", default=str(REPO_ROOT / "bench" / "results.json"), help="Results JSON file")
+    parser.add_argument("--baseline", help="Baseline results JSON to compare against")
+    parser.add_argument("--update-baseline", action="store_true", help="Write this run to --baseline")
+    parser.add_argument("--tolerance", type=float, default=0.10, help="Relative change flagged (default 0.10)")
+    parser.add_argument("--min-delta-ms", type=float, default=5.0, help="Ignore latency changes below this")
+    parser.add_argument("--keep-workspace", action="store_true", help="Keep the temporary models/registry/log")
+    args = parser.parse_args(argv)
+
+    if args.vision_model and not args.mmproj:
+        parser.error("--vision-model needs --mmproj")
+    if args.update_baseline and not args.baseline:
+        parser.error("--update-baseline needs --baseline")
+    args.scenario_list = [s.strip() for s in args.scenarios.split(",") if s.strip()]
+    unknown = set(args.scenario_list) - set(SCENARIOS)
+    if unknown:
+        parser.error(f"unknown scenarios: {', '.join(sorted(unknown))}")
+    args.concurrency_levels = [int(c) for c in args.concurrency.split(",") if c.strip()]
+    try:
+        args.gateway_env = dict(item.split("=", 1) for item in args.env)
+    except ValueError:
+        parser.error("--env takes KEY=VALUE")
+    return args
+
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+    real = bool(args.model or args.vision_model)
+    backend = "remote" if args.url else ("llama_cpp" if real else "stub")
+    scenarios = list(args.scenario_list)
+    if backend == "llama_cpp" and not args.vision_model:
+        # Without real vision weights only the text scenarios can run
+        scenarios = [s for s in scenarios if s in ("generate", "stream")]
+    if backend == "llama_cpp" and not args.model:
+        scenarios = [s for s in scenarios if s in ("analyze", "pipeline")]
+
+    runs = len(scenarios) * len(args.concurrency_levels)
+    images = [Path(p).read_bytes() for p in args.image] or [
+        make_png(96, 96, seed) for seed in range(max(1, runs * (args.requests + args.warmup)))
+    ]
+
+    workspace = None
+    gateway = None
+    try:
+        if args.url:
+            url = args.url
+        else:
+            workspace = Path(tempfile.mkdtemp(prefix="insystem-bench-"))
+            registry_path = build_workspace(workspace, args)
+            gateway = GatewayProcess(workspace, registry_path, stub=not real, env=args.gateway_env)
+            print(f"🚀 Starting gateway ({backend} backend) on {gateway.url}")
+            gateway.start()
+            url = gateway.url
+
+        max_concurrency = max(args.concurrency_levels)
+        results: Dict[str, Dict[str, Any]] = {}
+        with Client(url, max_connections=max_concurrency, retries=0) as client:
+            requests = make_scenarios(client, args, images)
+            first_index = 0
+            for scenario in scenarios:
+                for concurrency in args.concurrency_levels:
+                    name = f"{scenario}@c{concurrency}"
+                    print(f"⏱️  {name}: {args.requests} requests")
+                    result = run_level(requests[scenario], concurrency, args.requests, args.warmup, first_index)
+                    first_index += args.warmup + args.requests
+                    results[name] = {"scenario": scenario, **result}
+                    if result["errors"]:
+                        print(f"⚠️ {name}: {result['errors']} errors, e.g. {result['error_sample']}")
+            checks: Dict[str, Dict[str, Any]] = {}
+            if "stream" in scenarios:
+                print("⏱️  stream disconnect check")
+                checks["stream_disconnect"] = check_stream_disconnect(url, args.text_model)
+            server = client.health()
+    finally:
+        if gateway is not None:
+            gateway.stop()
+        if workspace is not None:
+            if args.keep_workspace:
+                print(f"📁 Workspace kept at {workspace}")
+            else:
+                shutil.rmtree(workspace, ignore_errors=True)
+
+    report = {
+        "created_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "git_commit": _git_commit(),
+        "host": {"platform": platform.platform(), "python": platform.python_version(), "cpu_count": os.cpu_count()},
+        "config": {
+            "backend": backend,
+            "url": args.url,
+            "models": {"text": args.model, "vision": args.vision_model, "mmproj": args.mmproj},
+            "gateway_env": args.gateway_env,
+            "concurrency": args.concurrency_levels,
+            "requests": args.requests,
+            "warmup": args.warmup,
+            "max_tokens": args.max_tokens,
+            "prompt_words": args.prompt_words,
+            "images": len(images),
+        },
+        "gateway": {
+            "model_pool": server.get("model_pool"),
+            "schedulers": server.get("schedulers"),
+            "clip_cache": server.get("clip_cache"),
+            "inference_workers": server.get("inference_workers"),
+        },
+        "results": results,
+        "checks": checks,
+    }
+    _print_results(results)
+
+    exit_code = 0
+    for name, check in checks.items():
+        if check["passed"]:
+            print(f"✅ Check {name} passed: {check}")
+        else:
+            print(f"❌ Check {name} failed: {check}")
+            exit_code = 1
+    if args.baseline:
+        baseline_path = Path(args.baseline)
+        if baseline_path.exists():
+            comparison = compare(report, json.loads(baseline_path.read_text()), args.tolerance, args.min_delta_ms)
+            comparison["baseline"] = str(baseline_path)
+            report["comparison"] = comparison
+            for warning in comparison["warnings"]:
+                print(f"⚠️ {warning}")
+            for entry in comparison["improvements"]:
+                print(f"✅ {entry['result']} {entry['metric']}: {entry['baseline']} -> {entry['current']} ({entry['change_pct']:+}%)")
+            for entry in comparison["regressions"]:
+                change = f" ({entry['change_pct']:+}%)" if entry["change_pct"] is not None else ""
+                print(f"❌ Regression {entry['result']} {entry['metric']}: {entry['baseline']} -> {entry['current']}{change}")
+            if comparison["regressions"] and not args.update_baseline:
+                exit_code = 1
+        elif not args.update_baseline:
+            print(f"⚠️ Baseline {baseline_path} not found; run with --update-baseline to create it")
+        if args.update_baseline:
+            baseline_path.parent.mkdir(parents=True, exist_ok=True)
+            baseline_path.write_text(json.dumps({k: v for k, v in report.items() if k != "comparison"}, indent=2))
+            print(f"✅ Baseline written to {baseline_path}")
+
+    output = Path(args.output)
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(report, indent=2))
+    print(f"✅ Results written to {output}")
+    return exit_code
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,176 @@
+"""
+Stub llama-cpp-python backend for gateway benchmarks
+Same interface the gateway uses, with calibrated sleeps in place of inference
+
+Put bench/stub_backend first on PYTHONPATH to use it. Costs come from:
+    BENCH_STUB_LOAD_MS    model load (default 200)
+    BENCH_STUB_PROMPT_MS  per evaluated prompt token (default 0.5)
+    BENCH_STUB_TOKEN_MS   per generated token (default 15)
+    BENCH_STUB_CLIP_MS    per image embedding (default 150)
+Sleeping releases the GIL like llama.cpp does, and prompt tokens already in
+the context or restored from a cache are not charged, so scheduling, prefix
+and CLIP caching show up in the numbers the way they would with real weights.
+Like a real llama context, a Llama does no locking of its own: concurrent
+calls on one instance interleave, so the gateway must serialise them.
+"""
+from array import array
+import os
+import time
+import zlib
+from typing import Any, Dict, Iterator, List, Optional
+
+__version__ = "0.2.20+bench-stub"
+
+LOAD_MS = float(os.getenv("BENCH_STUB_LOAD_MS", "200"))
+PROMPT_MS = float(os.getenv("BENCH_STUB_PROMPT_MS", "0.5"))
+TOKEN_MS = float(os.getenv("BENCH_STUB_TOKEN_MS", "15"))
+CLIP_MS = float(os.getenv("BENCH_STUB_CLIP_MS", "150"))
+
+_WORDS = ("the", "a", "small", "model", "sees", "light", "over", "quiet", "water", "and")
+
+
+class LlamaState:
+    """Saved context (what llama-cpp-python stores in a prompt cache)"""
+
+    def __init__(self, input_ids: array, n_tokens: int):
+        self.input_ids = input_ids
+        self.n_tokens = n_tokens
+        self.llama_state_size = n_tokens * 1024
+
+
+class Llama:
+    def __init__(
+        self,
+        model_path: str,
+        chat_handler=None,
+        n_ctx: int = 512,
+        n_threads: Optional[int] = None,
+        verbose: bool = True,
+        **kwargs,
+    ):
+        if not os.path.exists(model_path):
+            raise ValueError(f"Model path does not exist: {model_path}")
+        time.sleep(LOAD_MS / 1000)
+        self.model_path = model_path
+        self.chat_handler = chat_handler
+        self._n_ctx = n_ctx
+        self.input_ids = array("i", [0] * n_ctx)
+        self.n_tokens = 0
+        self.cache = None
+
+    def n_ctx(self) -> int:
+        return self._n_ctx
+
+    def set_cache(self, cache):
+        self.cache = cache
+
+    def reset(self):
+        self.n_tokens = 0
+
+    def tokenize(self, text: bytes, add_bos: bool = True, special: bool = False) -> List[int]:
+        tokens = [zlib.crc32(word) % 32000 + 3 for word in text.split()]
+        return [1] + tokens if add_bos else tokens
+
+    def save_state(self) -> LlamaState:
+        return LlamaState(self.input_ids[:self.n_tokens], self.n_tokens)
+
+    def load_state(self, state: LlamaState):
+        self.input_ids[:state.n_tokens] = state.input_ids
+        self.n_tokens = state.n_tokens
+
+    def eval(self, tokens: List[int]):
+        """Evaluate tokens after the ones already in the context"""
+        tokens = tokens[:self._n_ctx - self.n_tokens]
+        time.sleep(len(tokens) * PROMPT_MS / 1000)
+        self.input_ids[self.n_tokens:self.n_tokens + len(tokens)] = array("i", tokens)
+        self.n_tokens += len(tokens)
+
+    def _prefill(self, tokens: List[int]):
+        # Keep the part of the context matching the prompt, like llama-cpp-python
+        reused = 0
+        for a, b in zip(self.input_ids[:self.n_tokens], tokens):
+            if a != b:
+                break
+            reused += 1
+        if self.cache is not None and reused < len(tokens) - 1:
+            try:
+                state = self.cache[tokens]
+                if state.n_tokens > reused:
+                    self.load_state(state)
+                    reused = min(state.n_tokens, len(tokens))
+            except KeyError:
+                pass
+        # The last prompt token is always evaluated to get fresh logits
+        self.n_tokens = min(reused, len(tokens) - 1)
+        self.eval(tokens[self.n_tokens:])
+
+    def _decode(self, max_tokens: int) -> Iterator[str]:
+        token = None
+        for i in range(max_tokens):
+            if token is not None:
+                # Like llama.cpp, evaluate the last sampled token to sample the
+                # next one; the final token is never evaluated
+                time.sleep(TOKEN_MS / 1000)
+                if self.n_tokens < self._n_ctx:
+                    self.input_ids[self.n_tokens] = token
+                    self.n_tokens += 1
+            word = _WORDS[(self.n_tokens + i) % len(_WORDS)]
+            token = self.tokenize(word.encode("utf-8"), add_bos=False)[0]
+            yield " " + word
+
+    def create_completion(
+        self,
+        prompt: str,
+        max_tokens: int = 16,
+        temperature: float = 0.8,
+        top_p: float = 0.95,
+        echo: bool = False,
+        stream: bool = False,
+        **kwargs,
+    ):
+        chunks = self._completion(prompt, max_tokens)
+        if stream:
+            return chunks
+        text = "".join(c["choices"][0]["text"] for c in chunks)
+        completion_tokens = len(self.tokenize(text.encode("utf-8"), add_bos=False))
+        prompt_tokens = len(self.tokenize(prompt.encode("utf-8")))
+        return {
+            "id": f"cmpl-{time.time_ns()}",
+            "object": "text_completion",
+            "choices": [{"text": text, "index": 0, "finish_reason": "length"}],
+            "usage": {
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": completion_tokens,
+                "total_tokens": prompt_tokens + completion_tokens,
+            },
+        }
+
+    __call__ = create_completion
+
+    def _completion(self, prompt: str, max_tokens: int) -> Iterator[Dict[str, Any]]:
+        self._prefill(self.tokenize(prompt.encode("utf-8")))
+        for i, text in enumerate(self._decode(max_tokens)):
+            finish = "length" if i == max_tokens - 1 else None
+            yield {"choices": [{"text": text, "index": 0, "finish_reason": finish}]}
+        if self.cache is not None:
+            self.cache[self.input_ids[:self.n_tokens].tolist()] = self.save_state()
+
+    def create_chat_completion(self, messages: List[Dict[str, Any]], max_tokens: int = 16, stream: bool = False, **kwargs):
+        if self.chat_handler is None:
+            prompt = " ".join(m["content"] for m in messages if isinstance(m.get("content"), str))
+            return self._chat_chunks(self._completion(prompt, max_tokens), stream)
+        return self.chat_handler(llama=self, messages=messages, max_tokens=max_tokens, stream=stream, **kwargs)
+
+    def _chat_chunks(self, completion: Iterator[Dict[str, Any]], stream: bool):
+        def chunks():
+            for i, chunk in enumerate(completion):
+                if i == 0:
+                    # Sent with the first token, after the prompt is evaluated
+                    yield {"choices": [{"index": 0, "delta": {"role": "assistant"}, "finish_reason": None}]}
+                choice = chunk["choices"][0]
+                yield {"choices": [{"index": 0, "delta": {"content": choice["text"]},
+                                    "finish_reason": choice["finish_reason"]}]}
+        if stream:
+            return chunks()
+        text = "".join(c["choices"][0]["delta"].get("content") or "" for c in chunks())
+        return {"choices": [{"index": 0, "message": {"role": "assistant", "content": text}, "finish_reason": "length"}]}
@@ -0,0 +1,54 @@
+"""
+Stub LLaVA chat handler: embeds images through llava_cpp like llama-cpp-python's
+"""
+import base64
+import ctypes
+from typing import Any, Dict, List
+
+import llama_cpp.llava_cpp as llava_cpp
+
+
+class Llava15ChatHandler:
+    SYSTEM_PROMPT = "A chat between a curious human and an artificial intelligence assistant."
+
+    def __init__(self, clip_model_path: str, verbose: bool = False):
+        self.clip_model_path = clip_model_path
+        self.verbose = verbose
+        self._llava_cpp = llava_cpp
+        self.clip_ctx = object()
+
+    def load_image(self, image_url: str) -> bytes:
+        if image_url.startswith("data:"):
+            return base64.b64decode(image_url.split(",", 1)[1])
+        with open(image_url.replace("file://", ""), "rb") as f:
+            return f.read()
+
+    def __call__(self, llama, messages: List[Dict[str, Any]], max_tokens: int = 16, stream: bool = False, **kwargs):
+        def completion():
+            # Image embeddings are not tokens, so every call starts over
+            llama.reset()
+            llama.eval(llama.tokenize(self.SYSTEM_PROMPT.encode("utf-8")))
+            for message in messages:
+                content = message.get("content")
+                parts = content if isinstance(content, list) else [{"type": "text", "text": content or ""}]
+                for part in parts:
+                    if part["type"] == "image_url":
+                        self._eval_image(llama, part["image_url"]["url"])
+                    else:
+                        llama.eval(llama.tokenize(part["text"].encode("utf-8"), add_bos=False))
+            for i, text in enumerate(llama._decode(max_tokens)):
+                finish = "length" if i == max_tokens - 1 else None
+                yield {"choices": [{"text": text, "index": 0, "finish_reason": finish}]}
+
+        return llama._chat_chunks(completion(), stream)
+
+    def _eval_image(self, llama, url: str):
+        data = self.load_image(url)
+        image_bytes = (ctypes.c_ubyte * len(data)).from_buffer(bytearray(data))
+        embed = self._llava_cpp.llava_image_embed_make_with_bytes(
+            ctx_clip=self.clip_ctx, n_threads=4, image_bytes=image_bytes, image_bytes_length=len(data)
+        )
+        try:
+            llama.eval([0] * embed.contents.n_image_pos)
+        finally:
+            self._llava_cpp.llava_image_embed_free(embed)
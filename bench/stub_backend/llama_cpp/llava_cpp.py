@@ -0,0 +1,26 @@
+"""
+Stub llava_cpp bindings: image embeddings cost BENCH_STUB_CLIP_MS each
+"""
+import ctypes
+import time
+
+from . import CLIP_MS
+
+IMAGE_POSITIONS = 576
+
+
+class llava_image_embed(ctypes.Structure):
+    _fields_ = [("embed", ctypes.POINTER(ctypes.c_float)), ("n_image_pos", ctypes.c_int)]
+
+
+def clip_n_mmproj_embd(ctx_clip) -> int:
+    return 4096
+
+
+def llava_image_embed_make_with_bytes(ctx_clip, n_threads, image_bytes, image_bytes_length):
+    time.sleep(CLIP_MS / 1000)
+    return ctypes.pointer(llava_image_embed(None, IMAGE_POSITIONS))
+
+
+def llava_image_embed_free(embed):
+    pass
@@ -0,0 +1,141 @@
+"""
+YOLO detector registry for the Python gateway
+Loads each detector weight file once, warms it up, and shares it across requests
+"""
+from pathlib import Path
+import threading
+import time
+from typing import Any, Dict, List, Tuple
+
+# Detector variants selectable per request -> weight files in models/
+YOLO_VARIANTS = {
+    "n": "yolov8n.pt",
+    "s": "yolov8s.pt",
+    "m": "yolov8m.pt",
+}
+
+
+class DetectorRegistry:
+    """
+    Process-wide cache of YOLO detectors.
+
+    Each variant is constructed at most once (concurrent first requests wait
+    for the same load) and warmed with a dummy inference so the first real
+    frame does not pay for lazy initialization inside ultralytics/torch.
+    A YOLO instance keeps per-call predictor state and is not thread-safe,
+    so inference on each variant is serialised.
+    """
+
+    def __init__(self, models_dir: Path, warmup_size: int = 640):
+        self.models_dir = Path(models_dir)
+        self.warmup_size = warmup_size
+        self._detectors: Dict[str, Any] = {}
+        self._locks: Dict[str, threading.Lock] = {v: threading.Lock() for v in YOLO_VARIANTS}
+        self._inference_locks: Dict[str, threading.Lock] = {v: threading.Lock() for v in YOLO_VARIANTS}
+        self.load_ms: Dict[str, float] = {}
+        self.warmup_ms: Dict[str, float] = {}
+
+    def get(self, variant: str = "n") -> Tuple[Any, float]:
+        """
+        Get a loaded detector.
+
+        Returns:
+            (detector, load_ms) where load_ms is 0 when it was already loaded
+        """
+        if variant not in YOLO_VARIANTS:
+            raise ValueError(f"Unknown detector '{variant}', expected one of {sorted(YOLO_VARIANTS)}")
+        detector = self._detectors.get(variant)
+        if detector is not None:
+            return detector, 0.0
+
+        with self._locks[variant]:
+            detector = self._detectors.get(variant)
+            if detector is not None:
+                return detector, 0.0
+
+            from ultralytics import YOLO
+            import numpy as np
+
+            start = time.time()
+            detector = YOLO(str(self.models_dir / YOLO_VARIANTS[variant]))
+            loaded = time.time()
+            detector(np.zeros((self.warmup_size, self.warmup_size, 3), np.uint8), verbose=False)
+
+            self.load_ms[variant] = round((loaded - start) * 1000, 2)
+            self.warmup_ms[variant] = round((time.time() - loaded) * 1000, 2)
+            self._detectors[variant] = detector
+            print(f"✅ Detector loaded: yolov8{variant} "
+                  f"({self.load_ms[variant]} ms + {self.warmup_ms[variant]} ms warmup)")
+            return detector, round(self.load_ms[variant] + self.warmup_ms[variant], 2)
+
+    def preload(self, variants: List[str]):
+        """Load and warm detectors ahead of the first request"""
+        for variant in variants:
+            try:
+                self.get(variant)
+            except Exception as e:
+                print(f"⚠️ Failed to preload detector yolov8{variant}: {e}")
+
+    def detect(self, img, variant: str = "n") -> Tuple[List[dict], Dict[str, float]]:
+        """
+        Run detection on a decoded BGR image.
+
+        Returns:
+            (detections, timings) with timings {"load_ms", "inference_ms"}
+        """
+        detector, load_ms = self.get(variant)
+
+        with self._inference_locks[variant]:
+            start = time.time()
+            results = detector(img, verbose=False)
+        inference_ms = round((time.time() - start) * 1000, 2)
+
+        detections = []
+        for result in results:
+            detections.extend(self._to_detections(result))
+        return detections, {"load_ms": load_ms, "inference_ms": inference_ms}
+
+    def detect_batch(self, imgs: List[Any], variant: str = "n") -> Tuple[List[List[dict]], Dict[str, float]]:
+        """
+        Run detection on several decoded images in one forward pass.
+
+        Returns:
+            (detections per image, timings) with timings {"load_ms", "inference_ms"}
+        """
+        detector, load_ms = self.get(variant)
+        if not imgs:
+            return [], {"load_ms": load_ms, "inference_ms": 0.0}
+
+        with self._inference_locks[variant]:
+            start = time.time()
+            results = detector(list(imgs), verbose=False)
+        inference_ms = round((time.time() - start) * 1000, 2)
+
+        return (
+            [self._to_detections(result) for result in results],
+            {"load_ms": load_ms, "inference_ms": inference_ms},
+        )
+
+    @staticmethod
+    def _to_detections(result) -> List[dict]:
+        detections = []
+        for box in result.boxes:
+            x1, y1, x2, y2 = box.xyxy[0].tolist()
+            detections.append({
+                "class": result.names[int(box.cls[0])],
+                "confidence": round(float(box.conf[0]), 3),
+                "bbox": {
+                    "x1": round(x1),
+                    "y1": round(y1),
+                    "x2": round(x2),
+                    "y2": round(y2)
+                }
+            })
+        return detections
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "loaded": sorted(self._detectors),
+            "load_ms": dict(self.load_ms),
+            "warmup_ms": dict(self.warmup_ms),
+        }
@@ -0,0 +1,224 @@
+"""
+Resumable model downloads for the Python gateway
+HTTP Range / If-Range responses for large weight files and batched download counts
+"""
+from email.utils import formatdate, parsedate_to_datetime
+import os
+import secrets
+import threading
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+from fastapi import Request
+from fastapi.responses import Response, StreamingResponse
+
+CHUNK_SIZE = 1024 * 1024
+# More ranges than this in one request are answered with the whole file
+MAX_RANGES = 64
+
+Range = Tuple[int, int]  # inclusive byte offsets
+
+
+def file_etag(path: str, entry: Optional[dict] = None) -> str:
+    """
+    ETag for a model file. The registry entry's sha256 is used only while
+    the size and mtime recorded with it still match the file; otherwise
+    the tag is built from the file's own size and mtime (as nginx does), so
+    a changed file never matches an If-Range from before the change.
+    """
+    st = os.stat(path)
+    entry = entry or {}
+    if entry.get("sha256") and entry.get("size_bytes") == st.st_size and entry.get("mtime_ns") == st.st_mtime_ns:
+        return f'"{entry["sha256"]}"'
+    return f'"{st.st_size:x}-{st.st_mtime_ns:x}"'
+
+
+def parse_range(header: str, size: int) -> Optional[List[Range]]:
+    """
+    Parse a Range header into inclusive (start, end) pairs clipped to size.
+
+    Returns None when the header is not a bytes range we understand (the
+    whole file is sent), and [] when no range is satisfiable (416).
+    """
+    unit, _, spec = header.partition("=")
+    if unit.strip().lower() != "bytes" or not spec:
+        return None
+    ranges = []
+    for part in spec.split(","):
+        first, sep, last = part.strip().partition("-")
+        if not sep:
+            return None
+        try:
+            if first:
+                start = int(first)
+                end = int(last) if last else size - 1
+                if last and end < start:
+                    return None
+            else:
+                # Suffix range: the last N bytes
+                length = int(last)
+                start, end = max(size - length, 0), size - 1
+                if length == 0:
+                    continue
+        except ValueError:
+            return None
+        if start >= size:
+            continue
+        ranges.append((start, min(end, size - 1)))
+    if len(ranges) > MAX_RANGES:
+        return None
+    return ranges
+
+
+def _opaque_tag(tag: str) -> str:
+    tag = tag.strip()
+    return tag[2:] if tag.startswith("W/") else tag
+
+
+def _if_range_matches(if_range: str, etag: str, mtime: float) -> bool:
+    if_range = if_range.strip()
+    if if_range.startswith('"') or if_range.startswith("W/"):
+        # If-Range requires a strong comparison; weak tags never match
+        return not etag.startswith("W/") and if_range == etag
+    try:
+        return int(mtime) <= parsedate_to_datetime(if_range).timestamp()
+    except (TypeError, ValueError):
+        return False
+
+
+def _read(path: str, ranges: List[Range], parts: Optional[List[bytes]] = None, tail: bytes = b"") -> Iterator[bytes]:
+    with open(path, "rb") as f:
+        for index, (start, end) in enumerate(ranges):
+            if parts:
+                yield parts[index]
+            f.seek(start)
+            remaining = end - start + 1
+            while remaining > 0:
+                chunk = f.read(min(CHUNK_SIZE, remaining))
+                if not chunk:
+                    return
+                remaining -= len(chunk)
+                yield chunk
+            if parts:
+                yield b"\r\n"
+    if tail:
+        yield tail
+
+
+def ranged_file_response(
+    request: Request,
+    path: str,
+    filename: str,
+    etag: str,
+    media_type: str = "application/octet-stream",
+) -> Response:
+    """
+    Serve a file honoring Range, If-Range and If-None-Match.
+
+    A single range gets a 206 with Content-Range; several ranges get a 206
+    multipart/byteranges body (for clients fetching chunks in parallel over
+    one request). HEAD returns the headers only.
+    """
+    st = os.stat(path)
+    size = st.st_size
+    headers = {
+        "Accept-Ranges": "bytes",
+        "ETag": etag,
+        "Last-Modified": formatdate(st.st_mtime, usegmt=True),
+        "Content-Disposition": f'attachment; filename="{filename}"',
+    }
+
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match:
+        # If-None-Match uses weak comparison
+        tags = [_opaque_tag(t) for t in if_none_match.split(",")]
+        if "*" in tags or _opaque_tag(etag) in tags:
+            return Response(status_code=304, headers=headers)
+
+    ranges = None
+    range_header = request.headers.get("range")
+    if range_header:
+        if_range = request.headers.get("if-range")
+        if not if_range or _if_range_matches(if_range, etag, st.st_mtime):
+            ranges = parse_range(range_header, size)
+    if ranges == []:
+        return Response(status_code=416, headers={**headers, "Content-Range": f"bytes */{size}"})
+
+    head = request.method == "HEAD"
+    if not ranges:
+        headers["Content-Length"] = str(size)
+        body = iter(()) if head else _read(path, [(0, size - 1)] if size else [])
+        return StreamingResponse(body, status_code=200, media_type=media_type, headers=headers)
+
+    if len(ranges) == 1:
+        start, end = ranges[0]
+        headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+        headers["Content-Length"] = str(end - start + 1)
+        body = iter(()) if head else _read(path, ranges)
+        return StreamingResponse(body, status_code=206, media_type=media_type, headers=headers)
+
+    boundary = secrets.token_hex(16)
+    parts = [
+        (f"--{boundary}\r\nContent-Type: {media_type}\r\n"
+         f"Content-Range: bytes {start}-{end}/{size}\r\n\r\n").encode("ascii")
+        for start, end in ranges
+    ]
+    tail = f"--{boundary}--\r\n".encode("ascii")
+    length = sum(len(p) + (end - start + 1) + 2 for p, (start, end) in zip(parts, ranges)) + len(tail)
+    headers["Content-Length"] = str(length)
+    body = iter(()) if head else _read(path, ranges, parts, tail)
+    return StreamingResponse(
+        body, status_code=206, media_type=f"multipart/byteranges; boundary={boundary}", headers=headers
+    )
+
+
+class DownloadCounter:
+    """
+    Accumulates per-model download counts in memory and writes them to the
+    registry in one batch every flush_seconds, instead of rewriting the
+    registry on every request.
+    """
+
+    def __init__(self, flush: Callable[[Dict[str, int]], None], flush_seconds: float = 10.0):
+        self._flush = flush
+        self.flush_seconds = flush_seconds
+        self._pending: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def add(self, model_id: str, count: int = 1):
+        with self._lock:
+            self._pending[model_id] = self._pending.get(model_id, 0) + count
+
+    def pending(self, model_id: str) -> int:
+        with self._lock:
+            return self._pending.get(model_id, 0)
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="download-counter", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+        self.flush()
+
+    def flush(self):
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        if not pending:
+            return
+        try:
+            self._flush(pending)
+        except Exception as e:
+            print(f"⚠️ Failed to record downloads: {e}")
+            # Keep the counts for the next flush
+            with self._lock:
+                for model_id, count in pending.items():
+                    self._pending[model_id] = self._pending.get(model_id, 0) + count
+
+    def _run(self):
+        while not self._stop.wait(self.flush_seconds):
+            self.flush()
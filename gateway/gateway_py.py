@@ -2,27 +2,144 @@
 Quick Python gateway for Model Hub - FastAPI based
 Run: uvicorn gateway_py:app --port 8080
 """
-from fastapi import FastAPI, HTTPException, UploadFile, File, Form
+import os
+import time
+
+# GATEWAY_PROFILE_STARTUP=1 records the import time of every module
+# (reported at startup and by GET /api/v1/startup)
+IMPORT_START = time.time()
+from startup import ImportProfiler, Warmup
+_import_profiler = ImportProfiler() if os.getenv("GATEWAY_PROFILE_STARTUP") else None
+if _import_profiler:
+    _import_profiler.install()
+
+from fastapi import FastAPI, HTTPException, UploadFile, File, Form, Request, WebSocket, WebSocketDisconnect
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import FileResponse, JSONResponse, HTMLResponse
-from fastapi.staticfiles import StaticFiles
+from fastapi.responses import FileResponse, JSONResponse, HTMLResponse, PlainTextResponse, StreamingResponse
 from pydantic import BaseModel
 from typing import List, Optional
+from collections import OrderedDict
+import asyncio
 import json
-import os
+import sys
 from pathlib import Path
-import time
-import base64
+import threading
+
+# Shared model helpers live in the Python SDK: ../sdks/python in the repo,
+# sdks/python next to this file in the Docker image
+SDK_PATH = next(
+    (p for p in (Path(__file__).parent.parent / "sdks" / "python", Path(__file__).parent / "sdks" / "python")
+     if p.is_dir()),
+    Path(__file__).parent.parent / "sdks" / "python",
+)
+if str(SDK_PATH) not in sys.path:
+    sys.path.insert(0, str(SDK_PATH))
+
+from insystem_compute.gguf import GGUFError, GGUFFile, recommended_threads
+from insystem_compute.vision import ImageEmbedCache, attach_image, create_llava_chat_handler
+from metrics import Registry, mapped_rss_bytes, process_rss_bytes
+from model_pool import ModelPool
+from prefix_cache import PrefixKVCache, common_prefix_length
+from registry import ModelRegistry, SQLiteModelRegistry
+from response_cache import ResponseCache
+from scheduler import GenerationScheduler
+from workers import InferenceWorkerPool
+from detectors import DetectorRegistry, YOLO_VARIANTS
+from downloads import DownloadCounter, file_etag, ranged_file_response
+from indexer import ModelIndexer, model_files, resolve_path
 
 app = FastAPI(title="InSystem Model Hub", version="1.0.0")
+START_TIME = time.time()
+
+# Prometheus metrics, served at /metrics
+_metrics = Registry()
+STAGE_SECONDS = _metrics.histogram(
+    "insystem_stage_duration_seconds",
+    "Time spent in each inference stage (model_load, queue_wait, prompt_eval, decode, yolo, llava, clip)",
+    ["stage", "model"],
+)
+REQUESTS = _metrics.counter(
+    "insystem_requests_total", "HTTP requests by endpoint and status", ["endpoint", "method", "status"]
+)
+REQUEST_SECONDS = _metrics.histogram(
+    "insystem_request_duration_seconds", "Time until the response body is fully sent", ["endpoint"]
+)
+GENERATED_TOKENS = _metrics.counter(
+    "insystem_generated_tokens_total", "Tokens generated by text generation", ["model"]
+)
+DECODE_TOKENS_PER_SEC = _metrics.gauge(
+    "insystem_decode_tokens_per_second", "Decode throughput of the last finished generation", ["model"]
+)
+QUEUE_DEPTH = _metrics.gauge("insystem_generation_queue_depth", "Requests waiting for a sequence slot", ["model"])
+ACTIVE_SEQUENCES = _metrics.gauge("insystem_generation_active_sequences", "Sequences decoding", ["model"])
+MODEL_RSS = _metrics.gauge(
+    "insystem_model_rss_bytes",
+    "Resident bytes of each loaded model's memory-mapped weight files, in the gateway or its inference workers",
+    ["model"],
+)
+MODEL_POOL_BYTES = _metrics.gauge("insystem_model_pool_bytes", "Estimated bytes of pooled models")
+PROCESS_RSS = _metrics.gauge("process_resident_memory_bytes", "Resident memory of the gateway process")
+UPTIME = _metrics.gauge("insystem_uptime_seconds", "Seconds since the gateway started")
+
+class RequestMetricsMiddleware:
+    """
+    Count requests by route template and status code, timed until the last
+    body chunk is sent. Plain ASGI rather than @app.middleware: that wraps
+    responses in BaseHTTPMiddleware, which ends timing at the headers and
+    hides client disconnects from streaming endpoints.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        start = time.time()
+        status = 500
+        recorded = False
+
+        def record():
+            nonlocal recorded
+            if recorded:
+                return
+            recorded = True
+            endpoint = getattr(scope.get("route"), "path", "unmatched")
+            REQUESTS.inc(endpoint=endpoint, method=scope["method"], status=status)
+            REQUEST_SECONDS.observe(time.time() - start, endpoint=endpoint)
+
+        async def send_and_record(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+            if message["type"] == "http.response.body" and not message.get("more_body", False):
+                record()
+
+        try:
+            await self.app(scope, receive, send_and_record)
+        finally:
+            # Errors and disconnects before the last chunk are recorded here
+            record()
+
+app.add_middleware(RequestMetricsMiddleware)
 
 # Mount static files for webapp
 WEBAPP_PATH = Path(__file__).parent.parent / "examples" / "webapp"
 if WEBAPP_PATH.exists():
+    from fastapi.staticfiles import StaticFiles
     app.mount("/static", StaticFiles(directory=str(WEBAPP_PATH)), name="static")
 
-# Global model cache
-_loaded_models = {}
+# CLIP image embeddings keyed by image content, so follow-up questions about
+# the same image skip the CLIP encoder (default 256 MB)
+CLIP_CACHE_MB = int(os.getenv("CLIP_CACHE_MB", "256"))
+_embed_cache = ImageEmbedCache(budget_bytes=CLIP_CACHE_MB * 1024 * 1024)
+
+# Global model cache, bounded by an estimated RAM budget (default 6 GB)
+MODEL_POOL_BUDGET_MB = int(os.getenv("MODEL_POOL_BUDGET_MB", "6144"))
+_model_pool = ModelPool(budget_bytes=MODEL_POOL_BUDGET_MB * 1024 * 1024)
 
 def get_llama_cpp():
     """Check if llama-cpp-python is available"""
@@ -41,66 +158,349 @@ def get_llama_cpp_vision():
     except ImportError:
         return None, None
 
-def load_model_for_inference(model_id: str, vision_mode: bool = False):
-    """Load a model for inference (cached)"""
-    cache_key = f"{model_id}_{'vision' if vision_mode else 'text'}"
-    if cache_key in _loaded_models:
-        return _loaded_models[cache_key]
-    
+def _model_cache_key(model_id: str, vision_mode: bool) -> str:
+    return f"{model_id}_{'vision' if vision_mode else 'text'}"
+
+# Context size cap (models trained on less use their trained length) and
+# threads per llama context
+MODEL_N_CTX = int(os.getenv("MODEL_N_CTX", "2048"))
+MODEL_THREADS = int(os.getenv("MODEL_THREADS", "0")) or recommended_threads(max_threads=4)
+
+def estimate_model_bytes(model_id: str, model_path: str, clip_path: Optional[str] = None, n_ctx: int = MODEL_N_CTX) -> int:
+    """
+    Estimate resident size from the GGUF headers (weights plus KV cache for
+    n_ctx), falling back to registry size_bytes or file sizes
+    """
+    m = _registry.get(model_id) or {}
+    recorded = {resolve_path(f.get("path", ""), REGISTRY_DIR): f.get("size_bytes", 0) for f in m.get("files", [])}
+    total = 0
+    for path, ctx in ((model_path, n_ctx), (clip_path, 0)):
+        if not path:
+            continue
+        try:
+            total += GGUFFile(path).estimate_memory(ctx)
+            continue
+        except (GGUFError, OSError):
+            pass
+        if recorded.get(path):
+            total += recorded[path]
+        elif os.path.exists(path):
+            total += os.path.getsize(path)
+    return total
+
+# Weight files of each pooled model, for per-model RSS
+_model_files = {}
+
+# A llama context evaluates one batch at a time, so threadpool requests
+# for the same loaded vision model take turns (text generation is already
+# serialised per slot by its scheduler)
+_model_locks = {}
+_model_locks_lock = threading.Lock()
+
+def model_lock(cache_key: str) -> threading.Lock:
+    with _model_locks_lock:
+        if cache_key not in _model_locks:
+            _model_locks[cache_key] = threading.Lock()
+        return _model_locks[cache_key]
+
+def _loaded_model_rss() -> dict:
+    """Resident bytes of the weight files of each model loaded here or in an inference worker"""
+    loaded = {m["key"]: _model_files.get(m["key"], []) for m in _model_pool.stats()["models"]}
+    rss = mapped_rss_bytes(p for paths in loaded.values() for p in paths)
+    totals = {key: sum(rss.get(p, 0) for p in paths) for key, paths in loaded.items()}
+    for key, value in _worker_model_rss().items():
+        totals[key] = totals.get(key, 0) + value
+    return totals
+
+def _worker_model_rss() -> dict:
+    """
+    Resident bytes of the vision models routed to each inference worker,
+    read from the worker's smaps. Workers load their own copy of a model,
+    so their weights do not show up in this process.
+    """
+    if _worker_pool is None:
+        return {}
+    totals = {}
+    for worker in _worker_pool.stats()["workers"]:
+        if not worker["alive"]:
+            continue
+        files = {}
+        for model_id in worker["models"]:
+            # Detector routes ("yolo-n") are not registry models
+            card = _registry.get(model_id)
+            if card:
+                files[_model_cache_key(model_id, True)] = [p for p in model_files(card, REGISTRY_DIR) if p]
+        rss = mapped_rss_bytes((p for paths in files.values() for p in paths), pid=worker["pid"])
+        if not rss:
+            continue
+        for key, paths in files.items():
+            totals[key] = totals.get(key, 0) + sum(rss.get(p, 0) for p in paths)
+    return totals
+
+def load_model_for_inference(model_id: str, vision_mode: bool = False, pin: bool = False):
+    """
+    Load a model for inference (cached in the model pool).
+    Concurrent cold requests for the same model share a single load.
+    With pin=True the model is pinned against eviction; the caller must
+    release it with _model_pool.unpin(...) when done.
+    """
+    cache_key = _model_cache_key(model_id, vision_mode)
+    return _model_pool.get_or_load(
+        cache_key, lambda: _load_model(model_id, vision_mode), pin=pin
+    )
+
+def _load_model(model_id: str, vision_mode: bool, slot: int = 0):
+    """
+    Construct a Llama instance; returns (llm, size_bytes) or None.
+    slot > 0 is an extra text context over the same mmap'd weights, sized
+    by its KV cache alone.
+    """
     Llama = get_llama_cpp()
     if not Llama:
         return None
     
-    # Map model IDs to files - use absolute paths
-    base_dir = Path(__file__).parent.parent / "models"
-    model_paths = {
-        "tinyllama-1b-q4": str(base_dir / "tinyllama.gguf"),
-        "phi-2-q4": str(base_dir / "phi-2.gguf"),
-        "llava-v1.6-7b-q4": str(base_dir / "llava-v1.6-7b.Q4_K_M.gguf"),
-    }
-    
-    model_path = model_paths.get(model_id)
+    # Model files come from the registry (paths kept current by the indexer)
+    card = _registry.get(model_id)
+    if not card:
+        print(f"❌ Model not registered: {model_id}")
+        return None
+    model_path, clip_path = model_files(card, REGISTRY_DIR)
     if not model_path or not os.path.exists(model_path):
         print(f"❌ Model file not found: {model_path}")
         return None
     
+    use_vision = vision_mode and card.get("task") == "vision"
+    if not use_vision:
+        clip_path = None
+    elif not clip_path or not os.path.exists(clip_path):
+        print(f"❌ CLIP projector not found for {model_id}")
+        return None
+    
+    # Reading the GGUF header takes milliseconds; catch truncated or
+    # corrupt files before llama.cpp spends seconds on them
+    try:
+        header = GGUFFile(model_path)
+        header.validate()
+    except (GGUFError, OSError) as e:
+        print(f"❌ Invalid model file {model_path}: {e}")
+        return None
+    n_ctx = header.default_n_ctx(MODEL_N_CTX)
+    
     try:
         print(f"Loading model: {model_id} from {model_path} (vision={vision_mode})")
+        load_start = time.time()
+        
+        size_bytes = header.kv_cache_bytes(n_ctx) if slot else 0
+        if not size_bytes:
+            size_bytes = estimate_model_bytes(model_id, model_path, clip_path, n_ctx=n_ctx)
+        _model_pool.make_room(size_bytes)
         
-        if vision_mode and model_id == "llava-v1.6-7b-q4":
+        if use_vision:
             # Load vision model with chat handler
             Llama, Llava15ChatHandler = get_llama_cpp_vision()
             if not Llava15ChatHandler:
                 print("❌ Vision support not available. Install: pip3 install llama-cpp-python")
                 return None
             
-            clip_path = str(base_dir / "mmproj-model-f16.gguf")
             print(f"Loading CLIP model from: {clip_path}")
-            chat_handler = Llava15ChatHandler(clip_model_path=clip_path, verbose=False)
+            chat_handler = create_llava_chat_handler(clip_path, verbose=False, embed_cache=_embed_cache)
             llm = Llama(
                 model_path=model_path,
                 chat_handler=chat_handler,
-                n_ctx=2048,
-                n_threads=4,
+                n_ctx=n_ctx,
+                n_threads=MODEL_THREADS,
                 n_gpu_layers=0,
                 verbose=False,
             )
         else:
             llm = Llama(
                 model_path=model_path,
-                n_ctx=2048,
-                n_threads=4,
+                n_ctx=n_ctx,
+                n_threads=MODEL_THREADS,
                 n_gpu_layers=0,
                 verbose=False,
             )
         
-        _loaded_models[cache_key] = llm
+        STAGE_SECONDS.observe(time.time() - load_start, stage="model_load", model=model_id)
+        if not slot:
+            # Slot contexts share these mappings; count them once
+            _model_files[_model_cache_key(model_id, vision_mode)] = [p for p in (model_path, clip_path) if p]
         print(f"✅ Model loaded: {model_id}")
-        return llm
+        return llm, size_bytes
     except Exception as e:
         print(f"❌ Failed to load model: {e}")
         return None
 
+# Saved KV states keyed by token prefix, so prompts sharing a long prefix
+# (e.g. a system prompt) only evaluate their new suffix. Shared by all
+# sequence slots of a model. Off by default: PREFIX_CACHE_MB is per model
+# and comes on top of MODEL_POOL_BUDGET_MB and CLIP_CACHE_MB, and a saved
+# state is the size of the whole KV cache. PREFIX_CACHE_DIR enables
+# spilling evicted states to disk.
+PREFIX_CACHE_MB = int(os.getenv("PREFIX_CACHE_MB", "0"))
+PREFIX_CACHE_DIR = os.getenv("PREFIX_CACHE_DIR")
+PREFIX_CACHE_DISK_MB = int(os.getenv("PREFIX_CACHE_DISK_MB", "4096"))
+_prefix_caches = {}
+_prefix_caches_lock = threading.Lock()
+
+def get_prefix_cache(model_id: str) -> Optional[PrefixKVCache]:
+    """Get (or create) the prompt-prefix cache for a text model"""
+    if PREFIX_CACHE_MB <= 0:
+        return None
+    with _prefix_caches_lock:
+        if model_id not in _prefix_caches:
+            _prefix_caches[model_id] = PrefixKVCache(
+                capacity_bytes=PREFIX_CACHE_MB * 1024 * 1024,
+                spill_dir=str(Path(PREFIX_CACHE_DIR) / model_id) if PREFIX_CACHE_DIR else None,
+                spill_capacity_bytes=PREFIX_CACHE_DISK_MB * 1024 * 1024,
+            )
+        return _prefix_caches[model_id]
+
+def start_completion(llm, model_id: str, prompt: str, params: dict, info: dict):
+    """
+    Start a streamed completion on a sequence slot. Restores a longer saved
+    prefix than the slot's context holds, and records in `info` how many
+    prompt tokens are already evaluated, and once the stream ends, how many
+    tokens it generated. The state after the completion is saved only when
+    the prompt's prefix has been seen before.
+    """
+    # Tokenized the way llama-cpp tokenizes completion prompts
+    tokens = llm.tokenize(prompt.encode("utf-8"), special=True)
+    in_context = common_prefix_length(llm.input_ids[:llm.n_tokens].tolist(), tokens)
+    cache = get_prefix_cache(model_id)
+    cached = cache.longest_prefix(tokens) if cache else 0
+    if cached > in_context:
+        try:
+            # llama-cpp keeps the part of the restored context matching the prompt
+            llm.load_state(cache[tokens])
+        except KeyError:
+            cached = 0
+    save = cache is not None and cache.should_save(tokens)
+    info["prompt_tokens"] = len(tokens)
+    # llama-cpp always re-evaluates at least the last prompt token
+    info["prompt_tokens_reused"] = min(max(in_context, cached), max(len(tokens) - 1, 0))
+    stream = llm(prompt, echo=False, stream=True, **params)
+
+    def counted_stream():
+        finish_reason = None
+        try:
+            for chunk in stream:
+                finish_reason = chunk["choices"][0].get("finish_reason") or finish_reason
+                yield chunk
+        finally:
+            info["completion_tokens"] = sampled_tokens(llm.n_tokens, len(tokens), finish_reason)
+            stream.close()
+        if save:
+            cache[llm.input_ids[:llm.n_tokens].tolist()] = llm.save_state()
+    return counted_stream()
+
+def sampled_tokens(context_tokens: int, prompt_tokens: int, finish_reason: Optional[str]) -> int:
+    """
+    Tokens a completion generated, from the context length when it ended.
+    llama-cpp evaluates every sampled token but the last; a "stop" finish
+    (the gateway passes no stop strings) means that last one was the
+    end-of-sequence token, which is not part of the completion.
+    """
+    return max(context_tokens - prompt_tokens + (0 if finish_reason == "stop" else 1), 0)
+
+def token_usage(prompt_tokens: int, completion_tokens: int) -> dict:
+    """Token usage of a completion"""
+    return {
+        "prompt_tokens": prompt_tokens,
+        "completion_tokens": completion_tokens,
+        "total_tokens": prompt_tokens + completion_tokens,
+    }
+
+def decode_tokens_per_sec(completion_tokens: int, decode_ms: float) -> float:
+    """Decode throughput; the first token comes out of prompt evaluation"""
+    if completion_tokens < 2 or decode_ms <= 0:
+        return 0
+    return round((completion_tokens - 1) / (decode_ms / 1000), 1)
+
+def generation_timings(job) -> dict:
+    """
+    Queue wait, slot context load, prompt eval and decode time (ms) of a
+    finished generation job
+    """
+    started_at = job.started_at or job.admitted_at
+    # The first chunk arrives once the prompt is evaluated and one token sampled
+    first_token_at = job.first_token_at or job.finished_at
+    return {
+        "queue": job.wait_ms,
+        "model_load": round((started_at - job.admitted_at) * 1000, 2),
+        "prompt_eval": round((first_token_at - started_at) * 1000, 2),
+        "decode": round((job.finished_at - first_token_at) * 1000, 2),
+    }
+
+def record_generation(model_id: str, timings: dict, usage: dict):
+    """Export stage times and token counts of a finished text or vision generation"""
+    if "queue" in timings:
+        STAGE_SECONDS.observe(timings["queue"] / 1000, stage="queue_wait", model=model_id)
+    # A slot context build ("model_load") is observed by _load_model itself
+    STAGE_SECONDS.observe(timings["prompt_eval"] / 1000, stage="prompt_eval", model=model_id)
+    STAGE_SECONDS.observe(timings["decode"] / 1000, stage="decode", model=model_id)
+    GENERATED_TOKENS.inc(usage["completion_tokens"], model=model_id)
+    rate = decode_tokens_per_sec(usage["completion_tokens"], timings["decode"])
+    if rate:
+        DECODE_TOKENS_PER_SEC.set(rate, model=model_id)
+
+# Responses to deterministic (temperature 0) generate requests, replayed for
+# identical requests. RESPONSE_CACHE_DIR shares entries between gateway
+# processes; RESPONSE_CACHE_ENTRIES=0 disables the cache.
+RESPONSE_CACHE_ENTRIES = int(os.getenv("RESPONSE_CACHE_ENTRIES", "1024"))
+_response_cache = ResponseCache(
+    max_entries=RESPONSE_CACHE_ENTRIES,
+    ttl_seconds=float(os.getenv("RESPONSE_CACHE_TTL", "3600")),
+    disk_dir=os.getenv("RESPONSE_CACHE_DIR"),
+    disk_max_entries=int(os.getenv("RESPONSE_CACHE_DISK_ENTRIES", "10000")),
+) if RESPONSE_CACHE_ENTRIES > 0 else None
+
+# Text generation schedulers, one per model. Each concurrent sequence needs
+# its own llama context; slot 0 is the pooled model and extra slots are
+# separate contexts over the same mmap'd weights, so each only adds a KV
+# cache (counted against MODEL_POOL_BUDGET_MB and dropped with the model).
+# The default, 2-4 sequences (one per 4 cores), keeps sequences x
+# MODEL_THREADS around the core count; GENERATE_MAX_SEQUENCES=1 disables.
+GENERATE_MAX_SEQUENCES = int(os.getenv(
+    "GENERATE_MAX_SEQUENCES", str(max(2, min(4, (os.cpu_count() or 4) // 4)))
+))
+_schedulers = {}
+_schedulers_lock = threading.Lock()
+
+def _slot_cache_key(model_id: str, slot: int) -> str:
+    if slot == 0:
+        return _model_cache_key(model_id, False)
+    return f"{_model_cache_key(model_id, False)}_slot{slot}"
+
+def _acquire_sequence_slot(model_id: str, slot: int):
+    """Pinned llama context for a sequence slot (runs on the scheduler's loader thread)"""
+    if slot == 0:
+        return load_model_for_inference(model_id, pin=True)
+    # Load (or refresh) the base model first: slot contexts live only as long as it
+    if load_model_for_inference(model_id) is None:
+        return None
+    return _model_pool.get_or_load(
+        _slot_cache_key(model_id, slot),
+        lambda: _load_model(model_id, vision_mode=False, slot=slot),
+        pin=True,
+        parent=_model_cache_key(model_id, False),
+    )
+
+def _release_sequence_slot(model_id: str, slot: int):
+    _model_pool.unpin(_slot_cache_key(model_id, slot))
+
+def get_scheduler(model_id: str) -> GenerationScheduler:
+    """Get (or create) the generation scheduler for a model"""
+    with _schedulers_lock:
+        if model_id not in _schedulers:
+            _schedulers[model_id] = GenerationScheduler(
+                model_id,
+                acquire_slot=lambda slot: _acquire_sequence_slot(model_id, slot),
+                release_slot=lambda slot: _release_sequence_slot(model_id, slot),
+                max_sequences=GENERATE_MAX_SEQUENCES,
+            )
+        return _schedulers[model_id]
+
 # CORS
 app.add_middleware(
     CORSMiddleware,
@@ -110,6 +510,26 @@ app.add_middleware(
 )
 
 REGISTRY_PATH = os.getenv("HUB_REGISTRY", "../hub/registry.json")
+# Set HUB_DB to a SQLite file to serve the catalog from an indexed database
+# (imported from HUB_REGISTRY on first start) instead of the JSON file
+HUB_DB = os.getenv("HUB_DB")
+HUB_MAX_PAGE_SIZE = 1000
+# Relative file paths in the registry are relative to the registry file
+REGISTRY_DIR = Path(REGISTRY_PATH).resolve().parent
+_registry = SQLiteModelRegistry(HUB_DB, import_path=REGISTRY_PATH) if HUB_DB else ModelRegistry(REGISTRY_PATH)
+# Download counts are written to the registry in batches
+_download_counter = DownloadCounter(
+    _registry.add_downloads, flush_seconds=float(os.getenv("DOWNLOAD_COUNT_FLUSH_SECONDS", "10"))
+)
+
+# Background indexer: hashes model files and reads their GGUF headers into
+# the registry, and registers GGUF files dropped into MODELS_DIR.
+# MODEL_INDEX_INTERVAL is the rescan period (0: scan at startup and on
+# POST /api/v1/hub/reindex only)
+MODELS_DIR = os.getenv("MODELS_DIR", str(Path(__file__).parent.parent / "models"))
+_indexer = ModelIndexer(
+    _registry, MODELS_DIR, REGISTRY_DIR, interval_seconds=float(os.getenv("MODEL_INDEX_INTERVAL", "300"))
+)
 
 # Models
 class ModelFile(BaseModel):
@@ -118,6 +538,12 @@ class ModelFile(BaseModel):
     size_bytes: int = 0
     sha256: Optional[str] = None
     format: Optional[str] = None
+    # Filled in by the indexer
+    mtime_ns: Optional[int] = None
+    arch: Optional[str] = None
+    quantization: Optional[str] = None
+    context_length: Optional[int] = None
+    tensor_count: Optional[int] = None
 
 class ModelCard(BaseModel):
     id: Optional[str] = None
@@ -133,18 +559,6 @@ class ModelCard(BaseModel):
     files: List[ModelFile] = []
     readme_markdown: Optional[str] = None
 
-# Registry helpers
-def load_registry():
-    try:
-        with open(REGISTRY_PATH) as f:
-            return json.load(f)
-    except:
-        return []
-
-def save_registry(models):
-    with open(REGISTRY_PATH, 'w') as f:
-        json.dump(models, f, indent=2)
-
 # Endpoints
 @app.get("/", response_class=HTMLResponse)
 def root():
@@ -156,53 +570,99 @@ def root():
 
 @app.get("/api/v1/health")
 def health():
-    return {"status": "healthy", "version": "1.0.0", "uptime_seconds": 0, "memory": {}}
+    return {
+        "status": "healthy",
+        "version": "1.0.0",
+        "uptime_seconds": round(time.time() - START_TIME, 1),
+        "memory": {
+            "rss_bytes": process_rss_bytes(),
+            "models_rss_bytes": _loaded_model_rss(),
+        },
+        "model_pool": _model_pool.stats(),
+        "schedulers": {model_id: sched.stats() for model_id, sched in list(_schedulers.items())},
+        "inference_workers": _worker_pool.stats() if _worker_pool else None,
+        "detectors": _detectors.stats(),
+        "clip_cache": _embed_cache.stats(),
+        "prefix_caches": {model_id: cache.stats() for model_id, cache in list(_prefix_caches.items())},
+        "response_cache": _response_cache.stats() if _response_cache else None,
+        "indexer": _indexer.stats(),
+    }
+
+@app.get("/api/v1/metrics")
+def metrics():
+    """Cache counters"""
+    return {
+        "response_cache": _response_cache.stats() if _response_cache else None,
+        "prefix_caches": {model_id: cache.stats() for model_id, cache in list(_prefix_caches.items())},
+        "clip_cache": _embed_cache.stats(),
+    }
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def prometheus_metrics():
+    """Prometheus scrape endpoint"""
+    UPTIME.set(round(time.time() - START_TIME, 1))
+    rss = process_rss_bytes()
+    if rss is not None:
+        PROCESS_RSS.set(rss)
+    MODEL_RSS.replace({(key,): value for key, value in _loaded_model_rss().items()})
+    MODEL_POOL_BYTES.set(_model_pool.stats()["used_bytes"])
+    scheduler_stats = {model_id: sched.stats() for model_id, sched in list(_schedulers.items())}
+    QUEUE_DEPTH.replace({(m,): s["queue_depth"] for m, s in scheduler_stats.items()})
+    ACTIVE_SEQUENCES.replace({(m,): s["active_sequences"] for m, s in scheduler_stats.items()})
+    return PlainTextResponse(_metrics.render(), media_type="text/plain; version=0.0.4")
 
 @app.get("/api/v1/info")
 def info():
     return {"version": "1.0.0", "device": "auto", "threads": 8}
 
 @app.get("/api/v1/hub/models")
-def list_models():
-    models = load_registry()
-    return {"models": models, "count": len(models)}
+def list_models(
+    task: Optional[str] = None,
+    arch: Optional[str] = None,
+    quantization: Optional[str] = None,
+    tag: Optional[str] = None,
+    target: Optional[str] = None,
+    q: Optional[str] = None,
+    limit: int = 100,
+    cursor: Optional[str] = None
+):
+    """
+    List models, optionally filtered. `q` searches name and README.
+    Results are paginated: pass `next_cursor` back as `cursor` for the next page.
+    """
+    limit = max(1, min(limit, HUB_MAX_PAGE_SIZE))
+    try:
+        page = _registry.search(
+            task=task, arch=arch, quantization=quantization, tag=tag,
+            target=target, q=q, limit=limit, cursor=cursor
+        )
+    except ValueError:
+        raise HTTPException(400, "Invalid cursor")
+    return {**page, "count": len(page["models"])}
 
 @app.get("/api/v1/hub/models/{model_id}")
 def get_model(model_id: str):
-    models = load_registry()
-    for m in models:
-        if m.get("id") == model_id:
-            return m
-    raise HTTPException(404, "Model not found")
+    model = _registry.get(model_id)
+    if not model:
+        raise HTTPException(404, "Model not found")
+    return model
 
 @app.post("/api/v1/hub/models")
 def register_model(card: ModelCard):
-    models = load_registry()
-    if not card.id:
-        card.id = f"model-{len(models)+1}"
-    
-    # Update if exists, otherwise append
-    found = False
-    for i, m in enumerate(models):
-        if m.get("id") == card.id:
-            models[i] = card.dict()
-            found = True
-            break
-    
-    if not found:
-        models.append(card.dict())
-    
-    save_registry(models)
+    # Update if exists, otherwise append (assigns an id if missing)
+    stored = _registry.register(card.dict())
+    card.id = stored["id"]
     return card
 
-@app.get("/api/v1/hub/models/{model_id}/download")
-def download_file(model_id: str, file: Optional[str] = None):
-    models = load_registry()
-    model = None
-    for m in models:
-        if m.get("id") == model_id:
-            model = m
-            break
+@app.api_route("/api/v1/hub/models/{model_id}/download", methods=["GET", "HEAD"])
+def download_file(model_id: str, request: Request, file: Optional[str] = None):
+    """
+    Download a model file. Supports Range (single and multi-range) and
+    If-Range, so interrupted downloads can resume and clients can fetch
+    chunks in parallel; the ETag is the file's registry sha256 while that
+    is current for the file on disk.
+    """
+    model = _registry.get(model_id)
     
     if not model:
         raise HTTPException(404, "Model not found")
@@ -221,11 +681,43 @@ def download_file(model_id: str, file: Optional[str] = None):
     if not target_file:
         raise HTTPException(404, "File not found")
     
-    file_path = target_file.get("path", "")
+    file_path = resolve_path(target_file.get("path", ""), REGISTRY_DIR)
     if not os.path.exists(file_path):
         raise HTTPException(404, f"File not found on disk: {file_path}")
     
-    return FileResponse(file_path, filename=target_file.get("filename"))
+    response = ranged_file_response(
+        request, file_path, target_file.get("filename"),
+        etag=file_etag(file_path, target_file),
+    )
+    # Count whole-file downloads and the first chunk of ranged ones, so a
+    # resumed or parallel download counts once
+    if request.method == "GET" and (
+        response.status_code == 200 or response.headers.get("content-range", "").startswith("bytes 0-")
+    ):
+        _download_counter.add(model_id)
+    return response
+
+@app.on_event("startup")
+def start_download_counter():
+    _download_counter.start()
+
+@app.on_event("shutdown")
+def flush_download_counter():
+    _download_counter.stop()
+
+@app.post("/api/v1/hub/reindex")
+def reindex_models():
+    """Rescan the models directory now"""
+    _indexer.trigger()
+    return _indexer.stats()
+
+@app.on_event("startup")
+def start_model_indexer():
+    _indexer.start()
+
+@app.on_event("shutdown")
+def stop_model_indexer():
+    _indexer.stop()
 
 @app.post("/api/v1/generate")
 def generate(payload: dict):
@@ -246,8 +738,32 @@ def generate(payload: dict):
             "error": "llama-cpp-python not available"
         }
     
-    # Load model
+    # Deterministic requests are answered from the response cache when
+    # an identical one has been served before
     start_time = time.time()
+    cache_key = None
+    if _response_cache and payload.get("cache", True) and ResponseCache.cacheable(temperature):
+        cache_key = ResponseCache.key(model_id, prompt, max_tokens, temperature, top_p)
+        cached = _response_cache.get(cache_key)
+        if cached is not None:
+            # Timing of this request, not of the one that was cached
+            latency_ms = int((time.time() - start_time) * 1000)
+            return {
+                **cached,
+                "id": f"gen-{int(time.time())}",
+                "latency_ms": latency_ms,
+                "latency_breakdown_ms": {
+                    "queue": 0.0, "model_load": 0.0, "prompt_eval": 0.0, "decode": 0.0, "cache_lookup": latency_ms,
+                },
+                "tokens_per_sec": 0,
+                "prompt_tokens_reused": 0,
+                "queue": {"depth": 0, "wait_ms": 0.0},
+                "cache": "hit",
+            }
+    elif _response_cache:
+        _response_cache.bypass()
+    
+    # Load model
     llm = load_model_for_inference(model_id)
     
     if not llm:
@@ -260,29 +776,40 @@ def generate(payload: dict):
         }
     
     try:
-        # Generate
-        result = llm(
-            prompt,
-            max_tokens=max_tokens,
-            temperature=temperature,
-            top_p=top_p,
-            echo=False,
+        # Generate through the model's scheduler so concurrent requests
+        # share decode rounds instead of contending on one instance
+        params = {"max_tokens": max_tokens, "temperature": temperature, "top_p": top_p}
+        prompt_info = {}
+        job = get_scheduler(model_id).submit(
+            lambda llm: start_completion(llm, model_id, prompt, params, prompt_info)
         )
+        chunks = list(job)
         
         end_time = time.time()
         latency_ms = int((end_time - start_time) * 1000)
         
-        generated_text = result['choices'][0]['text'].strip()
-        tokens_generated = len(result['choices'][0]['text'].split())
+        text = "".join(c['choices'][0]['text'] for c in chunks)
+        generated_text = text.strip()
+        usage = token_usage(prompt_info.get("prompt_tokens", 0), prompt_info.get("completion_tokens", 0))
+        timings = generation_timings(job)
+        record_generation(model_id, timings, usage)
         
-        return {
+        response = {
             "id": f"gen-{int(time.time())}",
             "text": generated_text,
-            "tokens": tokens_generated,
+            "tokens": usage["completion_tokens"],
+            "usage": usage,
             "latency_ms": latency_ms,
+            "latency_breakdown_ms": timings,
             "model": model_id,
-            "tokens_per_sec": round(tokens_generated / (latency_ms / 1000), 1) if latency_ms > 0 else 0
+            "tokens_per_sec": decode_tokens_per_sec(usage["completion_tokens"], timings["decode"]),
+            "prompt_tokens_reused": prompt_info.get("prompt_tokens_reused", 0),
+            "queue": {"depth": job.queue_depth, "wait_ms": job.wait_ms},
+            "cache": "miss",
         }
+        if cache_key:
+            _response_cache.put(cache_key, response)
+        return response
     except Exception as e:
         return {
             "id": f"gen-{int(time.time())}",
@@ -292,19 +819,130 @@ def generate(payload: dict):
             "error": str(e)
         }
 
+def _sse_event(data: dict, event: Optional[str] = None) -> str:
+    """Format a dict as a Server-Sent Events message"""
+    message = f"data: {json.dumps(data)}\n\n"
+    if event:
+        message = f"event: {event}\n{message}"
+    return message
+
+@app.post("/api/v1/generate/stream")
+async def generate_stream(payload: dict, request: Request):
+    """
+    Stream generated tokens as Server-Sent Events.
+    Emits one `data:` event per token and a final `done` event with
+    time-to-first-token and per-token timings. Generation stops as soon
+    as the client disconnects.
+    """
+    model_id = payload.get("model", "tinyllama-1b-q4")
+    prompt = payload.get("prompt", "")
+    max_tokens = payload.get("max_tokens", 150)
+    temperature = payload.get("temperature", 0.7)
+    top_p = payload.get("top_p", 0.9)
+    request_id = f"gen-{int(time.time())}"
+
+    async def event_stream():
+        if not get_llama_cpp():
+            yield _sse_event({"id": request_id, "error": "llama-cpp-python not available"}, event="error")
+            return
+
+        start_time = time.time()
+        llm = await run_in_threadpool(load_model_for_inference, model_id)
+        if not llm:
+            yield _sse_event({"id": request_id, "error": "Model not found or failed to load"}, event="error")
+            return
+        load_ms = round((time.time() - start_time) * 1000, 2)
+
+        params = {"max_tokens": max_tokens, "temperature": temperature, "top_p": top_p}
+        prompt_info = {}
+        job = get_scheduler(model_id).submit(
+            lambda llm: start_completion(llm, model_id, prompt, params, prompt_info)
+        )
+        chunks = iter(job)
+        sentinel = object()
+        token_ms = []
+        text_parts = []
+        finish_reason = None
+        first_token = None
+        cancelled = False
+        last_token = time.time()
+
+        try:
+            while True:
+                if await request.is_disconnected():
+                    cancelled = True
+                    break
+                chunk = await run_in_threadpool(next, chunks, sentinel)
+                if chunk is sentinel:
+                    break
+
+                now = time.time()
+                if first_token is None:
+                    first_token = now
+                token_ms.append(round((now - last_token) * 1000, 2))
+                last_token = now
+
+                choice = chunk["choices"][0]
+                finish_reason = choice.get("finish_reason") or finish_reason
+                text_parts.append(choice.get("text", ""))
+                yield _sse_event({"id": request_id, "text": choice.get("text", "")})
+        except Exception as e:
+            yield _sse_event({"id": request_id, "error": str(e)}, event="error")
+            return
+        finally:
+            # The scheduler drops cancelled jobs at the next decode round and
+            # closes their llama-cpp iterator, so abandoned streams stop using CPU.
+            job.cancel()
+
+        if cancelled:
+            print(f"⚠️ Client disconnected, stopped generation after {len(token_ms)} tokens")
+            return
+        usage = token_usage(prompt_info.get("prompt_tokens", 0), prompt_info.get("completion_tokens", 0))
+        timings = generation_timings(job)
+        record_generation(model_id, timings, usage)
+
+        yield _sse_event({
+            "id": request_id,
+            "model": model_id,
+            "tokens": usage["completion_tokens"],
+            "usage": usage,
+            "finish_reason": finish_reason,
+            "load_ms": load_ms,
+            "ttft_ms": round((first_token - start_time) * 1000, 2) if first_token else None,
+            "token_ms": token_ms,
+            "latency_ms": round((last_token - start_time) * 1000, 2),
+            "latency_breakdown_ms": {"load": load_ms, **timings},
+            "tokens_per_sec": decode_tokens_per_sec(usage["completion_tokens"], timings["decode"]),
+            "prompt_tokens_reused": prompt_info.get("prompt_tokens_reused", 0),
+            "queue": {"depth": job.queue_depth, "wait_ms": job.wait_ms},
+        }, event="done")
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
 @app.post("/api/v1/vision/preload")
 async def preload_vision_model(model_id: str = "llava-v1.6-7b-q4"):
     """Preload vision model to avoid first-time delay"""
     try:
         start = time.time()
-        llm = load_model_for_inference(model_id, vision_mode=True)
+        # With inference workers the model is loaded in the worker that
+        # serves it, not (a second time) in the server process
+        task = {"kind": "warmup", "model": model_id}
+        if _worker_pool is not None:
+            result = await _worker_pool.run(model_id, task)
+        else:
+            result = await run_in_threadpool(run_vision_task, task)
         elapsed = time.time() - start
         
-        if llm:
+        if result["loaded"]:
             return {
                 "status": "loaded",
                 "model": model_id,
                 "load_time_seconds": round(elapsed, 2),
+                "cold_start_seconds": result["cold_start_seconds"],
                 "message": "Vision model loaded and ready for real-time analysis"
             }
         else:
@@ -316,6 +954,332 @@ async def preload_vision_model(model_id: str = "llava-v1.6-7b-q4"):
     except Exception as e:
         return {"status": "error", "message": str(e)}
 
+# Vision inference. These run in an inference worker process when
+# INFERENCE_WORKERS > 0, otherwise on the threadpool; never on the event loop.
+INFERENCE_WORKERS = int(os.getenv("INFERENCE_WORKERS", "0"))
+_worker_pool: Optional[InferenceWorkerPool] = None
+
+# YOLO detectors are loaded once per process and shared across requests.
+# YOLO_PRELOAD (e.g. "n,s") loads and warms variants at startup.
+_detectors = DetectorRegistry(Path(__file__).parent.parent / "models")
+YOLO_PRELOAD = [v.strip() for v in os.getenv("YOLO_PRELOAD", "").split(",") if v.strip()]
+
+def detect_objects(image_data, variant: str = "n"):
+    """
+    Run YOLO object detection on encoded image bytes.
+    Returns (detections, timings) with load, decode and inference times in ms.
+    """
+    import cv2
+    import numpy as np
+    
+    # Convert image to numpy array
+    decode_start = time.time()
+    nparr = np.frombuffer(image_data, np.uint8)
+    img = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
+    decode_ms = round((time.time() - decode_start) * 1000, 2)
+    
+    if img is None:
+        return [], {"load_ms": 0.0, "decode_ms": decode_ms, "inference_ms": 0.0}
+    
+    detections, timings = _detectors.detect(img, variant)
+    timings["decode_ms"] = decode_ms
+    return detections, timings
+
+def _clip_timings(chat_handler) -> dict:
+    """CLIP embedding time and cache outcome of the last image on this thread"""
+    embed_stats = getattr(chat_handler, "embed_stats", None)
+    stats = embed_stats() if embed_stats else None
+    if not stats:
+        return {}
+    return {
+        "clip": stats["ms"],
+        "clip_cache": "hit" if stats["hit"] else "miss",
+        "clip_cache_hit_rate": _embed_cache.hit_rate(),
+    }
+
+def describe_image(model: str, prompt: str, image_data, max_tokens: int, image_first: bool = False):
+    """
+    Run LLaVA on an image.
+    Returns (text, timings, usage); text is None if the model is not available.
+    timings holds the CLIP cache outcome and prompt_eval/decode times in ms.
+    """
+    # Load vision model (pinned so it cannot be evicted mid-request)
+    llm = load_model_for_inference(model, vision_mode=True, pin=True)
+    if not llm:
+        return None, {}, {}
+    
+    try:
+        # Hand the raw bytes to the CLIP embedder (no base64 data URI)
+        with model_lock(_model_cache_key(model, True)), attach_image(llm.chat_handler, image_data) as image_url:
+            content = [
+                {"type": "text", "text": prompt},
+                {"type": "image_url", "image_url": {"url": image_url}}
+            ]
+            if image_first:
+                content.reverse()
+            
+            # Streamed so prompt evaluation (image embedding + prompt, all
+            # done before the first chunk) can be timed apart from decoding
+            start = time.time()
+            chunks = llm.create_chat_completion(
+                messages=[{"role": "user", "content": content}],
+                max_tokens=max_tokens,
+                stream=True
+            )
+            parts = []
+            first_chunk = None
+            prompt_tokens = 0
+            finish_reason = None
+            for chunk in chunks:
+                if first_chunk is None:
+                    first_chunk = time.time()
+                    prompt_tokens = llm.n_tokens
+                choice = chunk['choices'][0]
+                parts.append(choice['delta'].get('content') or "")
+                finish_reason = choice.get('finish_reason') or finish_reason
+            end = time.time()
+            completion_tokens = sampled_tokens(llm.n_tokens, prompt_tokens, finish_reason)
+        
+        text = "".join(parts)
+        first_chunk = first_chunk or end
+        timings = {
+            **_clip_timings(llm.chat_handler),
+            "prompt_eval": round((first_chunk - start) * 1000, 2),
+            "decode": round((end - first_chunk) * 1000, 2),
+        }
+        return text, timings, token_usage(prompt_tokens, completion_tokens)
+    finally:
+        _model_pool.unpin(_model_cache_key(model, True))
+
+def detect_objects_batch(frames, variant: str = "n"):
+    """
+    Decode several encoded frames and run YOLO on them as one batch.
+    Returns (detections per frame, timings); undecodable frames get None.
+    """
+    import cv2
+    import numpy as np
+    
+    decode_start = time.time()
+    imgs = [cv2.imdecode(np.frombuffer(frame, np.uint8), cv2.IMREAD_COLOR) for frame in frames]
+    decode_ms = round((time.time() - decode_start) * 1000, 2)
+    
+    valid = [i for i, img in enumerate(imgs) if img is not None]
+    batch_detections, timings = _detectors.detect_batch([imgs[i] for i in valid], variant)
+    timings["decode_ms"] = decode_ms
+    
+    detections = [None] * len(frames)
+    for i, frame_detections in zip(valid, batch_detections):
+        detections[i] = frame_detections
+    return detections, timings
+
+def _detection_signature(detections: List[dict]) -> List[list]:
+    """Order-independent summary of what is in a frame (class -> count)"""
+    counts = {}
+    for d in detections:
+        counts[d["class"]] = counts.get(d["class"], 0) + 1
+    return [[cls, counts[cls]] for cls in sorted(counts)]
+
+def _enhanced_prompt(prompt: str, detections: List[dict]) -> str:
+    """Build context-aware prompt with YOLO detections"""
+    if not detections:
+        return prompt
+    objects_found = ", ".join([d["class"] for d in detections])
+    return f"{prompt}. I detected: {objects_found}. Please describe the scene in detail."
+
+def run_vision_task(task: dict) -> dict:
+    """
+    Execute one vision request. This is the unit of work shipped to
+    inference workers, so it must stay a picklable module-level function.
+    """
+    if task["kind"] == "analyze":
+        llava_start = time.time()
+        text, llava_timings, usage = describe_image(
+            task["model"], task["prompt"], task["image_data"], task["max_tokens"]
+        )
+        return {
+            "text": text,
+            "llava_timings": llava_timings,
+            "usage": usage,
+            "llava_ms": round((time.time() - llava_start) * 1000, 2),
+        }
+    if task["kind"] == "detect":
+        detections, yolo_timings = detect_objects(task["image_data"], task.get("detector", "n"))
+        return {"detections": detections, "yolo_timings": yolo_timings}
+    if task["kind"] == "describe":
+        prompt = _enhanced_prompt(task["prompt"], task.get("detections") or [])
+        llava_start = time.time()
+        description, llava_timings, usage = describe_image(
+            task["model"], prompt, task["image_data"], task["max_tokens"], image_first=True
+        )
+        return {
+            "description": description,
+            "llava_timings": llava_timings,
+            "usage": usage,
+            "llava_ms": round((time.time() - llava_start) * 1000, 2),
+        }
+    if task["kind"] == "pipeline_batch":
+        return _run_pipeline_batch(task)
+    if task["kind"] == "warmup":
+        loaded = load_model_for_inference(task["model"], vision_mode=True) is not None
+        return {
+            "loaded": loaded,
+            "cold_start_seconds": _model_pool.load_seconds.get(_model_cache_key(task["model"], True)),
+        }
+    return _run_pipeline(task)
+
+def _run_pipeline(task: dict) -> dict:
+    image_data = task["image_data"]
+    
+    # Step 1: YOLO object detection (fast ~50-100ms)
+    try:
+        detections, yolo_timings = detect_objects(image_data, task.get("detector", "n"))
+    except Exception as yolo_error:
+        print(f"⚠️ YOLO error: {yolo_error}")
+        detections = []
+        yolo_timings = {"load_ms": 0.0, "decode_ms": 0.0, "inference_ms": 0.0}
+    
+    # Step 2: LLaVA detailed understanding (slow ~2-5s)
+    llava_start = time.time()
+    description, llava_timings, usage = describe_image(
+        task["model"], _enhanced_prompt(task["prompt"], detections),
+        image_data, task["max_tokens"], image_first=True
+    )
+    if description is None:
+        description = "LLaVA model not available"
+    
+    return {
+        "detections": detections,
+        "description": description,
+        "yolo_timings": yolo_timings,
+        "llava_timings": llava_timings,
+        "usage": usage,
+        "llava_ms": round((time.time() - llava_start) * 1000, 2),
+    }
+
+def _run_pipeline_batch(task: dict) -> dict:
+    """
+    YOLO on all frames in one batch, then LLaVA only on frames whose
+    detections differ from the frame before (or from the previous batch of
+    the same stream, passed in as previous_signature/previous_description).
+    """
+    frames = task["image_data"]
+    try:
+        frame_detections, yolo_timings = detect_objects_batch(frames, task.get("detector", "n"))
+    except Exception as yolo_error:
+        print(f"⚠️ YOLO error: {yolo_error}")
+        frame_detections = [[] for _ in frames]
+        yolo_timings = {"load_ms": 0.0, "decode_ms": 0.0, "inference_ms": 0.0}
+    
+    signature = task.get("previous_signature")
+    description = task.get("previous_description")
+    results = []
+    llava_total = 0.0
+    
+    for index, (frame, detections) in enumerate(zip(frames, frame_detections)):
+        if detections is None:
+            results.append({"index": index, "error": "Could not decode image", "detections": []})
+            continue
+        
+        frame_signature = _detection_signature(detections)
+        changed = frame_signature != signature
+        llava_ms = 0.0
+        llava_timings = {}
+        usage = None
+        if changed:
+            llava_start = time.time()
+            description, llava_timings, usage = describe_image(
+                task["model"], _enhanced_prompt(task["prompt"], detections),
+                frame, task["max_tokens"], image_first=True
+            )
+            if description is None:
+                description = "LLaVA model not available"
+            llava_ms = round((time.time() - llava_start) * 1000, 2)
+            llava_total += llava_ms
+        signature = frame_signature
+        
+        results.append({
+            "index": index,
+            "detections": detections,
+            "detection_count": len(detections),
+            "changed": changed,
+            "description": description,
+            "usage": usage,
+            "tokens_per_sec": decode_tokens_per_sec(usage["completion_tokens"], llava_timings["decode"]) if usage else 0,
+            "latency_ms": {"llava": llava_ms, **llava_timings},
+        })
+    
+    return {
+        "frames": results,
+        "signature": signature,
+        "description": description,
+        "yolo_timings": yolo_timings,
+        "llava_ms": round(llava_total, 2),
+    }
+
+def _route_key(task: dict) -> str:
+    """
+    Worker routing key: detection-only tasks go by detector, so they do not
+    queue behind LLaVA describes on the LLaVA model's worker
+    """
+    if task["kind"] == "detect":
+        return f"yolo-{task.get('detector', 'n')}"
+    return task["model"]
+
+async def run_inference(task: dict) -> dict:
+    """Run a vision task off the event loop, routed to the worker owning its model"""
+    if _worker_pool is not None:
+        result = await _worker_pool.run(_route_key(task), task)
+    else:
+        result = await run_in_threadpool(run_vision_task, task)
+    record_vision_stages(task, result)
+    return result
+
+def record_vision_stages(task: dict, result: dict):
+    """
+    Export YOLO/LLaVA/CLIP stage times from a vision task result. Done here
+    in the server process so stages run inside inference workers count too.
+    """
+    model = task["model"]
+    detector = f"yolov8{task.get('detector', 'n')}"
+    yolo_timings = result.get("yolo_timings")
+    if yolo_timings:
+        if yolo_timings["load_ms"]:
+            STAGE_SECONDS.observe(yolo_timings["load_ms"] / 1000, stage="model_load", model=detector)
+        STAGE_SECONDS.observe(yolo_timings["inference_ms"] / 1000, stage="yolo", model=detector)
+    
+    if task["kind"] == "pipeline_batch":
+        described = [(f["latency_ms"], f["usage"]) for f in result["frames"] if f.get("changed")]
+    elif result.get("llava_ms"):
+        described = [({"llava": result["llava_ms"], **result["llava_timings"]}, result["usage"])]
+    else:
+        described = []
+    for timings, usage in described:
+        STAGE_SECONDS.observe(timings["llava"] / 1000, stage="llava", model=model)
+        if "clip" in timings:
+            STAGE_SECONDS.observe(timings["clip"] / 1000, stage="clip", model=model)
+        if usage:
+            record_generation(model, timings, usage)
+
+@app.on_event("startup")
+def start_inference_workers():
+    global _worker_pool
+    if INFERENCE_WORKERS > 0:
+        _worker_pool = InferenceWorkerPool(INFERENCE_WORKERS, handler=run_vision_task)
+        print(f"✅ Started {INFERENCE_WORKERS} inference worker process(es)")
+
+@app.on_event("startup")
+def preload_detectors():
+    # With worker processes each worker owns its detectors, loaded on first use
+    if YOLO_PRELOAD and INFERENCE_WORKERS == 0:
+        threading.Thread(target=_detectors.preload, args=(YOLO_PRELOAD,), daemon=True).start()
+
+@app.on_event("shutdown")
+def stop_inference_workers():
+    global _worker_pool
+    if _worker_pool is not None:
+        _worker_pool.close()
+        _worker_pool = None
+
 @app.post("/api/v1/vision/analyze")
 async def analyze_vision(
     model: str = Form("llava-v1.6-7b-q4"),
@@ -340,44 +1304,33 @@ async def analyze_vision(
         # Read image data
         image_data = await image.read()
         
-        # Convert to base64 data URI
-        import base64
-        b64_image = base64.b64encode(image_data).decode('utf-8')
-        data_uri = f"data:image/jpeg;base64,{b64_image}"
-        
-        # Load vision model
-        llm = load_model_for_inference(model, vision_mode=True)
+        result = await run_inference({
+            "kind": "analyze",
+            "model": model,
+            "prompt": prompt,
+            "image_data": image_data,
+            "max_tokens": max_tokens,
+        })
         
-        if not llm:
+        if result["text"] is None:
             return {
                 "id": f"vision-{int(time.time())}",
                 "text": f"❌ Vision model '{model}' not available. Make sure llava-v1.6-7b.Q4_K_M.gguf exists in models/",
                 "error": "Model not found"
             }
         
-        # Create vision prompt
-        result = llm.create_chat_completion(
-            messages=[
-                {
-                    "role": "user",
-                    "content": [
-                        {"type": "text", "text": prompt},
-                        {"type": "image_url", "image_url": {"url": data_uri}}
-                    ]
-                }
-            ],
-            max_tokens=max_tokens
-        )
-        
         end_time = time.time()
         latency_ms = int((end_time - start_time) * 1000)
         
-        response_text = result['choices'][0]['message']['content']
-        
         return {
             "id": f"vision-{int(time.time())}",
-            "text": response_text,
+            "text": result["text"],
             "latency_ms": latency_ms,
+            "latency_breakdown_ms": {"total": latency_ms, **result["llava_timings"]},
+            "usage": result["usage"],
+            "tokens_per_sec": decode_tokens_per_sec(
+                result["usage"]["completion_tokens"], result["llava_timings"]["decode"]
+            ),
             "model": model,
             "image_size": len(image_data),
             "prompt": prompt
@@ -395,112 +1348,59 @@ async def vision_pipeline(
     model: str = Form("llava-v1.6-7b-q4"),
     prompt: str = Form("Describe what you see"),
     image: UploadFile = File(...),
-    max_tokens: int = Form(100)
+    max_tokens: int = Form(100),
+    detector: str = Form("n")
 ):
     """
     Vision pipeline: YOLO (fast object detection) + LLaVA (detailed understanding)
-    Returns: {detections: [{class, confidence, bbox}], description: str, latency_ms: int}
+    `detector` selects the YOLO weights: n (fastest), s or m (most accurate).
+    Returns: {detections: [{class, confidence, bbox}], description: str, latency_ms: {...}}
     """
+    if detector not in YOLO_VARIANTS:
+        return {
+            "id": f"pipeline-{int(time.time())}",
+            "error": f"Unknown detector '{detector}'",
+            "detections": [],
+            "description": f"❌ Unknown detector '{detector}'. Use one of: {', '.join(YOLO_VARIANTS)}"
+        }
+    
     try:
         start = time.time()
         
         # Read image data once
         image_data = await image.read()
         
-        # Step 1: YOLO object detection (fast ~50-100ms)
-        yolo_start = time.time()
-        detections = []
-        
-        try:
-            from ultralytics import YOLO
-            import cv2
-            import numpy as np
-            
-            # Load YOLO model (cached automatically by ultralytics)
-            yolo_model_path = Path(__file__).parent.parent / "models" / "yolov8n.pt"
-            yolo_model = YOLO(str(yolo_model_path))
-            
-            # Convert image to numpy array
-            nparr = np.frombuffer(image_data, np.uint8)
-            img = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
-            
-            if img is not None:
-                # Run YOLO detection
-                results = yolo_model(img, verbose=False)
-                
-                # Extract detections
-                for result in results:
-                    boxes = result.boxes
-                    for box in boxes:
-                        x1, y1, x2, y2 = box.xyxy[0].tolist()
-                        conf = float(box.conf[0])
-                        cls = int(box.cls[0])
-                        class_name = result.names[cls]
-                        
-                        detections.append({
-                            "class": class_name,
-                            "confidence": round(conf, 3),
-                            "bbox": {
-                                "x1": round(x1),
-                                "y1": round(y1),
-                                "x2": round(x2),
-                                "y2": round(y2)
-                            }
-                        })
-                
-                yolo_time = round((time.time() - yolo_start) * 1000, 2)
-        except Exception as yolo_error:
-            print(f"⚠️ YOLO error: {yolo_error}")
-            yolo_time = 0
-        
-        # Step 2: LLaVA detailed understanding (slow ~2-5s)
-        llava_start = time.time()
-        description = ""
-        
-        # Build context-aware prompt with YOLO detections
-        if detections:
-            objects_found = ", ".join([d["class"] for d in detections])
-            enhanced_prompt = f"{prompt}. I detected: {objects_found}. Please describe the scene in detail."
-        else:
-            enhanced_prompt = prompt
-        
-        # Load LLaVA model
-        llm = load_model_for_inference(model, vision_mode=True)
-        if not llm:
-            description = "LLaVA model not available"
-        else:
-            # Convert image to base64 data URI
-            image_b64 = base64.b64encode(image_data).decode('utf-8')
-            image_uri = f"data:image/jpeg;base64,{image_b64}"
-            
-            # Run LLaVA inference
-            result = llm.create_chat_completion(
-                messages=[{
-                    "role": "user",
-                    "content": [
-                        {"type": "image_url", "image_url": {"url": image_uri}},
-                        {"type": "text", "text": enhanced_prompt}
-                    ]
-                }],
-                max_tokens=max_tokens
-            )
-            description = result['choices'][0]['message']['content']
-        
-        llava_time = round((time.time() - llava_start) * 1000, 2)
+        result = await run_inference({
+            "kind": "pipeline",
+            "model": model,
+            "prompt": prompt,
+            "image_data": image_data,
+            "max_tokens": max_tokens,
+            "detector": detector,
+        })
+        detections = result["detections"]
+        yolo_timings = result["yolo_timings"]
         total_time = round((time.time() - start) * 1000, 2)
         
         return {
             "id": f"pipeline-{int(time.time())}",
             "detections": detections,
             "detection_count": len(detections),
-            "description": description,
+            "description": result["description"],
             "latency_ms": {
-                "yolo": yolo_time,
-                "llava": llava_time,
+                "yolo": yolo_timings["inference_ms"],
+                "yolo_load": yolo_timings["load_ms"],
+                "yolo_decode": yolo_timings["decode_ms"],
+                "llava": result["llava_ms"],
+                **result["llava_timings"],
                 "total": total_time
             },
+            "usage": result["usage"],
+            "tokens_per_sec": decode_tokens_per_sec(
+                result["usage"].get("completion_tokens", 0), result["llava_timings"].get("decode", 0)
+            ),
             "model": {
-                "yolo": "yolov8n",
+                "yolo": f"yolov8{detector}",
                 "llava": model
             }
         }
@@ -513,6 +1413,283 @@ async def vision_pipeline(
             "description": f"❌ Pipeline error: {str(e)}"
         }
 
+# Last detection signature/description per camera stream, so a batch only
+# re-runs LLaVA when the scene changed since the previous batch
+MAX_TRACKED_STREAMS = 256
+_stream_state = OrderedDict()
+
+@app.post("/api/v1/vision/pipeline/batch")
+async def vision_pipeline_batch(
+    model: str = Form("llava-v1.6-7b-q4"),
+    prompt: str = Form("Describe what you see"),
+    images: List[UploadFile] = File(...),
+    max_tokens: int = Form(100),
+    detector: str = Form("n"),
+    stream_id: Optional[str] = Form(None)
+):
+    """
+    Batched vision pipeline for N frames in one multipart request (repeat the
+    `images` field). YOLO runs on all frames as one batch; LLaVA runs only on
+    frames whose detected objects changed. Pass a stable `stream_id` per
+    camera to carry that change detection across batches.
+    Returns: {frames: [{index, detections, changed, description}], latency_ms: {...}}
+    """
+    if detector not in YOLO_VARIANTS:
+        return {
+            "id": f"pipeline-batch-{int(time.time())}",
+            "error": f"Unknown detector '{detector}'",
+            "frames": []
+        }
+    
+    try:
+        start = time.time()
+        frames = [await image.read() for image in images]
+        
+        state = _stream_state.get(stream_id, {}) if stream_id else {}
+        result = await run_inference({
+            "kind": "pipeline_batch",
+            "model": model,
+            "prompt": prompt,
+            "image_data": frames,
+            "max_tokens": max_tokens,
+            "detector": detector,
+            "previous_signature": state.get("signature"),
+            "previous_description": state.get("description"),
+        })
+        
+        if stream_id:
+            _stream_state[stream_id] = {
+                "signature": result["signature"],
+                "description": result["description"],
+            }
+            _stream_state.move_to_end(stream_id)
+            while len(_stream_state) > MAX_TRACKED_STREAMS:
+                _stream_state.popitem(last=False)
+        
+        yolo_timings = result["yolo_timings"]
+        total_time = round((time.time() - start) * 1000, 2)
+        return {
+            "id": f"pipeline-batch-{int(time.time())}",
+            "frames": result["frames"],
+            "frame_count": len(frames),
+            "described_count": sum(1 for f in result["frames"] if f.get("changed")),
+            "latency_ms": {
+                "yolo": yolo_timings["inference_ms"],
+                "yolo_load": yolo_timings["load_ms"],
+                "yolo_decode": yolo_timings["decode_ms"],
+                "llava": result["llava_ms"],
+                "total": total_time,
+                "per_frame": round(total_time / len(frames), 2) if frames else 0
+            },
+            "model": {
+                "yolo": f"yolov8{detector}",
+                "llava": model
+            }
+        }
+        
+    except Exception as e:
+        return {
+            "id": f"pipeline-batch-{int(time.time())}",
+            "error": str(e),
+            "frames": []
+        }
+
+class _VisionSession:
+    """Per-connection counters for the realtime vision WebSocket"""
+    
+    def __init__(self):
+        self.started = time.time()
+        self.received = 0
+        self.processed = 0
+        self.dropped = 0
+        self.described = 0
+        self.last_latency_ms = 0.0
+        self.total_latency_ms = 0.0
+    
+    def stats(self) -> dict:
+        elapsed = max(time.time() - self.started, 1e-6)
+        return {
+            "frames_received": self.received,
+            "frames_processed": self.processed,
+            "frames_dropped": self.dropped,
+            "descriptions": self.described,
+            "fps": round(self.processed / elapsed, 2),
+            "drop_rate": round(self.dropped / self.received, 3) if self.received else 0.0,
+            "latency_ms": {
+                "last": self.last_latency_ms,
+                "avg": round(self.total_latency_ms / self.processed, 2) if self.processed else 0.0,
+            },
+        }
+
+@app.websocket("/api/v1/vision/ws")
+async def vision_ws(
+    websocket: WebSocket,
+    model: str = "llava-v1.6-7b-q4",
+    prompt: str = "Describe what you see",
+    detector: str = "n",
+    max_tokens: int = 100
+):
+    """
+    Realtime vision channel. The client sends binary JPEG/PNG frames; the
+    server keeps only the newest unprocessed frame (older ones are dropped,
+    so latency stays bounded when the client sends faster than we detect),
+    replies with a `detections` message per processed frame, and sends
+    `description` messages from LLaVA whenever one finishes. LLaVA runs on
+    at most one frame at a time, and only when the detected objects changed.
+    """
+    await websocket.accept()
+    if detector not in YOLO_VARIANTS:
+        await websocket.send_json({"type": "error", "error": f"Unknown detector '{detector}'"})
+        await websocket.close()
+        return
+    
+    session = _VisionSession()
+    latest = {}
+    frame_ready = asyncio.Event()
+    send_lock = asyncio.Lock()
+    described_signature = None
+    llava_task: Optional[asyncio.Task] = None
+    
+    async def send(message: dict):
+        async with send_lock:
+            await websocket.send_json(message)
+    
+    async def receive_frames():
+        while True:
+            frame = await websocket.receive_bytes()
+            session.received += 1
+            if latest:
+                session.dropped += 1
+            latest.update(id=session.received, data=frame, received_at=time.time())
+            frame_ready.set()
+    
+    async def describe(frame_id: int, frame: bytes, detections: List[dict]):
+        start = time.time()
+        try:
+            result = await run_inference({
+                "kind": "describe",
+                "model": model,
+                "prompt": prompt,
+                "image_data": frame,
+                "detections": detections,
+                "max_tokens": max_tokens,
+            })
+            session.described += 1
+            await send({
+                "type": "description",
+                "frame_id": frame_id,
+                "description": result["description"] or "LLaVA model not available",
+                "latency_ms": {"llava": round((time.time() - start) * 1000, 2), **result["llava_timings"]},
+                "usage": result["usage"],
+                "tokens_per_sec": decode_tokens_per_sec(
+                    result["usage"].get("completion_tokens", 0), result["llava_timings"].get("decode", 0)
+                ),
+            })
+        except Exception as e:
+            await send({"type": "error", "frame_id": frame_id, "error": str(e)})
+    
+    receiver = asyncio.create_task(receive_frames())
+    try:
+        while True:
+            ready = asyncio.create_task(frame_ready.wait())
+            done, _ = await asyncio.wait({ready, receiver}, return_when=asyncio.FIRST_COMPLETED)
+            if receiver in done:
+                ready.cancel()
+                receiver.result()  # re-raises WebSocketDisconnect
+                break
+            
+            frame_ready.clear()
+            frame_id, frame, received_at = latest["id"], latest["data"], latest["received_at"]
+            latest.clear()
+            
+            try:
+                result = await run_inference({
+                    "kind": "detect",
+                    "model": model,
+                    "image_data": frame,
+                    "detector": detector,
+                })
+            except Exception as e:
+                await send({"type": "error", "frame_id": frame_id, "error": str(e)})
+                continue
+            
+            detections = result["detections"]
+            latency_ms = round((time.time() - received_at) * 1000, 2)
+            session.processed += 1
+            session.last_latency_ms = latency_ms
+            session.total_latency_ms += latency_ms
+            
+            await send({
+                "type": "detections",
+                "frame_id": frame_id,
+                "detections": detections,
+                "detection_count": len(detections),
+                "latency_ms": {
+                    "yolo": result["yolo_timings"]["inference_ms"],
+                    "end_to_end": latency_ms,
+                },
+                "session": session.stats(),
+            })
+            
+            signature = _detection_signature(detections)
+            if signature != described_signature and (llava_task is None or llava_task.done()):
+                described_signature = signature
+                llava_task = asyncio.create_task(describe(frame_id, frame, detections))
+    except WebSocketDisconnect:
+        pass
+    finally:
+        receiver.cancel()
+        if llava_task is not None:
+            llava_task.cancel()
+        print(f"Vision session closed: {session.stats()}")
+
+# Heavy imports and model loads happen on a background thread started at the
+# end of startup. GATEWAY_BACKGROUND_IMPORTS overrides the module list (empty
+# disables); WARMUP_MODELS (e.g. "tinyllama-1b-q4,llava-v1.6-7b-q4") loads
+# models at boot, vision models in their inference worker if enabled.
+_default_imports = "llama_cpp" if INFERENCE_WORKERS > 0 else "llama_cpp,numpy,cv2,ultralytics"
+BACKGROUND_IMPORTS = [
+    m.strip() for m in os.getenv("GATEWAY_BACKGROUND_IMPORTS", _default_imports).split(",") if m.strip()
+]
+WARMUP_MODELS = [m.strip() for m in os.getenv("WARMUP_MODELS", "").split(",") if m.strip()]
+
+def warmup_model(model_id: str) -> bool:
+    card = _registry.get(model_id)
+    if card and card.get("task") == "vision":
+        task = {"kind": "warmup", "model": model_id}
+        if _worker_pool is not None:
+            return _worker_pool.submit(model_id, task).result()["loaded"]
+        return run_vision_task(task)["loaded"]
+    return load_model_for_inference(model_id) is not None
+
+_warmup = Warmup(BACKGROUND_IMPORTS, WARMUP_MODELS, warmup_model)
+IMPORT_MS = round((time.time() - IMPORT_START) * 1000, 2)
+READY_MS: Optional[float] = None
+
+@app.on_event("startup")
+async def start_warmup():
+    global READY_MS
+    # Startup handlers run in registration order, so this one is last
+    READY_MS = round((time.time() - IMPORT_START) * 1000, 2)
+    print(f"✅ Gateway ready in {READY_MS} ms (module import {IMPORT_MS} ms)")
+    if _import_profiler:
+        _import_profiler.uninstall()
+        for entry in _import_profiler.report(top=15):
+            print(f"   {entry['cumulative_ms']:>9.2f} ms  {entry['self_ms']:>9.2f} ms self  {entry['module']}")
+    # Last step of startup; warmup runs on its own thread, so uvicorn starts
+    # listening without waiting for it
+    _warmup.start()
+
+@app.get("/api/v1/startup")
+def startup_report():
+    """Startup timings, background warmup progress and (in profile mode) per-module import times"""
+    return {
+        "import_ms": IMPORT_MS,
+        "ready_ms": READY_MS,
+        "warmup": _warmup.stats(),
+        "import_profile": _import_profiler.report(top=50) if _import_profiler else None,
+    }
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8080)
@@ -0,0 +1,287 @@
+"""
+Model file indexer for the Python gateway
+Hashes GGUF files in the background and records their checksums and header metadata in the registry
+"""
+import hashlib
+import mmap
+import os
+from pathlib import Path
+import re
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+from insystem_compute.gguf import GGUFError, GGUFFile
+
+HASH_CHUNK_SIZE = 16 * 1024 * 1024
+# Per-file fields the indexer owns
+GGUF_FIELDS = ("arch", "quantization", "context_length", "tensor_count")
+
+
+def file_sha256(path: str, chunk_size: int = HASH_CHUNK_SIZE) -> str:
+    """
+    sha256 of a file, read through a read-only mmap.
+
+    Chunks are hashed straight from the mapping (no copy into Python
+    buffers), and hashlib releases the GIL while hashing, so request
+    threads keep running while multi-GB weights are indexed.
+    """
+    hasher = hashlib.sha256()
+    with open(path, "rb") as f:
+        size = os.fstat(f.fileno()).st_size
+        if size == 0:
+            return hasher.hexdigest()
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            if hasattr(mapped, "madvise"):
+                mapped.madvise(mmap.MADV_SEQUENTIAL)
+            view = memoryview(mapped)
+            try:
+                for offset in range(0, size, chunk_size):
+                    hasher.update(view[offset:offset + chunk_size])
+            finally:
+                view.release()
+    return hasher.hexdigest()
+
+
+def resolve_path(path: str, base_dir: Path) -> str:
+    """Registry file paths are relative to the registry file's directory"""
+    return os.path.normpath(path if os.path.isabs(path) else os.path.join(base_dir, path))
+
+
+def is_clip_projector(entry: dict) -> bool:
+    return entry.get("arch") == "clip" or entry.get("filename", "").startswith("mmproj")
+
+
+def model_files(card: dict, base_dir: Path) -> Tuple[Optional[str], Optional[str]]:
+    """
+    Weight file and CLIP projector of a registered GGUF model
+
+    Vision models without a registered projector use an mmproj*.gguf next
+    to their weights.
+
+    Returns:
+        (weights_path, clip_path); either may be None
+    """
+    weights = clip = None
+    for entry in card.get("files", []):
+        if entry.get("format") != "gguf" and not entry.get("filename", "").endswith(".gguf"):
+            continue
+        path = resolve_path(entry.get("path", ""), base_dir)
+        if is_clip_projector(entry):
+            clip = clip or path
+        else:
+            weights = weights or path
+    if weights and not clip and card.get("task") == "vision":
+        directory = Path(weights).parent
+        candidates = sorted(directory.glob("mmproj*.gguf")) if directory.is_dir() else []
+        preferred = directory / "mmproj-model-f16.gguf"
+        if preferred in candidates:
+            clip = str(preferred)
+        elif candidates:
+            clip = str(candidates[0])
+    return weights, clip
+
+
+def _model_id(stem: str) -> str:
+    return re.sub(r"[^a-z0-9.]+", "-", stem.lower()).strip("-.") or "model"
+
+
+class ModelIndexer:
+    """
+    Keeps the registry's file entries in sync with the weight files on disk.
+
+    Every scan covers the GGUF files under models_dir plus every file the
+    registry references. A file is hashed and its GGUF header parsed only
+    when its size or mtime differs from what the registry recorded, so
+    rescans of an unchanged directory cost one stat() per file. Results go
+    into the file entry (size_bytes, sha256, mtime_ns, arch, quantization,
+    context_length, tensor_count); arch and quantization are also filled in
+    on the card when it has none. GGUF files that no card references are
+    registered as new text-generation models (CLIP projectors excepted).
+    """
+
+    def __init__(self, registry, models_dir: str, registry_dir: str, interval_seconds: float = 300):
+        self.registry = registry
+        self.models_dir = Path(models_dir)
+        self.registry_dir = Path(registry_dir)
+        self.interval_seconds = interval_seconds
+        self._scan_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._unregistered: Dict[str, Tuple[int, int]] = {}  # path -> (size, mtime_ns)
+        self.scans = 0
+        self.files_hashed = 0
+        self.bytes_hashed = 0
+        self.models_registered = 0
+        self.errors: Dict[str, str] = {}
+        self.last_scan_at: Optional[float] = None
+        self.last_scan_seconds: Optional[float] = None
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="model-indexer", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+
+    def trigger(self):
+        """Run a scan as soon as possible"""
+        self._wake.set()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "models_dir": str(self.models_dir),
+            "interval_seconds": self.interval_seconds,
+            "scanning": self._scan_lock.locked(),
+            "scans": self.scans,
+            "files_hashed": self.files_hashed,
+            "bytes_hashed": self.bytes_hashed,
+            "models_registered": self.models_registered,
+            "last_scan_at": self.last_scan_at,
+            "last_scan_seconds": self.last_scan_seconds,
+            "errors": dict(self.errors),
+        }
+
+    def scan(self):
+        """Index every known and discovered model file once"""
+        with self._scan_lock:
+            start = time.time()
+            registered: Dict[str, List[Tuple[str, str]]] = {}  # real path -> [(model id, filename)]
+            for card in self.registry.list():
+                for entry in card.get("files", []):
+                    path = os.path.realpath(resolve_path(entry.get("path", ""), self.registry_dir))
+                    registered.setdefault(path, []).append((card["id"], entry.get("filename")))
+
+            for path, owners in registered.items():
+                if self._stop.is_set():
+                    return
+                for model_id, filename in owners:
+                    self._index_entry(model_id, filename, path)
+
+            for path in self._discover():
+                if self._stop.is_set():
+                    return
+                if os.path.realpath(path) not in registered:
+                    self._register_file(path)
+
+            self.scans += 1
+            self.last_scan_at = time.time()
+            self.last_scan_seconds = round(self.last_scan_at - start, 3)
+
+    def _discover(self) -> List[str]:
+        if not self.models_dir.is_dir():
+            return []
+        return sorted(str(p) for p in self.models_dir.rglob("*.gguf") if p.is_file())
+
+    def _index_entry(self, model_id: str, filename: str, path: str):
+        try:
+            st = os.stat(path)
+        except OSError:
+            return  # registered but not on this host
+        card = self.registry.get(model_id)
+        entry = next((f for f in (card or {}).get("files", []) if f.get("filename") == filename), None)
+        if entry is None or (
+            entry.get("sha256") and entry.get("size_bytes") == st.st_size and entry.get("mtime_ns") == st.st_mtime_ns
+        ):
+            return
+
+        fields = self._describe(path, st)
+        if fields is None:
+            return
+        fields.pop("name", None)
+
+        def apply(card: dict):
+            for f in card.get("files", []):
+                if f.get("filename") == filename:
+                    f.update(fields)
+            for key in ("arch", "quantization"):
+                if not card.get(key) and fields.get(key) and fields.get("arch") != "clip":
+                    card[key] = fields[key]
+
+        self.registry.patch(model_id, apply)
+        print(f"✅ Indexed {model_id}/{filename} ({st.st_size} bytes)")
+
+    def _register_file(self, path: str):
+        st = os.stat(path)
+        signature = (st.st_size, st.st_mtime_ns)
+        if self._unregistered.get(path) == signature:
+            return
+        fields = self._describe(path, st)
+        if fields is None or "arch" not in fields or fields["arch"] == "clip":
+            # Unreadable files and CLIP projectors (which belong to a vision
+            # model, not a model of their own) are not registered; remember
+            # them so unchanged files are not hashed again on every scan
+            self._unregistered[path] = signature
+            return
+        name = fields.pop("name", None)
+        stem = Path(path).stem
+        model_id = _model_id(stem)
+        if self.registry.get(model_id):
+            model_id = f"{model_id}-{fields['sha256'][:8]}"
+        self.registry.register({
+            "id": model_id,
+            "name": name or stem,
+            "task": "text-generation",
+            "arch": fields.get("arch"),
+            "quantization": fields.get("quantization"),
+            "tags": ["gguf"],
+            "targets": [],
+            "downloads": 0,
+            "files": [{
+                "filename": Path(path).name,
+                "path": os.path.relpath(path, self.registry_dir),
+                **fields,
+            }],
+        })
+        self.models_registered += 1
+        print(f"✅ Registered {model_id} from {path}")
+
+    def _describe(self, path: str, st: os.stat_result) -> Optional[Dict[str, Any]]:
+        """Hash a file and read its GGUF header; None (and an error entry) on failure"""
+        try:
+            fields: Dict[str, Any] = {
+                "size_bytes": st.st_size,
+                "mtime_ns": st.st_mtime_ns,
+                "sha256": file_sha256(path),
+            }
+            self.files_hashed += 1
+            self.bytes_hashed += st.st_size
+            if path.endswith(".gguf"):
+                fields["format"] = "gguf"
+                try:
+                    gguf = GGUFFile(path)
+                except GGUFError as e:
+                    # Keep the checksum; the header fields stay empty
+                    self.errors[path] = str(e)
+                    return fields
+                fields["name"] = gguf.name
+                fields.update({key: getattr(gguf, key) for key in GGUF_FIELDS})
+                try:
+                    gguf.validate()
+                except GGUFError as e:
+                    # Truncated copy: indexed, but reported
+                    self.errors[path] = str(e)
+                    return fields
+            self.errors.pop(path, None)
+            return fields
+        except (OSError, ValueError) as e:
+            self.errors[path] = str(e)
+            print(f"⚠️ Failed to index {path}: {e}")
+            return None
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                self.scan()
+            except Exception as e:
+                print(f"⚠️ Model index scan failed: {e}")
+            if self.interval_seconds <= 0:
+                self._wake.wait()
+            else:
+                self._wake.wait(self.interval_seconds)
+            self._wake.clear()
@@ -0,0 +1,229 @@
+"""
+Memory-bounded model pool for the Python gateway
+Keeps loaded Llama instances under a byte budget with LRU eviction
+"""
+from collections import OrderedDict
+from concurrent.futures import Future
+from contextlib import contextmanager
+import threading
+import time
+from typing import Any, Callable, Dict, Optional, Tuple
+
+
+class _PoolEntry:
+    """A loaded model plus its estimated footprint, pin count and owning entry"""
+
+    def __init__(self, model: Any, size_bytes: int, parent: Optional[str] = None):
+        self.model = model
+        self.size_bytes = size_bytes
+        self.parent = parent
+        self.pins = 0
+
+
+class ModelPool:
+    """
+    LRU cache of loaded models bounded by an estimated byte budget.
+
+    Models that are pinned (in use by a request) are never evicted. If the
+    budget cannot be met because everything left is pinned, the pool goes
+    over budget rather than failing the request, and reports it in stats().
+
+    An entry can belong to a parent entry (e.g. an extra llama context over
+    a model's weights); evicting the parent drops its children as well, or
+    as soon as they are unpinned.
+    """
+
+    def __init__(self, budget_bytes: int):
+        self.budget_bytes = budget_bytes
+        self._entries: "OrderedDict[str, _PoolEntry]" = OrderedDict()
+        self._lock = threading.RLock()
+        self._loading: Dict[str, Future] = {}
+        self.load_seconds: Dict[str, float] = {}
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.coalesced_loads = 0
+
+    @property
+    def used_bytes(self) -> int:
+        with self._lock:
+            return sum(e.size_bytes for e in self._entries.values())
+
+    def get(self, key: str, pin: bool = False) -> Optional[Any]:
+        """Return a cached model (marking it most recently used) or None"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._entries.move_to_end(key)
+            if pin:
+                entry.pins += 1
+            return entry.model
+
+    def get_or_load(
+        self,
+        key: str,
+        loader: Callable[[], Optional[Tuple[Any, int]]],
+        pin: bool = False,
+        parent: Optional[str] = None,
+    ) -> Optional[Any]:
+        """
+        Return a cached model, loading it at most once across threads.
+
+        The first caller for a missing key runs loader() and publishes the
+        result through a future; concurrent callers for the same key wait on
+        that future instead of loading the same weights again.
+
+        Args:
+            key: Pool key (model id + mode)
+            loader: Returns (model, size_bytes), or None if loading failed
+            pin: Pin the model for the caller before returning it
+            parent: Key of the entry this one is dropped with
+
+        Returns:
+            Loaded model, or None if loading failed
+        """
+        with self._lock:
+            model = self.get(key, pin=pin)
+            if model is not None:
+                return model
+            future = self._loading.get(key)
+            owner = future is None
+            if owner:
+                future = Future()
+                self._loading[key] = future
+            else:
+                self.coalesced_loads += 1
+
+        if not owner:
+            model = future.result()
+            if model is not None and pin:
+                with self._lock:
+                    entry = self._entries.get(key)
+                    if entry is not None and entry.model is model:
+                        entry.pins += 1
+            return model
+
+        start = time.time()
+        model = None
+        try:
+            loaded = loader()
+            if loaded is not None:
+                model, size_bytes = loaded
+                self.put(key, model, size_bytes, pin=pin, parent=parent)
+                self.load_seconds[key] = round(time.time() - start, 3)
+        finally:
+            # Waiters get None if the loader raised; the owner sees the error
+            with self._lock:
+                del self._loading[key]
+            future.set_result(model)
+        return model
+
+    def make_room(self, size_bytes: int) -> int:
+        """
+        Evict least-recently-used unpinned models until size_bytes fits.
+        Call before constructing a model so its memory is freed first.
+
+        Returns:
+            Number of models evicted
+        """
+        evicted = 0
+        with self._lock:
+            for key in list(self._entries):
+                if self.used_bytes + size_bytes <= self.budget_bytes:
+                    break
+                entry = self._entries.get(key)
+                if entry is None or entry.pins > 0:
+                    continue  # dropped with its parent, or in use
+                evicted += self._remove(key)
+                print(f"♻️  Evicted model from pool: {key} ({entry.size_bytes / 1e9:.2f} GB)")
+        return evicted
+
+    def put(self, key: str, model: Any, size_bytes: int, pin: bool = False, parent: Optional[str] = None):
+        """Insert a freshly loaded model as most recently used"""
+        with self._lock:
+            self.make_room(size_bytes)
+            entry = _PoolEntry(model, size_bytes, parent)
+            if pin:
+                entry.pins += 1
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            if self.used_bytes > self.budget_bytes:
+                print(f"⚠️ Model pool over budget: {self.used_bytes / 1e9:.2f} / "
+                      f"{self.budget_bytes / 1e9:.2f} GB (all other models are busy)")
+
+    def pin(self, key: str):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                entry.pins += 1
+
+    def unpin(self, key: str):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry.pins > 0:
+                entry.pins -= 1
+                if not entry.pins and entry.parent is not None and entry.parent not in self._entries:
+                    # Its parent was evicted while it was in use
+                    self._remove(key)
+
+    @contextmanager
+    def pinned(self, key: str):
+        """Keep a model resident for the duration of a with-block"""
+        self.pin(key)
+        try:
+            yield
+        finally:
+            self.unpin(key)
+
+    def evict(self, key: str) -> bool:
+        """Drop a model regardless of LRU order (refuses if pinned)"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry.pins > 0:
+                return False
+            self._remove(key)
+            return True
+
+    def _remove(self, key: str) -> int:
+        """Drop an entry and its unpinned children; returns how many were dropped"""
+        entry = self._entries.pop(key)
+        self._close(entry.model)
+        self.evictions += 1
+        removed = 1
+        for child_key, child in list(self._entries.items()):
+            if child.parent == key and child.pins == 0 and child_key in self._entries:
+                removed += self._remove(child_key)
+        return removed
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "budget_bytes": self.budget_bytes,
+                "used_bytes": self.used_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "coalesced_loads": self.coalesced_loads,
+                "loading": list(self._loading),
+                "load_seconds": dict(self.load_seconds),
+                "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+                "models": [
+                    {"key": key, "size_bytes": e.size_bytes, "pins": e.pins, "parent": e.parent}
+                    for key, e in self._entries.items()
+                ],
+            }
+
+    @staticmethod
+    def _close(model: Any):
+        # Newer llama-cpp-python releases expose close(); older ones free
+        # native memory when the last reference is dropped.
+        close = getattr(model, "close", None)
+        if callable(close):
+            try:
+                close()
+            except Exception as e:
+                print(f"⚠️ Error closing evicted model: {e}")
@@ -0,0 +1,194 @@
+"""
+Prompt-prefix KV-state cache for the Python gateway
+Lets requests that share a long prompt prefix skip re-evaluating it
+"""
+from collections import OrderedDict, deque
+import hashlib
+import os
+from pathlib import Path
+import pickle
+import threading
+from typing import Any, Deque, Dict, Optional, Sequence, Tuple
+
+
+def _token_key(tokens: Sequence[int]) -> str:
+    data = b"".join(int(t).to_bytes(4, "little", signed=True) for t in tokens)
+    return hashlib.blake2b(data, digest_size=16).hexdigest()
+
+
+def common_prefix_length(a: Sequence[int], b: Sequence[int]) -> int:
+    n = 0
+    for x, y in zip(a, b):
+        if x != y:
+            break
+        n += 1
+    return n
+
+
+def _state_bytes(state: Any) -> int:
+    size = getattr(state, "llama_state_size", 0)
+    for attr in ("scores", "input_ids"):
+        array = getattr(state, attr, None)
+        size += getattr(array, "nbytes", 0)
+    return size
+
+
+class PrefixKVCache:
+    """
+    LRU cache of saved llama states (KV cache + logits) keyed by the hash of
+    the token sequence they were saved after.
+
+    Implements llama-cpp-python's cache protocol (cache[tokens] returns the
+    entry sharing the longest token prefix), but the gateway restores and
+    saves states itself rather than installing it with llm.set_cache():
+    a saved state holds the whole KV cache, so it is only worth saving once
+    should_save() has seen a prompt prefix repeat. Entries evicted from RAM
+    can spill to a directory on disk (bounded separately) and are promoted
+    back to RAM on a hit.
+
+    Only use this for text-only contexts: LLaVA image embeddings are not part
+    of the token sequence, so a token-keyed state could restore the wrong image.
+    """
+
+    def __init__(
+        self,
+        capacity_bytes: int,
+        min_prefix_tokens: int = 16,
+        spill_dir: Optional[str] = None,
+        spill_capacity_bytes: int = 0,
+        recent_prompts: int = 64,
+    ):
+        self.capacity_bytes = capacity_bytes
+        self.min_prefix_tokens = min_prefix_tokens
+        self.spill_dir = Path(spill_dir) if spill_dir else None
+        self.spill_capacity_bytes = spill_capacity_bytes if spill_dir else 0
+        if self.spill_dir:
+            self.spill_dir.mkdir(parents=True, exist_ok=True)
+        # hash -> (tokens, state, size_bytes)
+        self._ram: "OrderedDict[str, Tuple[Tuple[int, ...], Any, int]]" = OrderedDict()
+        # hash -> (tokens, path, size_bytes)
+        self._disk: "OrderedDict[str, Tuple[Tuple[int, ...], Path, int]]" = OrderedDict()
+        # Recent prompts, to spot prefixes that repeat
+        self._recent: Deque[Tuple[int, ...]] = deque(maxlen=recent_prompts)
+        self._lock = threading.RLock()
+        self.hits = 0
+        self.misses = 0
+        self.disk_hits = 0
+        self.evictions = 0
+        self.tokens_reused = 0
+
+    @property
+    def cache_size(self) -> int:
+        with self._lock:
+            return sum(size for _, _, size in self._ram.values())
+
+    def longest_prefix(self, tokens: Sequence[int]) -> int:
+        """Length of the longest usable cached prefix of tokens (0 if none)"""
+        match = self._find(tokens)
+        return match[1] if match else 0
+
+    def should_save(self, prompt_tokens: Sequence[int]) -> bool:
+        """
+        Record a prompt and tell whether the state after it is worth saving:
+        it shares at least min_prefix_tokens with a recent prompt, and no
+        entry already covers that shared prefix.
+        """
+        tokens = tuple(int(t) for t in prompt_tokens)
+        with self._lock:
+            shared = max((common_prefix_length(p, tokens) for p in self._recent), default=0)
+            self._recent.append(tokens)
+        if shared < self.min_prefix_tokens:
+            return False
+        return self.longest_prefix(tokens) < shared
+
+    def _find(self, tokens: Sequence[int]) -> Optional[Tuple[str, int]]:
+        best_key, best_len = None, 0
+        with self._lock:
+            for table in (self._ram, self._disk):
+                for key, (cached_tokens, _, _) in table.items():
+                    n = common_prefix_length(cached_tokens, tokens)
+                    if n > best_len:
+                        best_key, best_len = key, n
+        if best_key is None or best_len < self.min_prefix_tokens:
+            return None
+        return best_key, best_len
+
+    # llama-cpp-python cache protocol
+
+    def __getitem__(self, key: Sequence[int]) -> Any:
+        match = self._find(key)
+        with self._lock:
+            if match is None:
+                self.misses += 1
+                raise KeyError("No cached prefix")
+            cache_key, prefix_len = match
+            if cache_key in self._ram:
+                tokens, state, _ = self._ram[cache_key]
+                self._ram.move_to_end(cache_key)
+            else:
+                tokens, path, _ = self._disk.pop(cache_key)
+                with open(path, "rb") as f:
+                    state = pickle.load(f)
+                path.unlink(missing_ok=True)
+                self._insert(cache_key, tokens, state)
+                self.disk_hits += 1
+            self.hits += 1
+            self.tokens_reused += prefix_len
+            return state
+
+    def __contains__(self, key: Sequence[int]) -> bool:
+        return self._find(key) is not None
+
+    def __setitem__(self, key: Sequence[int], value: Any):
+        tokens = tuple(int(t) for t in key)
+        with self._lock:
+            cache_key = _token_key(tokens)
+            self._ram.pop(cache_key, None)
+            self._drop_spilled(cache_key)
+            self._insert(cache_key, tokens, value)
+
+    def _insert(self, cache_key: str, tokens: Tuple[int, ...], state: Any):
+        self._ram[cache_key] = (tokens, state, _state_bytes(state))
+        while self.cache_size > self.capacity_bytes and self._ram:
+            old_key, (old_tokens, old_state, old_size) = self._ram.popitem(last=False)
+            self.evictions += 1
+            self._spill(old_key, old_tokens, old_state, old_size)
+
+    def _spill(self, cache_key: str, tokens: Tuple[int, ...], state: Any, size_bytes: int):
+        if not self.spill_dir or size_bytes > self.spill_capacity_bytes:
+            return
+        path = self.spill_dir / f"{cache_key}.state"
+        try:
+            with open(path, "wb") as f:
+                pickle.dump(state, f, protocol=pickle.HIGHEST_PROTOCOL)
+        except Exception as e:
+            print(f"⚠️ Failed to spill prefix cache entry: {e}")
+            return
+        self._disk[cache_key] = (tokens, path, size_bytes)
+        while sum(size for _, _, size in self._disk.values()) > self.spill_capacity_bytes:
+            old_key = next(iter(self._disk))
+            self._drop_spilled(old_key)
+
+    def _drop_spilled(self, cache_key: str):
+        entry = self._disk.pop(cache_key, None)
+        if entry is not None:
+            try:
+                os.unlink(entry[1])
+            except OSError:
+                pass
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "capacity_bytes": self.capacity_bytes,
+                "used_bytes": self.cache_size,
+                "entries": len(self._ram),
+                "spilled_entries": len(self._disk),
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "tokens_reused": self.tokens_reused,
+                "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+            }
@@ -0,0 +1,428 @@
+"""
+Model registry for the Python gateway
+Parsed hub/registry.json kept in memory (reloaded when the file changes),
+or an optional SQLite catalog with indexed search for large hubs
+"""
+from contextlib import contextmanager
+import copy
+import json
+import os
+from pathlib import Path
+import sqlite3
+import tempfile
+import threading
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+try:
+    import fcntl
+except ImportError:  # Windows: fall back to the in-process lock only
+    fcntl = None
+
+
+def _parse_cursor(cursor: Optional[str]) -> int:
+    """Offset or sequence number in a pagination cursor; ValueError if invalid"""
+    if not cursor:
+        return 0
+    value = int(cursor)
+    if value < 0:
+        raise ValueError(f"Invalid cursor: {cursor}")
+    return value
+
+
+class ModelRegistry:
+    """
+    In-memory view of the registry JSON file with an id -> card index.
+
+    Reads never touch the file while it is unchanged: each access costs one
+    stat(), and the file is re-parsed only when its mtime or size differs
+    from what was last loaded (e.g. after an edit by hand or by another
+    gateway process). Writes re-read the file, apply the change and replace
+    it atomically (write to a temp file, fsync, rename) while holding a
+    thread lock plus an flock on a sidecar lock file, so concurrent
+    registrations from threads or processes cannot interleave or leave a
+    truncated file behind.
+
+    Cards returned by list() and get() are shared; treat them as read-only.
+    """
+
+    def __init__(self, path: str):
+        self.path = Path(path)
+        self._lock = threading.RLock()
+        self._models: List[dict] = []
+        self._index: Dict[str, dict] = {}
+        self._signature: Optional[Tuple[int, int]] = None
+        self.reloads = 0
+
+    def list(self) -> List[dict]:
+        self._refresh()
+        with self._lock:
+            return list(self._models)
+
+    def get(self, model_id: str) -> Optional[dict]:
+        self._refresh()
+        with self._lock:
+            return self._index.get(model_id)
+
+    def search(
+        self,
+        task: Optional[str] = None,
+        arch: Optional[str] = None,
+        quantization: Optional[str] = None,
+        tag: Optional[str] = None,
+        target: Optional[str] = None,
+        q: Optional[str] = None,
+        limit: int = 100,
+        cursor: Optional[str] = None,
+    ) -> Dict[str, Any]:
+        """
+        Filter the catalog (linear scan; see SQLiteModelRegistry for large hubs)
+
+        Returns:
+            {"models": [...], "total": matches, "next_cursor": str or None}
+        """
+        words = q.lower().split() if q else []
+        matches = [
+            m for m in self.list()
+            if (not task or m.get("task") == task)
+            and (not arch or m.get("arch") == arch)
+            and (not quantization or m.get("quantization") == quantization)
+            and (not tag or tag in (m.get("tags") or []))
+            and (not target or target in (m.get("targets") or []))
+            and all(w in f"{m.get('name', '')} {m.get('readme_markdown') or ''}".lower() for w in words)
+        ]
+        start = _parse_cursor(cursor)
+        page = matches[start:start + limit]
+        more = start + limit < len(matches)
+        return {"models": page, "total": len(matches), "next_cursor": str(start + limit) if more else None}
+
+    def register(self, card: dict) -> dict:
+        """
+        Add a card, or replace the card with the same id. Cards without an
+        id get model-<n>. Returns the stored card.
+        """
+        def apply(models: List[dict]):
+            if not card.get("id"):
+                card["id"] = f"model-{len(models)+1}"
+            for i, m in enumerate(models):
+                if m.get("id") == card["id"]:
+                    models[i] = card
+                    return
+            models.append(card)
+
+        self.update(apply)
+        return card
+
+    def patch(self, model_id: str, apply: Callable[[dict], None]) -> Optional[dict]:
+        """
+        Apply an in-place change to one card and persist it atomically.
+        Returns the updated card, or None if there is no such model.
+        """
+        patched = []
+
+        def change(models: List[dict]):
+            for i, m in enumerate(models):
+                if m.get("id") == model_id:
+                    card = copy.deepcopy(m)
+                    apply(card)
+                    models[i] = card
+                    patched.append(card)
+                    return
+
+        self.update(change)
+        return patched[0] if patched else None
+
+    def add_downloads(self, counts: Dict[str, int]):
+        """Add to the download counters of several models in one write"""
+        def apply(models: List[dict]):
+            for m in models:
+                if m.get("id") in counts:
+                    m["downloads"] = int(m.get("downloads") or 0) + counts[m["id"]]
+
+        self.update(apply)
+
+    def update(self, apply: Callable[[List[dict]], None]):
+        """Apply an in-place change to the model list and persist it atomically"""
+        with self._lock, self._file_lock():
+            self._signature = None
+            self._refresh()
+            models = [dict(m) for m in self._models]
+            apply(models)
+            self._write(models)
+            self._set(models, self._stat())
+
+    def _refresh(self):
+        signature = self._stat()
+        if signature == self._signature:
+            return
+        with self._lock:
+            if signature == self._signature:
+                return
+            if signature is None:
+                self._set([], None)
+                return
+            try:
+                with open(self.path) as f:
+                    models = json.load(f)
+            except (OSError, ValueError) as e:
+                # Keep serving the last good copy; retry on the next change
+                print(f"⚠️ Failed to load registry {self.path}: {e}")
+                self._signature = signature
+                return
+            self._set(models, signature)
+            self.reloads += 1
+
+    def _set(self, models: List[dict], signature: Optional[Tuple[int, int]]):
+        self._models = models
+        self._index = {m.get("id"): m for m in models}
+        self._signature = signature
+
+    def _stat(self) -> Optional[Tuple[int, int]]:
+        try:
+            st = os.stat(self.path)
+        except OSError:
+            return None
+        return st.st_mtime_ns, st.st_size
+
+    def _write(self, models: List[dict]):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=self.path.parent, prefix=f".{self.path.name}.", suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w") as f:
+                json.dump(models, f, indent=2)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self.path)
+        except BaseException:
+            try:
+                os.unlink(tmp_path)
+            except OSError:
+                pass
+            raise
+
+    @contextmanager
+    def _file_lock(self):
+        if fcntl is None:
+            yield
+            return
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with open(f"{self.path}.lock", "a") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+class SQLiteModelRegistry:
+    """
+    Model catalog stored in SQLite, for hubs with thousands of models.
+
+    Same interface as ModelRegistry. Cards are stored as JSON next to
+    indexed columns (task, arch, quantization), tag/target link tables and
+    an FTS5 index over name and README, so filtered, paginated queries
+    touch only the matching rows. Pagination uses a keyset cursor on the
+    insertion sequence, which stays cheap at any depth and stable while
+    models are added. On first start an empty database imports the JSON
+    registry.
+    """
+
+    _SCHEMA = """
+        CREATE TABLE IF NOT EXISTS models (
+            seq INTEGER PRIMARY KEY AUTOINCREMENT,
+            id TEXT NOT NULL UNIQUE,
+            name TEXT,
+            task TEXT,
+            arch TEXT,
+            quantization TEXT,
+            downloads INTEGER NOT NULL DEFAULT 0,
+            card TEXT NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS idx_models_task ON models(task, seq);
+        CREATE INDEX IF NOT EXISTS idx_models_arch ON models(arch, seq);
+        CREATE INDEX IF NOT EXISTS idx_models_quantization ON models(quantization, seq);
+        CREATE TABLE IF NOT EXISTS model_tags (
+            tag TEXT NOT NULL,
+            seq INTEGER NOT NULL REFERENCES models(seq) ON DELETE CASCADE,
+            PRIMARY KEY (tag, seq)
+        ) WITHOUT ROWID;
+        CREATE TABLE IF NOT EXISTS model_targets (
+            target TEXT NOT NULL,
+            seq INTEGER NOT NULL REFERENCES models(seq) ON DELETE CASCADE,
+            PRIMARY KEY (target, seq)
+        ) WITHOUT ROWID;
+    """
+
+    def __init__(self, db_path: str, import_path: Optional[str] = None):
+        self.db_path = db_path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA foreign_keys=ON")
+        self._conn.executescript(self._SCHEMA)
+        try:
+            self._conn.execute(
+                "CREATE VIRTUAL TABLE IF NOT EXISTS models_fts USING fts5(name, readme)"
+            )
+            self.fts = True
+        except sqlite3.OperationalError:
+            # SQLite built without FTS5: search falls back to LIKE
+            self.fts = False
+        self._conn.commit()
+
+        if import_path and self._count() == 0 and os.path.exists(import_path):
+            models = ModelRegistry(import_path).list()
+            with self._lock, self._conn:
+                for card in models:
+                    self._upsert(dict(card))
+            print(f"✅ Imported {len(models)} models from {import_path} into {db_path}")
+
+    def list(self) -> List[dict]:
+        with self._lock:
+            rows = self._conn.execute("SELECT card, downloads FROM models ORDER BY seq").fetchall()
+        return [self._card(row) for row in rows]
+
+    def get(self, model_id: str) -> Optional[dict]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT card, downloads FROM models WHERE id = ?", (model_id,)
+            ).fetchone()
+        return self._card(row) if row else None
+
+    def search(
+        self,
+        task: Optional[str] = None,
+        arch: Optional[str] = None,
+        quantization: Optional[str] = None,
+        tag: Optional[str] = None,
+        target: Optional[str] = None,
+        q: Optional[str] = None,
+        limit: int = 100,
+        cursor: Optional[str] = None,
+    ) -> Dict[str, Any]:
+        """
+        Indexed, paginated query over the catalog
+
+        Returns:
+            {"models": [...], "total": matches, "next_cursor": str or None}
+        """
+        where, args = [], []
+        for column, value in (("task", task), ("arch", arch), ("quantization", quantization)):
+            if value:
+                where.append(f"{column} = ?")
+                args.append(value)
+        if tag:
+            where.append("seq IN (SELECT seq FROM model_tags WHERE tag = ?)")
+            args.append(tag)
+        if target:
+            where.append("seq IN (SELECT seq FROM model_targets WHERE target = ?)")
+            args.append(target)
+        if q and q.strip():
+            if self.fts:
+                # Every word must match, as a prefix; quoting keeps user
+                # input from being parsed as FTS query syntax
+                match = " ".join('"{}"*'.format(w.replace('"', '""')) for w in q.split())
+                where.append("seq IN (SELECT rowid FROM models_fts WHERE models_fts MATCH ?)")
+                args.append(match)
+            else:
+                for word in q.split():
+                    where.append("(name LIKE ? OR json_extract(card, '$.readme_markdown') LIKE ?)")
+                    args.extend([f"%{word}%"] * 2)
+
+        clause = f"WHERE {' AND '.join(where)}" if where else ""
+        page_clause = f"{clause} {'AND' if where else 'WHERE'} seq > ?" if cursor else clause
+        page_args = args + [_parse_cursor(cursor)] if cursor else args
+        with self._lock:
+            total = self._conn.execute(f"SELECT COUNT(*) FROM models {clause}", args).fetchone()[0]
+            rows = self._conn.execute(
+                f"SELECT seq, card, downloads FROM models {page_clause} ORDER BY seq LIMIT ?",
+                page_args + [limit + 1],
+            ).fetchall()
+        more = len(rows) > limit
+        rows = rows[:limit]
+        return {
+            "models": [self._card(row[1:]) for row in rows],
+            "total": total,
+            "next_cursor": str(rows[-1][0]) if more else None,
+        }
+
+    def register(self, card: dict) -> dict:
+        """
+        Add a card, or replace the card with the same id. Cards without an
+        id get model-<n>. Returns the stored card.
+        """
+        with self._lock, self._conn:
+            if not card.get("id"):
+                count = self._conn.execute("SELECT COUNT(*) FROM models").fetchone()[0]
+                card["id"] = f"model-{count+1}"
+            self._upsert(card)
+        return card
+
+    def patch(self, model_id: str, apply: Callable[[dict], None]) -> Optional[dict]:
+        """
+        Apply an in-place change to one card in a single transaction.
+        Returns the updated card, or None if there is no such model.
+        """
+        with self._lock, self._conn:
+            row = self._conn.execute(
+                "SELECT card, downloads FROM models WHERE id = ?", (model_id,)
+            ).fetchone()
+            if not row:
+                return None
+            card = self._card(row)
+            apply(card)
+            card["id"] = model_id
+            self._upsert(card)
+        return card
+
+    def add_downloads(self, counts: Dict[str, int]):
+        """Add to the download counters of several models in one transaction"""
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "UPDATE models SET downloads = downloads + ? WHERE id = ?",
+                [(count, model_id) for model_id, count in counts.items()],
+            )
+
+    def _upsert(self, card: dict):
+        fields = (
+            card.get("name"), card.get("task"), card.get("arch"),
+            card.get("quantization"), int(card.get("downloads") or 0), json.dumps(card),
+        )
+        row = self._conn.execute("SELECT seq FROM models WHERE id = ?", (card["id"],)).fetchone()
+        if row:
+            seq = row[0]
+            self._conn.execute(
+                "UPDATE models SET name = ?, task = ?, arch = ?, quantization = ?, downloads = ?, card = ? "
+                "WHERE seq = ?", fields + (seq,)
+            )
+            self._conn.execute("DELETE FROM model_tags WHERE seq = ?", (seq,))
+            self._conn.execute("DELETE FROM model_targets WHERE seq = ?", (seq,))
+            if self.fts:
+                self._conn.execute("DELETE FROM models_fts WHERE rowid = ?", (seq,))
+        else:
+            seq = self._conn.execute(
+                "INSERT INTO models (name, task, arch, quantization, downloads, card, id) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)", fields + (card["id"],)
+            ).lastrowid
+        self._conn.executemany(
+            "INSERT OR IGNORE INTO model_tags (tag, seq) VALUES (?, ?)",
+            [(t, seq) for t in card.get("tags") or []],
+        )
+        self._conn.executemany(
+            "INSERT OR IGNORE INTO model_targets (target, seq) VALUES (?, ?)",
+            [(t, seq) for t in card.get("targets") or []],
+        )
+        if self.fts:
+            self._conn.execute(
+                "INSERT INTO models_fts (rowid, name, readme) VALUES (?, ?, ?)",
+                (seq, card.get("name") or "", card.get("readme_markdown") or ""),
+            )
+
+    def _count(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM models").fetchone()[0]
+
+    @staticmethod
+    def _card(row) -> dict:
+        card = json.loads(row[0])
+        card["downloads"] = row[1]
+        return card
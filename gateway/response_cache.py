@@ -0,0 +1,175 @@
+"""
+Exact-match response cache for the Python gateway
+Serves repeated deterministic generation requests without running the model
+"""
+from collections import OrderedDict
+import hashlib
+import json
+import os
+from pathlib import Path
+import tempfile
+import threading
+import time
+from typing import Any, Dict, Optional, Tuple
+
+
+class ResponseCache:
+    """
+    TTL + LRU cache of generation responses keyed by the request that
+    produced them.
+
+    Only deterministic requests (temperature 0) are cacheable: their output
+    depends on nothing but the model and the request, so replaying a stored
+    response is indistinguishable from recomputing it.
+
+    With disk_dir set, entries are also written there as one JSON file per
+    key (atomic rename), so several gateway processes pointed at the same
+    directory share hits. The in-memory LRU stays in front of it.
+
+    Fields describing how the original request was served (ids, latency,
+    queueing, throughput) are not stored; the caller fills them in for
+    each hit.
+    """
+
+    PER_REQUEST_FIELDS = (
+        "id", "latency_ms", "latency_breakdown_ms", "tokens_per_sec",
+        "prompt_tokens_reused", "queue", "cache",
+    )
+
+    def __init__(
+        self,
+        max_entries: int = 1024,
+        ttl_seconds: float = 3600,
+        disk_dir: Optional[str] = None,
+        disk_max_entries: int = 10000,
+    ):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.disk_dir = Path(disk_dir) if disk_dir else None
+        self.disk_max_entries = disk_max_entries
+        if self.disk_dir:
+            self.disk_dir.mkdir(parents=True, exist_ok=True)
+        # key -> (stored_at, response)
+        self._entries: "OrderedDict[str, Tuple[float, dict]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.bypassed = 0
+        self.stores = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    @staticmethod
+    def cacheable(temperature: float) -> bool:
+        return temperature is not None and float(temperature) == 0.0
+
+    @staticmethod
+    def key(model_id: str, prompt: str, max_tokens: int, temperature: float, top_p: float) -> str:
+        request = [model_id, prompt, int(max_tokens), float(temperature), float(top_p)]
+        return hashlib.sha256(json.dumps(request).encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[dict]:
+        """Return a copy of the cached response, or None"""
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                stored_at, response = entry
+                if now - stored_at <= self.ttl_seconds:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return dict(response)
+                del self._entries[key]
+                self.expirations += 1
+
+        entry = self._read_disk(key, now)
+        with self._lock:
+            if entry is None:
+                self.misses += 1
+                return None
+            self._insert(key, *entry)
+            self.hits += 1
+            self.disk_hits += 1
+            return dict(entry[1])
+
+    def put(self, key: str, response: dict):
+        stored_at = time.time()
+        response = {k: v for k, v in response.items() if k not in self.PER_REQUEST_FIELDS}
+        with self._lock:
+            self._insert(key, stored_at, response)
+            self.stores += 1
+        self._write_disk(key, stored_at, response)
+
+    def bypass(self):
+        """Count a request that was not eligible for caching"""
+        with self._lock:
+            self.bypassed += 1
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl_seconds": self.ttl_seconds,
+                "disk_dir": str(self.disk_dir) if self.disk_dir else None,
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "bypassed": self.bypassed,
+                "stores": self.stores,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+            }
+
+    def _insert(self, key: str, stored_at: float, response: dict):
+        self._entries[key] = (stored_at, response)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def _read_disk(self, key: str, now: float) -> Optional[Tuple[float, dict]]:
+        if not self.disk_dir:
+            return None
+        path = self.disk_dir / f"{key}.json"
+        try:
+            with open(path, "r") as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if now - entry["stored_at"] > self.ttl_seconds:
+            try:
+                path.unlink()
+            except OSError:
+                pass
+            with self._lock:
+                self.expirations += 1
+            return None
+        return entry["stored_at"], entry["response"]
+
+    def _write_disk(self, key: str, stored_at: float, response: dict):
+        if not self.disk_dir:
+            return
+        try:
+            # Write then rename so other processes never read a partial file
+            fd, tmp_path = tempfile.mkstemp(dir=self.disk_dir, suffix=".tmp")
+            with os.fdopen(fd, "w") as f:
+                json.dump({"stored_at": stored_at, "response": response}, f)
+            os.replace(tmp_path, self.disk_dir / f"{key}.json")
+            self._prune_disk()
+        except OSError as e:
+            print(f"⚠️ Failed to write response cache entry: {e}")
+
+    def _prune_disk(self):
+        entries = [e for e in os.scandir(self.disk_dir) if e.name.endswith(".json")]
+        if len(entries) <= self.disk_max_entries:
+            return
+        entries.sort(key=lambda e: e.stat().st_mtime)
+        for entry in entries[:len(entries) - self.disk_max_entries]:
+            try:
+                os.unlink(entry.path)
+            except OSError:
+                pass
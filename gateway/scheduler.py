@@ -0,0 +1,274 @@
+"""
+Per-model generation scheduler for the Python gateway
+Admission queue + round-based decode loop over a fixed number of sequence slots
+"""
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+import queue
+import threading
+import time
+from typing import Any, Callable, Deque, Dict, Iterator, List, Optional
+
+_DONE = object()
+
+
+class GenerationJob:
+    """
+    One queued or running generation request.
+    Iterate it to receive llama-cpp stream chunks as they are decoded.
+    """
+
+    def __init__(self, start: Callable[[Any], Iterator[dict]], queue_depth: int):
+        self.start = start
+        self.queue_depth = queue_depth
+        self.submitted_at = time.time()
+        self.admitted_at: Optional[float] = None
+        self.started_at: Optional[float] = None
+        self.first_token_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self.slot: Optional[int] = None
+        self.llm: Any = None
+        self.tokens = 0
+        self.iterator: Optional[Iterator[dict]] = None
+        self.cancelled = False
+        self.error: Optional[BaseException] = None
+        self.paused_since: Optional[float] = None
+        self._chunks: "queue.Queue" = queue.Queue()
+        self._wake: Callable[[], None] = lambda: None
+
+    @property
+    def wait_ms(self) -> float:
+        """Time spent in the admission queue"""
+        admitted = self.admitted_at or time.time()
+        return round((admitted - self.submitted_at) * 1000, 2)
+
+    def cancel(self):
+        """Stop decoding this job at the next step boundary"""
+        self.cancelled = True
+        self._wake()
+
+    def __iter__(self):
+        try:
+            while True:
+                chunk = self._chunks.get()
+                if chunk is _DONE:
+                    if self.error is not None:
+                        raise self.error
+                    return
+                # Lets the scheduler resume the sequence if it paused for us
+                self._wake()
+                yield chunk
+        finally:
+            # Consumer closed or dropped the iterator
+            if self.finished_at is None:
+                self.cancel()
+
+
+class GenerationScheduler:
+    """
+    Schedules text generation for one model.
+
+    Requests wait in a FIFO admission queue until one of max_sequences slots
+    is free. Each slot is its own llama context; the scheduler runs in rounds
+    and every active sequence advances exactly one decode step per round, so
+    long generations cannot starve short ones. With more than one slot the
+    steps of a round run in parallel (llama-cpp releases the GIL while
+    decoding), which is what lets aggregate tokens/sec grow with concurrency.
+    New requests join and finished ones leave at round boundaries. A
+    sequence whose consumer has max_buffered chunks unread sits out rounds
+    until it catches up, and is cancelled after stall_timeout seconds of
+    that; dropping the job's iterator cancels it too. Starting
+    a request (loading a slot's llama context if needed and evaluating the
+    prompt up to the first token) happens on a loader thread, so a long
+    prompt does not stall the sequences already decoding.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        acquire_slot: Callable[[int], Any],
+        release_slot: Callable[[int], None],
+        max_sequences: int = 1,
+        max_buffered: int = 32,
+        stall_timeout: float = 60.0,
+    ):
+        """
+        Args:
+            name: Model id, used in logs and stats
+            acquire_slot: Returns the llama context for a slot index (or None)
+            release_slot: Called when a slot goes idle
+            max_sequences: Maximum number of concurrently decoding requests
+            max_buffered: Unread chunks at which a sequence pauses
+            stall_timeout: Seconds a sequence may stay paused before it is cancelled
+        """
+        self.name = name
+        self.max_sequences = max(1, max_sequences)
+        self.max_buffered = max(1, max_buffered)
+        self.stall_timeout = stall_timeout
+        self._acquire_slot = acquire_slot
+        self._release_slot = release_slot
+        self._pending: Deque[GenerationJob] = deque()
+        self._active: List[GenerationJob] = []
+        self._free_slots = list(range(self.max_sequences))
+        self._cond = threading.Condition()
+        self._executor = (
+            ThreadPoolExecutor(max_workers=self.max_sequences, thread_name_prefix=f"decode-{name}")
+            if self.max_sequences > 1 else None
+        )
+        self._loader = ThreadPoolExecutor(max_workers=self.max_sequences, thread_name_prefix=f"start-{name}")
+        self._thread: Optional[threading.Thread] = None
+        self.completed = 0
+        self.tokens_generated = 0
+        self.total_wait_ms = 0.0
+        self.stalled = 0
+
+    def submit(self, start: Callable[[Any], Iterator[dict]]) -> GenerationJob:
+        """
+        Queue a request.
+
+        Args:
+            start: Given the slot's llama context, returns a stream iterator
+                   (e.g. lambda llm: llm(prompt, stream=True))
+        """
+        with self._cond:
+            job = GenerationJob(start, queue_depth=len(self._pending))
+            job._wake = self._wake
+            self._pending.append(job)
+            if self._thread is None:
+                self._thread = threading.Thread(
+                    target=self._run, name=f"scheduler-{self.name}", daemon=True
+                )
+                self._thread.start()
+            self._cond.notify()
+        return job
+
+    def stats(self) -> Dict[str, Any]:
+        with self._cond:
+            return {
+                "max_sequences": self.max_sequences,
+                "queue_depth": len(self._pending),
+                "active_sequences": len(self._active),
+                "completed": self.completed,
+                "tokens_generated": self.tokens_generated,
+                "stalled": self.stalled,
+                "avg_wait_ms": round(self.total_wait_ms / self.completed, 2) if self.completed else 0.0,
+            }
+
+    def _run(self):
+        while True:
+            with self._cond:
+                # Sleep while nothing can be admitted and every active job is
+                # still starting or paused; poll so paused jobs can time out
+                while not (self._pending and self._free_slots) and not any(
+                    j.finished_at is not None or self._runnable(j) for j in self._active
+                ):
+                    self._cond.wait(timeout=1.0 if self._active else None)
+                admitted = self._admit()
+
+            for job in admitted:
+                self._loader.submit(self._start, job)
+
+            active = [job for job in self._active if self._runnable(job)]
+            if self._executor and len(active) > 1:
+                list(self._executor.map(self._step, active))
+            else:
+                for job in active:
+                    self._step(job)
+
+            with self._cond:
+                for job in [j for j in self._active if j.finished_at is not None]:
+                    self._active.remove(job)
+                    self._free_slots.append(job.slot)
+                    if job.llm is not None:
+                        self._release_slot(job.slot)
+                    self.completed += 1
+                    self.tokens_generated += job.tokens
+                    self.total_wait_ms += job.wait_ms
+
+    def _wake(self):
+        with self._cond:
+            self._cond.notify()
+
+    def _runnable(self, job: GenerationJob) -> bool:
+        """Whether a job takes part in the next round (scheduler thread only)"""
+        if job.iterator is None or job.finished_at is not None:
+            return False
+        if job.cancelled or job._chunks.qsize() < self.max_buffered:
+            job.paused_since = None
+            return True
+        now = time.time()
+        if job.paused_since is None:
+            job.paused_since = now
+        elif now - job.paused_since > self.stall_timeout:
+            # Nobody is reading: the next step finishes the job
+            job.cancelled = True
+            self.stalled += 1
+            return True
+        return False
+
+    def _admit(self) -> List[GenerationJob]:
+        admitted = []
+        while self._pending and self._free_slots:
+            job = self._pending.popleft()
+            if job.cancelled:
+                self._finish(job)
+                continue
+            job.slot = self._free_slots.pop(0)
+            job.admitted_at = time.time()
+            self._active.append(job)
+            admitted.append(job)
+        return admitted
+
+    def _start(self, job: GenerationJob):
+        iterator = None
+        try:
+            job.llm = self._acquire_slot(job.slot)
+            if job.llm is None:
+                raise RuntimeError(f"Model '{self.name}' not available")
+            # Acquiring the slot may have built its llama context
+            job.started_at = time.time()
+            iterator = job.start(job.llm)
+            # The first step evaluates the prompt; the job only joins the
+            # decode rounds once it has produced its first token
+            chunk = next(iterator, _DONE)
+        except Exception as e:
+            job.error = e
+            chunk = _DONE
+        with self._cond:
+            job.iterator = iterator
+            if chunk is _DONE:
+                self._finish(job)
+            else:
+                self._deliver(job, chunk)
+            self._cond.notify()
+
+    def _step(self, job: GenerationJob):
+        if job.cancelled:
+            self._finish(job)
+            return
+        try:
+            chunk = next(job.iterator, _DONE)
+        except Exception as e:
+            job.error = e
+            chunk = _DONE
+        if chunk is _DONE:
+            self._finish(job)
+            return
+        self._deliver(job, chunk)
+
+    def _deliver(self, job: GenerationJob, chunk: dict):
+        if job.first_token_at is None:
+            job.first_token_at = time.time()
+        job.tokens += 1
+        job._chunks.put(chunk)
+
+    def _finish(self, job: GenerationJob):
+        if job.finished_at is not None:
+            return
+        if job.iterator is not None and hasattr(job.iterator, "close"):
+            try:
+                job.iterator.close()
+            except Exception:
+                pass
+        job.finished_at = time.time()
+        job._chunks.put(_DONE)
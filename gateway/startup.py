@@ -0,0 +1,139 @@
+"""
+Startup profiling and background warmup for the Python gateway
+Per-module import timings, and heavy imports / model loads moved off the startup path
+"""
+import importlib
+import importlib.abc
+import sys
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+
+class ImportProfiler(importlib.abc.MetaPathFinder):
+    """
+    Records how long each module takes to import (like python -X importtime).
+
+    Installed first on sys.meta_path, it finds each module's spec with the
+    remaining finders and wraps that module's exec_module, so timings cover
+    executing the module body, including the imports it triggers
+    (cumulative) and excluding them (self).
+    """
+
+    def __init__(self):
+        self.timings: Dict[str, Dict[str, float]] = {}
+        self._local = threading.local()
+        self._lock = threading.Lock()
+
+    def install(self):
+        if self not in sys.meta_path:
+            sys.meta_path.insert(0, self)
+
+    def uninstall(self):
+        if self in sys.meta_path:
+            sys.meta_path.remove(self)
+
+    def find_spec(self, fullname, path, target=None):
+        for finder in sys.meta_path:
+            if finder is self or not hasattr(finder, "find_spec"):
+                continue
+            spec = finder.find_spec(fullname, path, target)
+            if spec is not None:
+                break
+        else:
+            return None
+        loader = spec.loader
+        # Builtin and frozen importers are classes shared by every module
+        if loader is None or isinstance(loader, type) or not hasattr(loader, "exec_module"):
+            return spec
+        try:
+            loader.exec_module = self._timed(fullname, loader.exec_module)
+        except (AttributeError, TypeError):
+            pass
+        return spec
+
+    def _timed(self, name: str, exec_module: Callable) -> Callable:
+        def exec_timed(module):
+            stack = getattr(self._local, "stack", None)
+            if stack is None:
+                stack = self._local.stack = []
+            stack.append(0.0)  # time spent importing children
+            start = time.perf_counter()
+            try:
+                exec_module(module)
+            finally:
+                elapsed = time.perf_counter() - start
+                children = stack.pop()
+                if stack:
+                    stack[-1] += elapsed
+                with self._lock:
+                    self.timings[name] = {
+                        "cumulative_ms": round(elapsed * 1000, 2),
+                        "self_ms": round((elapsed - children) * 1000, 2),
+                    }
+        return exec_timed
+
+    def report(self, top: int = 30) -> List[Dict[str, Any]]:
+        """Slowest modules by cumulative import time"""
+        with self._lock:
+            items = sorted(self.timings.items(), key=lambda kv: kv[1]["cumulative_ms"], reverse=True)
+        return [{"module": name, **timing} for name, timing in items[:top]]
+
+
+class Warmup:
+    """
+    Imports heavy modules and loads models on a background thread, so the
+    server starts answering (health checks, the UI) right away and the
+    first real request does not pay for them.
+    """
+
+    def __init__(self, modules: List[str], models: List[str], load_model: Callable[[str], Any]):
+        """
+        Args:
+            modules: Module names to import, in order
+            models: Model ids to load after the imports
+            load_model: Loads one model id; returns a falsy value on failure
+        """
+        self.modules = modules
+        self.models = models
+        self._load_model = load_model
+        self._thread: Optional[threading.Thread] = None
+        self.imports: Dict[str, Any] = {}  # module -> ms, or an error string
+        self.loaded: Dict[str, Any] = {}  # model id -> ms, or an error string
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+
+    def start(self):
+        if self._thread is None and (self.modules or self.models):
+            self._thread = threading.Thread(target=self._run, name="gateway-warmup", daemon=True)
+            self._thread.start()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "modules": self.modules,
+            "models": self.models,
+            "running": self._thread is not None and self._thread.is_alive(),
+            "imports_ms": dict(self.imports),
+            "models_ms": dict(self.loaded),
+            "total_ms": round((self.finished_at - self.started_at) * 1000, 2) if self.finished_at else None,
+        }
+
+    def _run(self):
+        self.started_at = time.time()
+        for name in self.modules:
+            start = time.perf_counter()
+            try:
+                importlib.import_module(name)
+                self.imports[name] = round((time.perf_counter() - start) * 1000, 2)
+            except Exception as e:
+                # Optional dependency not installed: the feature reports it on use
+                self.imports[name] = f"{type(e).__name__}: {e}"
+        for model_id in self.models:
+            start = time.perf_counter()
+            try:
+                ok = self._load_model(model_id)
+                self.loaded[model_id] = round((time.perf_counter() - start) * 1000, 2) if ok else "failed to load"
+            except Exception as e:
+                self.loaded[model_id] = f"{type(e).__name__}: {e}"
+            print(f"{'✅' if isinstance(self.loaded[model_id], float) else '⚠️'} Warmup {model_id}: {self.loaded[model_id]}")
+        self.finished_at = time.time()
@@ -0,0 +1,246 @@
+"""
+Inference worker processes for the Python gateway
+Runs blocking model inference outside the server process so the event loop stays responsive
+"""
+import asyncio
+from concurrent.futures import Future
+import itertools
+import multiprocessing as mp
+from multiprocessing.shared_memory import SharedMemory
+import queue
+import threading
+from typing import Any, Callable, Dict, List, Optional
+
+
+def _worker_main(index: int, handler: Callable[[dict], dict], requests, responses):
+    """Worker loop: attach the shared image buffer, run the handler, reply"""
+    while True:
+        message = requests.get()
+        if message is None:
+            break
+        request_id, task, shm_name, sizes, is_list = message
+        shm = None
+        views = []
+        try:
+            if shm_name:
+                # Spawned workers share the parent's resource tracker, so
+                # attaching here does not transfer ownership; the parent unlinks.
+                shm = SharedMemory(name=shm_name)
+                offset = 0
+                for size in sizes:
+                    views.append(shm.buf[offset:offset + size])
+                    offset += size
+            if is_list:
+                task["image_data"] = views
+            elif views:
+                task["image_data"] = views[0]
+            responses.put((request_id, handler(task), None))
+        except Exception as e:
+            responses.put((request_id, None, f"{type(e).__name__}: {e}"))
+        finally:
+            task.pop("image_data", None)
+            for view in views:
+                view.release()
+            if shm is not None:
+                try:
+                    shm.close()
+                except BufferError:
+                    # A handler kept a reference to the buffer; it is freed
+                    # when that object is collected.
+                    pass
+
+
+class _Worker:
+    def __init__(self, index: int, handler: Callable[[dict], dict], ctx):
+        self.index = index
+        self.requests = ctx.Queue()
+        self.responses = ctx.Queue()
+        self.process = ctx.Process(
+            target=_worker_main,
+            args=(index, handler, self.requests, self.responses),
+            name=f"inference-worker-{index}",
+            daemon=True,
+        )
+        self.process.start()
+        self.pending: Dict[int, Future] = {}
+        self.segments: Dict[int, SharedMemory] = {}
+        self.completed = 0
+        self.restarts = 0
+
+    def close_queues(self, flush: bool = True):
+        """Close both queues; without flush, unsent requests are dropped"""
+        for q in (self.requests, self.responses):
+            q.close()
+            if flush:
+                q.join_thread()
+            else:
+                q.cancel_join_thread()
+
+
+class InferenceWorkerPool:
+    """
+    Pool of inference worker processes, each owning the models it has loaded.
+
+    Requests are routed by model id: the first request for a model assigns it
+    to the worker with the fewest models, and later requests for that model
+    always go to the same worker so its weights are loaded only once. Image
+    bytes travel through a shared-memory segment instead of being pickled
+    into the queue, so the worker reads them in place.
+    """
+
+    def __init__(self, num_workers: int, handler: Callable[[dict], dict]):
+        """
+        Args:
+            num_workers: Number of worker processes
+            handler: Module-level function run in the worker for each task
+        """
+        # spawn, not fork: the server process has live threads (schedulers,
+        # llama-cpp) that must not be duplicated into the children.
+        self._ctx = mp.get_context("spawn")
+        self._handler = handler
+        self._ids = itertools.count()
+        self._lock = threading.Lock()
+        self._routes: Dict[str, int] = {}
+        self._closed = False
+        self._workers: List[_Worker] = [
+            _Worker(i, handler, self._ctx) for i in range(max(1, num_workers))
+        ]
+        self._readers = [
+            threading.Thread(target=self._read_responses, args=(i,), daemon=True)
+            for i in range(len(self._workers))
+        ]
+        for reader in self._readers:
+            reader.start()
+
+    def route(self, model_id: str) -> int:
+        """Worker index that owns a model (assigning one if needed)"""
+        with self._lock:
+            if model_id not in self._routes:
+                counts = [0] * len(self._workers)
+                for index in self._routes.values():
+                    counts[index] += 1
+                self._routes[model_id] = counts.index(min(counts))
+            return self._routes[model_id]
+
+    def submit(self, model_id: str, task: dict) -> Future:
+        """
+        Send a task to the worker owning model_id.
+        task["image_data"] (bytes, or a list of bytes for multi-frame tasks)
+        is moved into one shared-memory segment.
+        """
+        task = dict(task)
+        image_data = task.pop("image_data", None)
+        is_list = isinstance(image_data, list)
+        frames = image_data if is_list else ([image_data] if image_data else [])
+        sizes = [len(frame) for frame in frames]
+        future: Future = Future()
+        request_id = next(self._ids)
+
+        shm = None
+        if sum(sizes):
+            shm = SharedMemory(create=True, size=sum(sizes))
+            offset = 0
+            for frame in frames:
+                shm.buf[offset:offset + len(frame)] = frame
+                offset += len(frame)
+
+        index = self.route(model_id)
+        with self._lock:
+            worker = self._workers[index]
+            worker.pending[request_id] = future
+            if shm is not None:
+                worker.segments[request_id] = shm
+        worker.requests.put((request_id, task, shm.name if shm else None, sizes, is_list))
+        return future
+
+    async def run(self, model_id: str, task: dict) -> dict:
+        """Awaitable wrapper around submit() for async endpoints"""
+        return await asyncio.wrap_future(self.submit(model_id, task))
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "workers": [
+                    {
+                        "index": w.index,
+                        "pid": w.process.pid,
+                        "alive": w.process.is_alive(),
+                        "in_flight": len(w.pending),
+                        "completed": w.completed,
+                        "restarts": w.restarts,
+                        "models": sorted(m for m, i in self._routes.items() if i == w.index),
+                    }
+                    for w in self._workers
+                ],
+            }
+
+    def close(self):
+        """Stop the workers, then release their queues and any in-flight buffers"""
+        self._closed = True
+        for worker in self._workers:
+            worker.requests.put(None)
+        for worker in self._workers:
+            worker.process.join(timeout=5)
+            if worker.process.is_alive():
+                worker.process.terminate()
+                worker.process.join()
+        for reader in self._readers:
+            reader.join()
+        with self._lock:
+            workers = list(self._workers)
+        for worker in workers:
+            # A terminated worker may have left requests unread in the pipe
+            worker.close_queues(flush=worker.process.exitcode == 0)
+            worker.process.close()
+            for shm in worker.segments.values():
+                self._release(shm)
+            for future in worker.pending.values():
+                future.set_exception(RuntimeError("Inference worker pool closed"))
+            worker.segments.clear()
+            worker.pending.clear()
+
+    def _read_responses(self, index: int):
+        while not self._closed:
+            worker = self._workers[index]
+            try:
+                request_id, result, error = worker.responses.get(timeout=1.0)
+            except queue.Empty:
+                if not worker.process.is_alive() and not self._closed:
+                    self._restart(index, worker)
+                continue
+            except (EOFError, OSError):
+                continue
+            with self._lock:
+                future = worker.pending.pop(request_id, None)
+                shm = worker.segments.pop(request_id, None)
+                worker.completed += 1
+            self._release(shm)
+            if future is None:
+                continue
+            if error:
+                future.set_exception(RuntimeError(error))
+            else:
+                future.set_result(result)
+
+    def _restart(self, index: int, worker: _Worker):
+        """Fail everything in flight on a dead worker and start a replacement"""
+        print(f"⚠️ Inference worker {index} exited (code {worker.process.exitcode}), restarting")
+        with self._lock:
+            pending = list(worker.pending.values())
+            segments = list(worker.segments.values())
+            replacement = _Worker(index, self._handler, self._ctx)
+            replacement.restarts = worker.restarts + 1
+            replacement.completed = worker.completed
+            self._workers[index] = replacement
+        worker.close_queues(flush=False)
+        for shm in segments:
+            self._release(shm)
+        for future in pending:
+            future.set_exception(RuntimeError(f"Inference worker {index} crashed"))
+
+    @staticmethod
+    def _release(shm: Optional[SharedMemory]):
+        if shm is None:
+            return
+        shm.close()
+        shm.unlink()
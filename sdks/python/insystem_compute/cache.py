@@ -0,0 +1,143 @@
+"""
+Loaded model cache for the InSystem Compute engine
+Keeps models resident between calls under a memory budget with LRU eviction
+"""
+
+from collections import OrderedDict
+from contextlib import contextmanager
+import threading
+from typing import Any, Callable, Dict, Hashable, Iterator
+
+
+class _Entry:
+    __slots__ = ("model", "size_bytes", "loans", "handed_out", "evicted")
+
+    def __init__(self, model: Any, size_bytes: int):
+        self.model = model
+        self.size_bytes = size_bytes
+        self.loans = 0
+        self.handed_out = False
+        self.evicted = False
+
+
+class ModelCache:
+    """
+    LRU cache of loaded models bounded by their estimated memory.
+
+    Loading a model that does not fit first evicts the least recently used
+    ones. A single model larger than the whole budget evicts everything
+    else and is kept on its own (over budget) until the next load, rather
+    than being refused.
+
+    Evicted models are closed only once nobody uses them: a model borrowed
+    with loan() is closed when its last loan ends, and one returned by
+    get_or_load() belongs to the caller and is never closed by the cache.
+    """
+
+    def __init__(self, budget_bytes: int):
+        self.budget_bytes = budget_bytes
+        self._entries: "OrderedDict[Hashable, _Entry]" = OrderedDict()
+        self._lock = threading.RLock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @property
+    def used_bytes(self) -> int:
+        with self._lock:
+            return sum(entry.size_bytes for entry in self._entries.values())
+
+    def get_or_load(self, key: Hashable, size_bytes: int, loader: Callable[[], Any]) -> Any:
+        """
+        Return the cached model for key, or load it with loader()
+
+        The caller keeps the model: if it is evicted later, the cache drops
+        its reference instead of closing it.
+
+        Args:
+            key: Identifies the model and the settings it was loaded with
+            size_bytes: Estimated memory of the model, used to make room
+                before loading it
+            loader: Constructs the model
+
+        Returns:
+            The cached or freshly loaded model
+        """
+        with self._lock:
+            entry = self._acquire(key, size_bytes, loader)
+            entry.handed_out = True
+            return entry.model
+
+    @contextmanager
+    def loan(self, key: Hashable, size_bytes: int, loader: Callable[[], Any]) -> Iterator[Any]:
+        """
+        Borrow the cached model for key (loading it like get_or_load) for
+        the duration of a with block. If it is evicted meanwhile, it is
+        closed when the last loan ends rather than under the borrower.
+        """
+        with self._lock:
+            entry = self._acquire(key, size_bytes, loader)
+            entry.loans += 1
+        try:
+            yield entry.model
+        finally:
+            with self._lock:
+                entry.loans -= 1
+                if entry.evicted:
+                    self._close_if_unused(entry)
+
+    def clear(self):
+        with self._lock:
+            while self._entries:
+                _, entry = self._entries.popitem(last=False)
+                self._evict(entry)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "budget_bytes": self.budget_bytes,
+                "used_bytes": self.used_bytes,
+                "models": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
+
+    def _acquire(self, key: Hashable, size_bytes: int, loader: Callable[[], Any]) -> _Entry:
+        entry = self._entries.get(key)
+        if entry is not None:
+            self.hits += 1
+            self._entries.move_to_end(key)
+            return entry
+        self.misses += 1
+        # Free memory before the new weights are mapped
+        self._make_room(size_bytes)
+        entry = _Entry(loader(), size_bytes)
+        self._entries[key] = entry
+        return entry
+
+    def _make_room(self, size_bytes: int):
+        while self._entries and self.used_bytes + size_bytes > self.budget_bytes:
+            _, entry = self._entries.popitem(last=False)
+            self._evict(entry)
+            self.evictions += 1
+
+    def _evict(self, entry: _Entry):
+        entry.evicted = True
+        self._close_if_unused(entry)
+
+    @staticmethod
+    def _close_if_unused(entry: _Entry):
+        if entry.loans == 0 and not entry.handed_out:
+            _close(entry.model)
+
+
+def _close(model: Any):
+    # Vision entries are (llm, chat_handler) pairs
+    for obj in model if isinstance(model, tuple) else (model,):
+        close = getattr(obj, "close", None)
+        if callable(close):
+            try:
+                close()
+            except Exception:
+                pass
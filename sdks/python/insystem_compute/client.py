@@ -0,0 +1,485 @@
+"""
+InSystem Compute gateway client
+Sync and asyncio clients over pooled keep-alive HTTP connections
+"""
+
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+import functools
+import http.client
+import json
+import os
+import queue
+import random
+import secrets
+import threading
+import time
+import urllib.parse
+from pathlib import Path
+from typing import Any, AsyncIterator, Callable, Dict, Iterable, Iterator, List, Optional, Tuple, Union
+
+from .hub import DEFAULT_HUB_URL
+
+DEFAULT_GATEWAY_URL = os.getenv("INSYSTEM_GATEWAY_URL", DEFAULT_HUB_URL)
+DEFAULT_MODEL = "tinyllama-1b-q4"
+DEFAULT_VISION_MODEL = "llava-v1.6-7b-q4"
+
+# Responses worth retrying: the gateway or a proxy in front of it is busy or restarting
+RETRY_STATUSES = {429, 502, 503, 504}
+_CONNECTION_ERRORS = (http.client.HTTPException, OSError)
+
+ImageInput = Union[str, Path, bytes]
+
+
+class GatewayError(RuntimeError):
+    """The gateway could not be reached or answered with an error status"""
+
+    def __init__(self, message: str, status: Optional[int] = None, body: Optional[str] = None):
+        super().__init__(message)
+        self.status = status
+        self.body = body
+
+
+class _ConnectionPool:
+    """Keep-alive connections to one host, reused LIFO (the warmest first)"""
+
+    def __init__(self, base_url: str, max_connections: int, timeout: float):
+        parsed = urllib.parse.urlsplit(base_url)
+        self.https = parsed.scheme == "https"
+        self.host = parsed.hostname or "localhost"
+        self.port = parsed.port
+        self.prefix = parsed.path.rstrip("/")
+        self.timeout = timeout
+        self._idle: "queue.LifoQueue" = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(max_connections)
+
+    def acquire(self) -> Tuple[http.client.HTTPConnection, bool]:
+        """Returns (connection, reused)"""
+        self._slots.acquire()
+        try:
+            return self._idle.get_nowait(), True
+        except queue.Empty:
+            cls = http.client.HTTPSConnection if self.https else http.client.HTTPConnection
+            return cls(self.host, self.port, timeout=self.timeout), False
+
+    def release(self, conn: http.client.HTTPConnection, reusable: bool = True):
+        if reusable:
+            self._idle.put(conn)
+        else:
+            conn.close()
+        self._slots.release()
+
+    def close(self):
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                return
+
+
+class TokenStream:
+    """
+    Iterator over generated text chunks from /api/v1/generate/stream
+
+    After iteration finishes, `done` holds the gateway's final event
+    (usage, time to first token, per-token timings). Closing the stream
+    early drops the connection, which stops generation on the gateway.
+    """
+
+    def __init__(self, response: http.client.HTTPResponse, finish: Callable[[bool], None]):
+        self._response = response
+        self._finish = finish
+        self._finished = False
+        self.done: Optional[Dict[str, Any]] = None
+
+    def __iter__(self) -> Iterator[str]:
+        return self
+
+    def __next__(self) -> str:
+        if self._finished:
+            raise StopIteration
+        event = None
+        while True:
+            line = self._response.readline()
+            if not line:
+                self._close(reusable=False)
+                raise StopIteration
+            line = line.decode("utf-8").rstrip("\r\n")
+            if line.startswith("event:"):
+                event = line[6:].strip()
+            elif line.startswith("data:"):
+                data = json.loads(line[5:].strip())
+                if event == "error":
+                    self._close(reusable=False)
+                    raise GatewayError(data.get("error", "stream failed"))
+                if event == "done":
+                    self.done = data
+                    self._drain()
+                    raise StopIteration
+                return data.get("text", "")
+
+    def _drain(self):
+        # Read to the end of the body so the connection can be reused
+        while self._response.read(64 * 1024):
+            pass
+        self._close(reusable=True)
+
+    def _close(self, reusable: bool):
+        if not self._finished:
+            self._finished = True
+            self._finish(reusable)
+
+    def close(self):
+        self._close(reusable=False)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def __del__(self):
+        self.close()
+
+
+class Client:
+    """
+    Gateway client over a pool of keep-alive connections
+
+    Thread-safe: share one client across threads; each concurrent request
+    uses its own pooled connection. Failed connections and 429/502/503/504
+    responses are retried with exponential backoff and full jitter.
+    """
+
+    def __init__(
+        self,
+        base_url: str = DEFAULT_GATEWAY_URL,
+        timeout: float = 300,
+        max_connections: int = 8,
+        retries: int = 3,
+        backoff: float = 0.25,
+        max_backoff: float = 8.0,
+    ):
+        """
+        Args:
+            base_url: Gateway URL (default $INSYSTEM_GATEWAY_URL or http://localhost:8080)
+            timeout: Socket timeout in seconds per request
+            max_connections: Concurrent requests (and pooled connections)
+            retries: Retries after the first attempt
+            backoff: Base delay in seconds; attempt n waits up to backoff * 2**n
+            max_backoff: Cap on a single delay
+        """
+        self.base_url = base_url.rstrip("/")
+        self.max_connections = max_connections
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self._pool = _ConnectionPool(self.base_url, max_connections, timeout)
+
+    def generate(
+        self,
+        prompt: str,
+        model: str = DEFAULT_MODEL,
+        max_tokens: int = 150,
+        temperature: float = 0.7,
+        top_p: float = 0.9,
+        **options,
+    ) -> Dict[str, Any]:
+        """
+        Generate text
+
+        Returns:
+            Gateway response ({"text", "usage", "latency_ms", ...})
+        """
+        payload = {"model": model, "prompt": prompt, "max_tokens": max_tokens,
+                   "temperature": temperature, "top_p": top_p, **options}
+        return self._json("POST", "/api/v1/generate", payload)
+
+    def stream(
+        self,
+        prompt: str,
+        model: str = DEFAULT_MODEL,
+        max_tokens: int = 150,
+        temperature: float = 0.7,
+        top_p: float = 0.9,
+        **options,
+    ) -> TokenStream:
+        """
+        Generate text, yielding chunks as the gateway produces them
+
+        Example:
+            for text in client.stream("Once upon a time"):
+                print(text, end="", flush=True)
+        """
+        payload = {"model": model, "prompt": prompt, "max_tokens": max_tokens,
+                   "temperature": temperature, "top_p": top_p, **options}
+        body = json.dumps(payload).encode("utf-8")
+        headers = {"Content-Type": "application/json", "Accept": "text/event-stream"}
+        conn, response = self._send("POST", "/api/v1/generate/stream", body, headers)
+        return TokenStream(response, lambda reusable: self._pool.release(conn, reusable))
+
+    def analyze_image(
+        self,
+        image: ImageInput,
+        prompt: str = "What's in this image?",
+        model: str = DEFAULT_VISION_MODEL,
+        max_tokens: int = 150,
+    ) -> Dict[str, Any]:
+        """
+        Describe an image with a vision model
+
+        Args:
+            image: Image file path or encoded image bytes
+        """
+        body, content_type = _multipart(
+            {"model": model, "prompt": prompt, "max_tokens": str(max_tokens)},
+            {"image": _read_image(image)},
+        )
+        return self._json("POST", "/api/v1/vision/analyze", body=body, content_type=content_type)
+
+    def vision_pipeline(
+        self,
+        image: ImageInput,
+        prompt: str = "Describe what you see",
+        model: str = DEFAULT_VISION_MODEL,
+        max_tokens: int = 100,
+        detector: str = "n",
+    ) -> Dict[str, Any]:
+        """
+        Detect objects with YOLO, then describe the image with a vision model
+
+        Args:
+            image: Image file path or encoded image bytes
+            detector: YOLO variant: n (fastest), s or m (most accurate)
+        """
+        body, content_type = _multipart(
+            {"model": model, "prompt": prompt, "max_tokens": str(max_tokens), "detector": detector},
+            {"image": _read_image(image)},
+        )
+        return self._json("POST", "/api/v1/vision/pipeline", body=body, content_type=content_type)
+
+    def health(self) -> Dict[str, Any]:
+        return self._json("GET", "/api/v1/health")
+
+    def list_models(self, **filters) -> Dict[str, Any]:
+        """Hub catalog page; filters are the /api/v1/hub/models query parameters"""
+        query = urllib.parse.urlencode({k: v for k, v in filters.items() if v is not None})
+        return self._json("GET", f"/api/v1/hub/models{'?' + query if query else ''}")
+
+    def bulk(
+        self,
+        prompts: Iterable[str],
+        concurrency: Optional[int] = None,
+        return_exceptions: bool = False,
+        **options,
+    ) -> List[Any]:
+        """
+        Generate for many prompts concurrently
+
+        Args:
+            prompts: Prompts to submit
+            concurrency: Requests in flight (default: max_connections)
+            return_exceptions: Put a failed prompt's exception in its slot
+                               instead of raising it
+            **options: generate() arguments applied to every prompt
+
+        Returns:
+            Responses in the same order as prompts
+        """
+        def run(prompt: str):
+            try:
+                return self.generate(prompt, **options)
+            except Exception as e:
+                if return_exceptions:
+                    return e
+                raise
+
+        with ThreadPoolExecutor(max_workers=concurrency or self.max_connections) as executor:
+            return list(executor.map(run, prompts))
+
+    def close(self):
+        self._pool.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def _json(
+        self,
+        method: str,
+        path: str,
+        payload: Optional[dict] = None,
+        body: Optional[bytes] = None,
+        content_type: str = "application/json",
+    ) -> Dict[str, Any]:
+        if payload is not None:
+            body = json.dumps(payload).encode("utf-8")
+        headers = {"Accept": "application/json"}
+        if body is not None:
+            headers["Content-Type"] = content_type
+        conn, response = self._send(method, path, body, headers)
+        try:
+            data = response.read()
+        except _CONNECTION_ERRORS:
+            self._pool.release(conn, reusable=False)
+            raise
+        self._pool.release(conn, reusable=not response.will_close)
+        return json.loads(data) if data else {}
+
+    def _send(
+        self, method: str, path: str, body: Optional[bytes], headers: Dict[str, str]
+    ) -> Tuple[http.client.HTTPConnection, http.client.HTTPResponse]:
+        """
+        Send a request, retrying connection failures and retryable statuses.
+        Returns the connection (the caller must release it) and a response
+        with a success status whose body has not been read.
+        """
+        attempt = 0
+        while True:
+            conn, reused = self._pool.acquire()
+            try:
+                conn.request(method, self._pool.prefix + path, body=body, headers=headers)
+                response = conn.getresponse()
+            except _CONNECTION_ERRORS as e:
+                self._pool.release(conn, reusable=False)
+                if reused:
+                    continue  # the server closed an idle keep-alive connection; not a real failure
+                if attempt >= self.retries:
+                    raise GatewayError(f"{method} {path}: {e}") from e
+                self._sleep(attempt)
+                attempt += 1
+                continue
+
+            if response.status < 400:
+                return conn, response
+            text = response.read().decode("utf-8", errors="replace")
+            self._pool.release(conn, reusable=not response.will_close)
+            if response.status in RETRY_STATUSES and attempt < self.retries:
+                self._sleep(attempt, response.getheader("Retry-After"))
+                attempt += 1
+                continue
+            raise GatewayError(f"{method} {path}: HTTP {response.status}", response.status, text)
+
+    def _sleep(self, attempt: int, retry_after: Optional[str] = None):
+        delay = random.uniform(0, min(self.max_backoff, self.backoff * 2 ** attempt))
+        if retry_after:
+            try:
+                delay = max(delay, min(float(retry_after), self.max_backoff))
+            except ValueError:
+                pass
+        time.sleep(delay)
+
+
+class AsyncClient:
+    """
+    asyncio gateway client
+
+    Wraps a Client: requests run on a thread pool sized to the connection
+    pool, so up to max_concurrency requests are in flight while the event
+    loop stays free.
+    """
+
+    def __init__(self, base_url: str = DEFAULT_GATEWAY_URL, max_concurrency: int = 8, **kwargs):
+        """
+        Args:
+            base_url: Gateway URL
+            max_concurrency: Requests in flight (and pooled connections)
+            **kwargs: Client options (timeout, retries, backoff, max_backoff)
+        """
+        self._client = Client(base_url, max_connections=max_concurrency, **kwargs)
+        self.max_concurrency = max_concurrency
+        self._executor = ThreadPoolExecutor(max_workers=max_concurrency, thread_name_prefix="insystem-client")
+
+    async def generate(self, prompt: str, **options) -> Dict[str, Any]:
+        return await self._run(self._client.generate, prompt, **options)
+
+    async def analyze_image(self, image: ImageInput, **options) -> Dict[str, Any]:
+        return await self._run(self._client.analyze_image, image, **options)
+
+    async def vision_pipeline(self, image: ImageInput, **options) -> Dict[str, Any]:
+        return await self._run(self._client.vision_pipeline, image, **options)
+
+    async def health(self) -> Dict[str, Any]:
+        return await self._run(self._client.health)
+
+    async def list_models(self, **filters) -> Dict[str, Any]:
+        return await self._run(self._client.list_models, **filters)
+
+    async def stream(self, prompt: str, **options) -> AsyncIterator[str]:
+        """
+        Async iterator over generated text chunks
+
+        Example:
+            async for text in client.stream("Once upon a time"):
+                print(text, end="", flush=True)
+        """
+        tokens = await self._run(self._client.stream, prompt, **options)
+        sentinel = object()
+        try:
+            while True:
+                text = await self._run(next, tokens, sentinel)
+                if text is sentinel:
+                    return
+                yield text
+        finally:
+            tokens.close()
+
+    async def bulk(
+        self,
+        prompts: Iterable[str],
+        concurrency: Optional[int] = None,
+        return_exceptions: bool = False,
+        **options,
+    ) -> List[Any]:
+        """
+        Generate for many prompts with at most `concurrency` in flight
+
+        Returns:
+            Responses in the same order as prompts
+        """
+        limit = asyncio.Semaphore(min(concurrency or self.max_concurrency, self.max_concurrency))
+
+        async def run(prompt: str):
+            async with limit:
+                return await self.generate(prompt, **options)
+
+        return await asyncio.gather(*(run(p) for p in prompts), return_exceptions=return_exceptions)
+
+    async def close(self):
+        self._executor.shutdown(wait=False)
+        self._client.close()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        await self.close()
+
+    async def _run(self, fn, *args, **kwargs):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, functools.partial(fn, *args, **kwargs))
+
+
+def _read_image(image: ImageInput) -> Tuple[str, bytes]:
+    if isinstance(image, (str, Path)):
+        with open(image, "rb") as f:
+            return Path(image).name, f.read()
+    return "image", bytes(image)
+
+
+def _multipart(fields: Dict[str, str], files: Dict[str, Tuple[str, bytes]]) -> Tuple[bytes, str]:
+    boundary = secrets.token_hex(16)
+    parts = []
+    for name, value in fields.items():
+        parts.append(
+            f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"\r\n\r\n{value}\r\n'.encode("utf-8")
+        )
+    for name, (filename, data) in files.items():
+        parts.append(
+            (f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"; filename="{filename}"\r\n'
+             f"Content-Type: application/octet-stream\r\n\r\n").encode("utf-8") + data + b"\r\n"
+        )
+    parts.append(f"--{boundary}--\r\n".encode("utf-8"))
+    return b"".join(parts), f"multipart/form-data; boundary={boundary}"
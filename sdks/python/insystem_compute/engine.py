@@ -3,13 +3,21 @@ InSystem Compute Engine
 Main inference engine interface
 """
 
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
 import ctypes
 import os
-from typing import Optional
+import time
+from typing import Any, Dict, Iterable, Iterator, Optional, Tuple, Union
 from pathlib import Path
 
 from .types import Device
 from .model import Model, ModelConfig
+from .cache import ModelCache
+from .gguf import GGUFFile, recommended_threads
+from .hub import resolve_model
+from .vision import attach_image, create_llava_chat_handler, prepare_image
 
 __version__ = "1.0.0"
 
@@ -20,13 +28,13 @@ class EngineConfig:
     def __init__(
         self,
         device: Device = Device.AUTO,
-        threads: int = 8,
-        memory_limit: int = 4 * 1024 * 1024 * 1024,  # 4GB
-        enable_cache: bool = True,
-        cache_size: int = 2048,
+        threads: Optional[int] = None,  # default: one per physical core, up to 8
+        memory_limit: int = 4 * 1024 * 1024 * 1024,  # 4GB; model cache eviction budget
+        enable_cache: bool = True,  # keep loaded models between calls
+        cache_size: int = 2048,  # KV cache (context) tokens per loaded model
     ):
         self.device = device
-        self.threads = threads
+        self.threads = threads or recommended_threads()
         self.memory_limit = memory_limit
         self.enable_cache = enable_cache
         self.cache_size = cache_size
@@ -48,6 +56,8 @@ class Engine:
         self.config = config
         self._lib = self._load_library()
         self._handle = self._create_engine()
+        # Loaded models, reused by load_model() and analyze_image()
+        self._models = ModelCache(config.memory_limit) if config.enable_cache else None
     
     def _load_library(self) -> ctypes.CDLL:
         """Load native library"""
@@ -108,16 +118,44 @@ class Engine:
         Load a model from file
         
         Args:
-            path: Path to model file
-            config: Model configuration
+            path: Path to model file, or the id of a model downloaded with
+                  insystem_compute.hub.download_model()
+            config: Model configuration; for GGUF files max_seq_len is
+                    capped at the model's trained context length
             
         Returns:
-            Loaded model instance
+            Loaded model instance (the cached one when the same path and
+            configuration were loaded before and enable_cache is set)
+            
+        Raises:
+            GGUFError: The GGUF file is corrupt or truncated
         """
         if config is None:
             config = ModelConfig()
         
-        return Model(self, path, config)
+        if not os.path.exists(path):
+            cached = resolve_model(path)
+            if cached is None:
+                raise FileNotFoundError(
+                    f"Model '{path}' is neither a file nor a downloaded model id "
+                    "(see insystem_compute.hub.download_model)"
+                )
+            path = cached
+        
+        size_bytes = os.path.getsize(path)
+        if path.endswith(".gguf"):
+            # Validate and size the model from its header before loading it
+            header = GGUFFile(path)
+            header.validate()
+            n_ctx = header.default_n_ctx(getattr(config, "max_seq_len", None) or self.config.cache_size)
+            if hasattr(config, "max_seq_len"):
+                config.max_seq_len = n_ctx
+            size_bytes = header.estimate_memory(n_ctx)
+        
+        if self._models is None:
+            return Model(self, path, config)
+        key = ("model", os.path.realpath(path), _config_key(config))
+        return self._models.get_or_load(key, size_bytes, lambda: Model(self, path, config))
     
     def analyze_image(
         self,
@@ -129,6 +167,11 @@ class Engine:
         """
         Analyze image using vision model (LLaVA)
         
+        The model and its CLIP projector stay loaded in the engine's model
+        cache, so analyzing a folder of images loads them once. For many
+        images, analyze_images() also overlaps image preprocessing with
+        inference.
+        
         Args:
             model_path: Path to vision model file (e.g., llava-v1.6-7b.Q4_K_M.gguf)
             image_path: Path to image file
@@ -138,49 +181,160 @@ class Engine:
         Returns:
             Vision model's response
         """
-        try:
-            from llama_cpp import Llama
-            from llama_cpp.llama_chat_format import Llava15ChatHandler
-            import base64
-        except ImportError:
-            raise RuntimeError("Vision support requires: pip install llama-cpp-python")
-        
-        # Load image as base64 data URI
+        # Read raw image bytes (passed to CLIP as-is, JPEG or PNG)
         with open(image_path, 'rb') as f:
             image_data = f.read()
-        b64_image = base64.b64encode(image_data).decode('utf-8')
-        data_uri = f"data:image/jpeg;base64,{b64_image}"
         
-        # Load vision model with chat handler
-        chat_handler = Llava15ChatHandler(
-            clip_model_path=str(Path(model_path).parent / "mmproj-model-f16.gguf"),
-            verbose=False
-        )
+        with self._vision_model(model_path) as (llm, chat_handler):
+            return self._describe_image(llm, chat_handler, image_data, prompt, max_tokens)
+    
+    def analyze_images(
+        self,
+        model_path: str,
+        images: Iterable[Union[str, Path, bytes]],
+        prompt: str = "What's in this image?",
+        max_tokens: int = 150,
+        max_side: Optional[int] = 672,
+        workers: Optional[int] = None,
+        prefetch: int = 8,
+    ) -> Iterator[Dict[str, Any]]:
+        """
+        Analyze many images, keeping the vision model busy
         
-        llm = Llama(
-            model_path=model_path,
-            chat_handler=chat_handler,
-            n_ctx=2048,
-            n_threads=self.config.threads,
-            verbose=False,
-        )
+        Images are read, decoded and downscaled on a thread pool while the
+        model works on earlier ones; at most `prefetch` prepared images are
+        held in memory, so `images` can be an arbitrarily long iterator
+        (e.g. a dataset being walked). Results are yielded in input order
+        as each one finishes.
         
-        # Analyze image
-        result = llm.create_chat_completion(
-            messages=[
-                {
-                    "role": "user",
-                    "content": [
-                        {"type": "text", "text": prompt},
-                        {"type": "image_url", "image_url": {"url": data_uri}}
-                    ]
-                }
-            ],
-            max_tokens=max_tokens
-        )
+        Args:
+            model_path: Path to vision model file (e.g., llava-v1.6-7b.Q4_K_M.gguf)
+            images: Image file paths or encoded image bytes
+            prompt: Question or instruction asked about every image
+            max_tokens: Maximum tokens to generate per image
+            max_side: Downscale images so their longest side is at most
+                      this many pixels (needs Pillow; None keeps the original)
+            workers: Preprocessing threads (default: min(4, CPU count))
+            prefetch: Prepared images to keep queued ahead of the model
+            
+        Yields:
+            {"index", "image", "text", "error", "timings": {"load_ms",
+            "preprocess_ms", "wait_ms", "inference_ms"}}, where image is the
+            path (None for bytes input), error is set instead of text when
+            the image could not be read, and wait_ms is how long the model
+            sat idle waiting for this image
+        """
+        workers = workers or min(4, os.cpu_count() or 1)
+        executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="insystem-preprocess")
+        pending: "deque" = deque()
+        source = enumerate(images)
+        
+        def submit_next() -> bool:
+            item = next(source, None)
+            if item is None:
+                return False
+            index, image = item
+            pending.append((index, image, executor.submit(_prepare, image, max_side)))
+            return True
+        
+        try:
+            # Start preprocessing before loading the model so both overlap
+            while len(pending) < max(1, prefetch) and submit_next():
+                pass
+            # Borrowed, so the cache cannot close it between images
+            with self._vision_model(model_path) as (llm, chat_handler):
+                while pending:
+                    index, image, future = pending.popleft()
+                    submit_next()
+                    wait_start = time.perf_counter()
+                    try:
+                        data, timings = future.result()
+                    except (OSError, ValueError) as e:
+                        data, timings = None, {"load_ms": 0.0, "preprocess_ms": 0.0}
+                        error = str(e)
+                    else:
+                        error = None
+                    timings["wait_ms"] = round((time.perf_counter() - wait_start) * 1000, 2)
+                
+                    text = None
+                    if data is not None:
+                        start = time.perf_counter()
+                        text = self._describe_image(llm, chat_handler, data, prompt, max_tokens)
+                        timings["inference_ms"] = round((time.perf_counter() - start) * 1000, 2)
+                    else:
+                        timings["inference_ms"] = 0.0
+                
+                    yield {
+                        "index": index,
+                        "image": str(image) if isinstance(image, (str, Path)) else None,
+                        "text": text,
+                        "error": error,
+                        "timings": timings,
+                    }
+        finally:
+            for _, _, future in pending:
+                future.cancel()
+            executor.shutdown(wait=False)
+    
+    @staticmethod
+    def _describe_image(llm, chat_handler, image_data, prompt: str, max_tokens: int) -> str:
+        with attach_image(chat_handler, image_data) as image_url:
+            result = llm.create_chat_completion(
+                messages=[
+                    {
+                        "role": "user",
+                        "content": [
+                            {"type": "text", "text": prompt},
+                            {"type": "image_url", "image_url": {"url": image_url}}
+                        ]
+                    }
+                ],
+                max_tokens=max_tokens
+            )
         
         return result['choices'][0]['message']['content']
     
+    @contextmanager
+    def _vision_model(self, model_path: str) -> Iterator[Tuple[Any, Any]]:
+        """Vision model and its chat handler, borrowed from the model cache when enabled"""
+        try:
+            from llama_cpp import Llama
+        except ImportError:
+            raise RuntimeError("Vision support requires: pip install llama-cpp-python")
+        
+        clip_model_path = str(Path(model_path).parent / "mmproj-model-f16.gguf")
+        header = GGUFFile(model_path)
+        header.validate()
+        n_ctx = header.default_n_ctx(self.config.cache_size)
+        size_bytes = header.estimate_memory(n_ctx) + GGUFFile(clip_model_path).tensor_bytes
+        
+        def load():
+            chat_handler = create_llava_chat_handler(clip_model_path=clip_model_path, verbose=False)
+            llm = Llama(
+                model_path=model_path,
+                chat_handler=chat_handler,
+                n_ctx=n_ctx,
+                n_threads=self.config.threads,
+                verbose=False,
+            )
+            return llm, chat_handler
+        
+        if self._models is None:
+            yield load()
+            return
+        key = ("vision", os.path.realpath(model_path), os.path.realpath(clip_model_path), n_ctx)
+        with self._models.loan(key, size_bytes, load) as model:
+            yield model
+    
+    def cache_stats(self) -> Optional[dict]:
+        """Model cache counters, or None when caching is disabled"""
+        return self._models.stats() if self._models is not None else None
+    
+    def clear_cache(self):
+        """Release every cached model"""
+        if self._models is not None:
+            self._models.clear()
+    
     @staticmethod
     def version() -> str:
         """Get the engine version.
@@ -192,6 +346,8 @@ class Engine:
     
     def __del__(self):
         """Cleanup engine resources"""
+        if getattr(self, '_models', None) is not None:
+            self._models.clear()
         if hasattr(self, '_handle') and self._handle:
             self._lib.insystem_engine_free(self._handle)
     
@@ -202,6 +358,31 @@ class Engine:
         self.__del__()
 
 
+def _prepare(image: Union[str, Path, bytes], max_side: Optional[int]):
+    """Read and downscale one image on a preprocessing thread"""
+    start = time.perf_counter()
+    if isinstance(image, (str, Path)):
+        with open(image, 'rb') as f:
+            data = f.read()
+    else:
+        data = image
+    loaded = time.perf_counter()
+    data = prepare_image(data, max_side)
+    done = time.perf_counter()
+    return data, {
+        "load_ms": round((loaded - start) * 1000, 2),
+        "preprocess_ms": round((done - loaded) * 1000, 2),
+    }
+
+
+def _config_key(config) -> tuple:
+    """Hashable snapshot of a ModelConfig, so differently configured loads are cached apart"""
+    try:
+        return tuple(sorted((k, repr(v)) for k, v in vars(config).items()))
+    except TypeError:
+        return (repr(config),)
+
+
 # Example usage
 if __name__ == "__main__":
     # Create engine
@@ -0,0 +1,299 @@
+"""
+GGUF header reader
+Reads model metadata and the tensor table from GGUF files through mmap, without loading weights
+"""
+
+import mmap
+import os
+import struct
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
+
+GGUF_MAGIC = b"GGUF"
+DEFAULT_ALIGNMENT = 32
+
+# Metadata value types
+_UINT8, _INT8, _UINT16, _INT16, _UINT32, _INT32, _FLOAT32, _BOOL, _STRING, _ARRAY, _UINT64, _INT64, _FLOAT64 = range(13)
+
+_SCALARS = {
+    _UINT8: struct.Struct("<B"), _INT8: struct.Struct("<b"), _UINT16: struct.Struct("<H"),
+    _INT16: struct.Struct("<h"), _UINT32: struct.Struct("<I"), _INT32: struct.Struct("<i"),
+    _FLOAT32: struct.Struct("<f"), _BOOL: struct.Struct("<?"), _UINT64: struct.Struct("<Q"),
+    _INT64: struct.Struct("<q"), _FLOAT64: struct.Struct("<d"),
+}
+
+# Arrays longer than this (tokenizer vocabularies, merges) are skipped
+MAX_ARRAY_LENGTH = 1024
+
+# general.file_type -> quantization name (llama.cpp LLAMA_FTYPE_*)
+FILE_TYPES = {
+    0: "f32", 1: "f16", 2: "q4_0", 3: "q4_1", 7: "q8_0", 8: "q5_0", 9: "q5_1",
+    10: "q2_k", 11: "q3_k_s", 12: "q3_k_m", 13: "q3_k_l", 14: "q4_k_s", 15: "q4_k_m",
+    16: "q5_k_s", 17: "q5_k_m", 18: "q6_k", 19: "iq2_xxs", 20: "iq2_xs", 21: "q2_k_s",
+    22: "iq3_xs", 23: "iq3_xxs", 24: "iq1_s", 25: "iq4_nl", 26: "iq3_s", 27: "iq3_m",
+    28: "iq2_s", 29: "iq2_m", 30: "iq4_xs", 31: "iq1_m", 32: "bf16",
+}
+
+# ggml tensor type -> (elements per block, bytes per block)
+TENSOR_TYPES = {
+    0: (1, 4), 1: (1, 2), 2: (32, 18), 3: (32, 20), 6: (32, 22), 7: (32, 24),
+    8: (32, 34), 9: (32, 36), 10: (256, 84), 11: (256, 110), 12: (256, 144),
+    13: (256, 176), 14: (256, 210), 15: (256, 292), 16: (256, 66), 17: (256, 74),
+    18: (256, 98), 19: (256, 50), 20: (32, 18), 21: (256, 110), 22: (256, 82),
+    23: (256, 136), 24: (1, 1), 25: (1, 2), 26: (1, 4), 27: (1, 8), 28: (1, 8),
+    29: (256, 56), 30: (1, 2),
+}
+
+
+class GGUFError(ValueError):
+    """The file is not a readable GGUF file"""
+
+
+class GGUFTensor(NamedTuple):
+    name: str
+    shape: Tuple[int, ...]
+    type: int
+    offset: int  # from the start of the file
+    n_bytes: Optional[int]  # None for tensor types this reader does not know
+
+
+class _Reader:
+    """Parses values directly out of a read-only mapping"""
+
+    def __init__(self, buffer, version: int):
+        self.buffer = buffer
+        self.pos = 0
+        self.count_struct = _SCALARS[_UINT64] if version >= 2 else _SCALARS[_UINT32]
+
+    def unpack(self, fmt: struct.Struct):
+        try:
+            value = fmt.unpack_from(self.buffer, self.pos)[0]
+        except struct.error:
+            raise GGUFError("unexpected end of file")
+        self.pos += fmt.size
+        return value
+
+    def count(self) -> int:
+        return self.unpack(self.count_struct)
+
+    def string(self) -> str:
+        length = self.count()
+        end = self.pos + length
+        if end > len(self.buffer):
+            raise GGUFError("unexpected end of file")
+        value = self.buffer[self.pos:end].decode("utf-8", errors="replace")
+        self.pos = end
+        return value
+
+    def skip_string(self):
+        length = self.count()
+        self.pos += length
+
+    def value(self, value_type: int):
+        if value_type in _SCALARS:
+            return self.unpack(_SCALARS[value_type])
+        if value_type == _STRING:
+            return self.string()
+        if value_type == _ARRAY:
+            item_type = self.unpack(_SCALARS[_UINT32])
+            length = self.count()
+            if length > MAX_ARRAY_LENGTH:
+                self.skip_array(item_type, length)
+                return None
+            return [self.value(item_type) for _ in range(length)]
+        raise GGUFError(f"unknown metadata value type {value_type}")
+
+    def skip_array(self, item_type: int, length: int):
+        if item_type in _SCALARS:
+            self.pos += _SCALARS[item_type].size * length
+        elif item_type == _STRING:
+            for _ in range(length):
+                self.skip_string()
+        else:
+            for _ in range(length):
+                self.value(item_type)
+
+
+class GGUFFile:
+    """
+    Metadata and tensor table of a GGUF file
+
+    The file is memory-mapped only while the header is parsed; values are
+    unpacked straight from the mapping, so only the pages holding the
+    header are ever read, even for multi-GB models. This takes milliseconds,
+    versus seconds to construct a Llama.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(path, "rb") as f:
+            self.file_size = os.fstat(f.fileno()).st_size
+            if self.file_size < 8:
+                raise GGUFError(f"{path}: not a GGUF file")
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                try:
+                    self._parse(mapped)
+                except GGUFError as e:
+                    raise GGUFError(f"{path}: {e}") from None
+
+    def _parse(self, mapped: mmap.mmap):
+        if mapped[:4] != GGUF_MAGIC:
+            raise GGUFError("not a GGUF file")
+        self.version = struct.unpack_from("<I", mapped, 4)[0]
+        reader = _Reader(mapped, self.version)
+        reader.pos = 8
+        self.tensor_count = reader.count()
+        kv_count = reader.count()
+
+        self.metadata: Dict[str, Any] = {}
+        for _ in range(kv_count):
+            key = reader.string()
+            self.metadata[key] = reader.value(reader.unpack(_SCALARS[_UINT32]))
+
+        raw = []
+        for _ in range(self.tensor_count):
+            name = reader.string()
+            n_dims = reader.unpack(_SCALARS[_UINT32])
+            shape = tuple(reader.count() for _ in range(n_dims))
+            tensor_type = reader.unpack(_SCALARS[_UINT32])
+            offset = reader.unpack(_SCALARS[_UINT64])
+            raw.append((name, shape, tensor_type, offset))
+
+        self.alignment = int(self.metadata.get("general.alignment") or DEFAULT_ALIGNMENT)
+        self.data_offset = -(-reader.pos // self.alignment) * self.alignment
+        self.tensors: List[GGUFTensor] = [
+            GGUFTensor(name, shape, tensor_type, self.data_offset + offset, _tensor_bytes(shape, tensor_type))
+            for name, shape, tensor_type, offset in raw
+        ]
+
+    @property
+    def name(self) -> Optional[str]:
+        return self.metadata.get("general.name")
+
+    @property
+    def arch(self) -> Optional[str]:
+        return self.metadata.get("general.architecture")
+
+    @property
+    def quantization(self) -> Optional[str]:
+        file_type = self.metadata.get("general.file_type")
+        return FILE_TYPES.get(file_type) if file_type is not None else None
+
+    @property
+    def context_length(self) -> Optional[int]:
+        return self._arch_value("context_length")
+
+    @property
+    def tensor_bytes(self) -> int:
+        """Bytes of tensor data (what llama.cpp maps for the weights)"""
+        if not self.tensors:
+            return 0
+        if any(t.n_bytes is None for t in self.tensors):
+            return self.file_size - self.data_offset
+        return max(t.offset + t.n_bytes for t in self.tensors) - self.data_offset
+
+    def validate(self):
+        """
+        Check that every tensor lies within the file (catches truncated
+        downloads before llama.cpp tries to load them)
+
+        Raises:
+            GGUFError: The file is truncated or its tensor table is inconsistent
+        """
+        for tensor in self.tensors:
+            end = tensor.offset + (tensor.n_bytes or 0)
+            if tensor.offset % self.alignment or end > self.file_size:
+                raise GGUFError(
+                    f"{self.path}: tensor '{tensor.name}' lies outside the file "
+                    f"(ends at {end}, file is {self.file_size} bytes); the file may be truncated"
+                )
+
+    def kv_cache_bytes(self, n_ctx: int) -> int:
+        """f16 K and V cache size for n_ctx tokens (0 if the header lacks the dimensions)"""
+        n_layer = self._arch_value("block_count")
+        n_embd = self._arch_value("embedding_length")
+        n_head = _max(self._arch_value("attention.head_count"))
+        n_head_kv = _max(self._arch_value("attention.head_count_kv")) or n_head
+        if not (n_layer and n_embd and n_head):
+            return 0
+        n_embd_kv = n_embd * n_head_kv // n_head
+        return 2 * n_layer * n_ctx * n_embd_kv * 2
+
+    def estimate_memory(self, n_ctx: Optional[int] = None) -> int:
+        """
+        Estimated RAM for running this model: the weights plus the KV cache
+        for n_ctx tokens (default: default_n_ctx()). Compute buffers are not
+        included.
+        """
+        if n_ctx is None:
+            n_ctx = self.default_n_ctx()
+        return self.tensor_bytes + self.kv_cache_bytes(n_ctx)
+
+    def default_n_ctx(self, max_ctx: int = 2048) -> int:
+        """Context size to use by default: the trained context length, capped at max_ctx"""
+        trained = self.context_length
+        return min(trained, max_ctx) if trained else max_ctx
+
+    def _arch_value(self, key: str):
+        return self.metadata.get(f"{self.arch}.{key}") if self.arch else None
+
+
+def _max(value):
+    # Some architectures store per-layer head counts as arrays
+    if isinstance(value, list):
+        return max(value) if value else None
+    return value
+
+
+def _tensor_bytes(shape: Tuple[int, ...], tensor_type: int) -> Optional[int]:
+    if tensor_type not in TENSOR_TYPES:
+        return None
+    block_size, type_size = TENSOR_TYPES[tensor_type]
+    elements = 1
+    for dim in shape:
+        elements *= dim
+    return elements // block_size * type_size
+
+
+def recommended_threads(max_threads: int = 8) -> int:
+    """
+    Default thread count for CPU inference: one per physical core (assuming
+    two hardware threads per core), capped at max_threads since decoding is
+    memory-bandwidth bound beyond that
+    """
+    return max(1, min(max_threads, (os.cpu_count() or 2) // 2))
+
+
+def read_header(path: str) -> Dict[str, Any]:
+    """
+    Read the header and metadata key/values of a GGUF file
+
+    Args:
+        path: GGUF file
+
+    Returns:
+        {"version": int, "tensor_count": int, "metadata": {key: value}};
+        arrays longer than MAX_ARRAY_LENGTH are reported as None
+    """
+    gguf = GGUFFile(path)
+    return {"version": gguf.version, "tensor_count": gguf.tensor_count, "metadata": gguf.metadata}
+
+
+def model_info(path: str) -> Dict[str, Any]:
+    """
+    Summarize a GGUF file for a model registry
+
+    Args:
+        path: GGUF file
+
+    Returns:
+        {"name", "arch", "quantization", "context_length", "tensor_count"}
+        (None where the file does not say)
+    """
+    gguf = GGUFFile(path)
+    return {
+        "name": gguf.name,
+        "arch": gguf.arch,
+        "quantization": gguf.quantization,
+        "context_length": gguf.context_length,
+        "tensor_count": gguf.tensor_count,
+    }
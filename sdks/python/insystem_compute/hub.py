@@ -0,0 +1,362 @@
+"""
+InSystem Compute model hub client
+Downloads registry models into a local cache over parallel range requests
+"""
+
+import hashlib
+import json
+import os
+import queue
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Tuple, Union
+
+DEFAULT_HUB_URL = os.getenv("INSYSTEM_HUB_URL", "http://localhost:8080")
+DEFAULT_CACHE_DIR = Path(os.getenv(
+    "INSYSTEM_MODEL_CACHE", str(Path.home() / ".cache" / "insystem" / "models")
+))
+MANIFEST = "manifest.json"
+
+# (filename, bytes done, total bytes)
+ProgressCallback = Callable[[str, int, int], None]
+
+
+class DownloadError(RuntimeError):
+    """A model file could not be downloaded or failed verification"""
+
+
+class _FileChanged(DownloadError):
+    pass
+
+
+def download_model(
+    model_id: str,
+    hub_url: str = DEFAULT_HUB_URL,
+    cache_dir: Optional[Union[str, Path]] = None,
+    parallel: int = 4,
+    chunk_size: int = 8 * 1024 * 1024,
+    files: Optional[List[str]] = None,
+    progress: Optional[ProgressCallback] = None,
+) -> Path:
+    """
+    Download a hub model into the local model cache
+
+    Each file is fetched as chunk_size ranges by `parallel` threads into a
+    preallocated <file>.part, and its sha256 is computed as the completed
+    prefix grows. Finished chunks are recorded next to the partial file, so
+    an interrupted download resumes where it stopped (unless the file
+    changed on the hub, detected through If-Range). Files already in the
+    cache with a matching checksum are skipped.
+
+    Args:
+        model_id: Registry model id (e.g. "tinyllama-1b-q4")
+        hub_url: Gateway base URL
+        cache_dir: Cache root (default $INSYSTEM_MODEL_CACHE or ~/.cache/insystem/models)
+        parallel: Concurrent range requests per file
+        chunk_size: Bytes per range request
+        files: Only download these filenames (default: all files of the model)
+        progress: Called with (filename, bytes_done, total_bytes)
+
+    Returns:
+        Directory holding the model files and its manifest.json
+    """
+    hub_url = hub_url.rstrip("/")
+    model_dir = Path(cache_dir or DEFAULT_CACHE_DIR) / model_id
+    model_dir.mkdir(parents=True, exist_ok=True)
+
+    card = _get_json(f"{hub_url}/api/v1/hub/models/{urllib.parse.quote(model_id)}")
+    wanted = [f for f in card.get("files", []) if not files or f.get("filename") in files]
+    if not wanted:
+        raise DownloadError(f"Model '{model_id}' has no files to download")
+
+    for entry in wanted:
+        filename = entry["filename"]
+        url = (f"{hub_url}/api/v1/hub/models/{urllib.parse.quote(model_id)}/download"
+               f"?file={urllib.parse.quote(filename)}")
+        _ChunkedDownload(
+            url, model_dir / filename, entry.get("sha256"), parallel, chunk_size, progress
+        ).run()
+
+    _write_json(model_dir / MANIFEST, card)
+    return model_dir
+
+
+def resolve_model(model: str, cache_dir: Optional[Union[str, Path]] = None) -> Optional[str]:
+    """
+    Find a downloaded model's weight file by model id
+
+    Args:
+        model: Registry model id
+        cache_dir: Cache root used for download_model()
+
+    Returns:
+        Path to the model's first GGUF file (or first file), or None if the
+        model is not in the cache
+    """
+    model_dir = Path(cache_dir or DEFAULT_CACHE_DIR) / model
+    try:
+        with open(model_dir / MANIFEST) as f:
+            card = json.load(f)
+    except (OSError, ValueError):
+        return None
+    names = [f["filename"] for f in card.get("files", []) if (model_dir / f["filename"]).exists()]
+    for name in names:
+        if name.endswith(".gguf"):
+            return str(model_dir / name)
+    return str(model_dir / names[0]) if names else None
+
+
+class _ChunkedDownload:
+    """Parallel, resumable download of one file"""
+
+    def __init__(
+        self,
+        url: str,
+        dest: Path,
+        sha256: Optional[str],
+        parallel: int,
+        chunk_size: int,
+        progress: Optional[ProgressCallback],
+    ):
+        self.url = url
+        self.dest = dest
+        self.part = dest.with_name(dest.name + ".part")
+        self.state_path = dest.with_name(dest.name + ".part.json")
+        self.sha256 = sha256.lower() if sha256 else None
+        self.parallel = max(1, parallel)
+        self.chunk_size = chunk_size
+        self.progress = progress
+        self._lock = threading.Lock()
+        self._done: Dict[int, int] = {}  # chunk start -> end (inclusive)
+        self._hasher = hashlib.sha256()
+        self._hashed = 0
+        self._received = 0
+
+    def run(self):
+        if self.dest.exists() and self._cached_file_valid():
+            return
+
+        size, etag, ranges_ok = self._probe()
+        state = self._load_state()
+        if state and (state["size"] != size or state["etag"] != etag):
+            state = None  # the file changed on the hub since the partial download
+        if not ranges_ok or size == 0:
+            self._download_whole(size)
+        else:
+            self._download_ranges(size, etag, state)
+
+        digest = self._hasher.hexdigest()
+        if self.sha256 and digest != self.sha256:
+            self._discard()
+            raise DownloadError(f"{self.dest.name}: sha256 mismatch (expected {self.sha256}, got {digest})")
+        os.replace(self.part, self.dest)
+        _write_json(self.dest.with_name(self.dest.name + ".sha256.json"), {"sha256": digest, "size": size})
+        try:
+            self.state_path.unlink()
+        except OSError:
+            pass
+
+    def _cached_file_valid(self) -> bool:
+        if not self.sha256:
+            return True
+        try:
+            with open(self.dest.with_name(self.dest.name + ".sha256.json")) as f:
+                recorded = json.load(f)
+            if recorded["sha256"] == self.sha256 and recorded["size"] == self.dest.stat().st_size:
+                return True
+        except (OSError, ValueError, KeyError):
+            pass
+        return _file_sha256(self.dest) == self.sha256
+
+    def _probe(self) -> Tuple[int, Optional[str], bool]:
+        request = urllib.request.Request(self.url, method="HEAD")
+        try:
+            with urllib.request.urlopen(request, timeout=30) as response:
+                headers = response.headers
+        except urllib.error.URLError as e:
+            raise DownloadError(f"{self.url}: {e}") from e
+        size = int(headers.get("Content-Length", 0))
+        ranges_ok = headers.get("Accept-Ranges", "").lower() == "bytes" and size > 0
+        return size, headers.get("ETag"), ranges_ok
+
+    def _download_whole(self, size: int):
+        with urllib.request.urlopen(self.url, timeout=60) as response, open(self.part, "wb") as f:
+            while True:
+                data = response.read(1024 * 1024)
+                if not data:
+                    break
+                f.write(data)
+                self._hasher.update(data)
+                self._received += len(data)
+                self._report(max(size, self._received))
+
+    def _download_ranges(self, size: int, etag: Optional[str], state: Optional[dict]):
+        if state and self.part.exists():
+            self._done = {int(start): end for start, end in state["done"].items()}
+        else:
+            self._done = {}
+            # Preallocate so chunks can be written at their offsets in any order
+            with open(self.part, "wb") as f:
+                if hasattr(os, "posix_fallocate"):
+                    try:
+                        os.posix_fallocate(f.fileno(), 0, size)
+                    except OSError:
+                        f.truncate(size)
+                else:
+                    f.truncate(size)
+        self._save_state(size, etag)
+        self._received = sum(end - start + 1 for start, end in self._done.items())
+        self._advance_hash()
+
+        pending: "queue.Queue" = queue.Queue()
+        for start in range(0, size, self.chunk_size):
+            if start not in self._done:
+                pending.put((start, min(start + self.chunk_size, size) - 1))
+
+        errors: List[BaseException] = []
+        workers = [
+            threading.Thread(target=self._worker, args=(pending, size, etag, errors), daemon=True)
+            for _ in range(min(self.parallel, pending.qsize()))
+        ]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        if errors:
+            if isinstance(errors[0], _FileChanged):
+                self._discard()
+            raise DownloadError(f"{self.dest.name}: {errors[0]}") from errors[0]
+        self._advance_hash()
+        if self._hashed != size:
+            raise DownloadError(f"{self.dest.name}: incomplete download ({self._hashed}/{size} bytes)")
+
+    def _worker(self, pending: "queue.Queue", size: int, etag: Optional[str], errors: list):
+        with open(self.part, "r+b") as f:
+            while not errors:
+                try:
+                    start, end = pending.get_nowait()
+                except queue.Empty:
+                    return
+                try:
+                    self._fetch_range(f, start, end, etag)
+                except BaseException as e:
+                    errors.append(e)
+                    return
+                with self._lock:
+                    self._done[start] = end
+                    self._received += end - start + 1
+                    self._save_state(size, etag)
+                self._advance_hash()
+                self._report(size)
+
+    def _fetch_range(self, f, start: int, end: int, etag: Optional[str], attempts: int = 4):
+        headers = {"Range": f"bytes={start}-{end}"}
+        if etag and not etag.startswith("W/"):
+            headers["If-Range"] = etag
+        for attempt in range(attempts):
+            try:
+                request = urllib.request.Request(self.url, headers=headers)
+                with urllib.request.urlopen(request, timeout=60) as response:
+                    if response.status != 206:
+                        # If-Range did not match: the file was replaced
+                        raise _FileChanged("file changed on the hub during download; retry")
+                    offset = start
+                    while True:
+                        data = response.read(1024 * 1024)
+                        if not data:
+                            break
+                        _pwrite(f, data, offset)
+                        offset += len(data)
+                    if offset != end + 1:
+                        raise DownloadError(f"short read for bytes {start}-{end}")
+                return
+            except _FileChanged:
+                raise
+            except (DownloadError, urllib.error.URLError, OSError, TimeoutError):
+                if attempt == attempts - 1:
+                    raise
+            time.sleep(0.5 * 2 ** attempt)
+
+    def _advance_hash(self):
+        """Hash the contiguous completed prefix that has not been hashed yet"""
+        with self._lock:
+            end = self._hashed
+            while end in self._done:
+                end = self._done[end] + 1
+            start, self._hashed = self._hashed, end
+            if end == start:
+                return
+            # Chunks just written are read back from the page cache
+            with open(self.part, "rb") as f:
+                f.seek(start)
+                remaining = end - start
+                while remaining > 0:
+                    data = f.read(min(1024 * 1024, remaining))
+                    if not data:
+                        break
+                    self._hasher.update(data)
+                    remaining -= len(data)
+
+    def _load_state(self) -> Optional[dict]:
+        try:
+            with open(self.state_path) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _save_state(self, size: int, etag: Optional[str]):
+        _write_json(self.state_path, {
+            "url": self.url,
+            "size": size,
+            "etag": etag,
+            "done": {str(start): end for start, end in self._done.items()},
+        })
+
+    def _discard(self):
+        for path in (self.part, self.state_path):
+            try:
+                path.unlink()
+            except OSError:
+                pass
+
+    def _report(self, total: int):
+        if self.progress:
+            self.progress(self.dest.name, self._received, total)
+
+
+def _pwrite(f, data: bytes, offset: int):
+    if hasattr(os, "pwrite"):
+        os.pwrite(f.fileno(), data, offset)
+    else:
+        f.seek(offset)
+        f.write(data)
+
+
+def _get_json(url: str) -> dict:
+    try:
+        with urllib.request.urlopen(url, timeout=30) as response:
+            return json.load(response)
+    except urllib.error.HTTPError as e:
+        raise DownloadError(f"{url}: HTTP {e.code}") from e
+    except urllib.error.URLError as e:
+        raise DownloadError(f"{url}: {e.reason}") from e
+
+
+def _write_json(path: Path, data: dict):
+    fd, tmp_path = tempfile.mkstemp(dir=path.parent, prefix=f".{path.name}.", suffix=".tmp")
+    with os.fdopen(fd, "w") as f:
+        json.dump(data, f, indent=2)
+    os.replace(tmp_path, path)
+
+
+def _file_sha256(path: Path) -> str:
+    hasher = hashlib.sha256()
+    with open(path, "rb") as f:
+        for data in iter(lambda: f.read(1024 * 1024), b""):
+            hasher.update(data)
+    return hasher.hexdigest()
@@ -0,0 +1,321 @@
+"""
+InSystem Compute vision input
+Feeds image bytes to LLaVA's CLIP embedder without a base64 data-URI round-trip
+"""
+
+from collections import OrderedDict
+from contextlib import contextmanager
+import base64
+import ctypes
+import hashlib
+import io
+import itertools
+import threading
+import time
+from typing import Any, Callable, Dict, Iterator, Optional, Union
+
+ImageBytes = Union[bytes, bytearray, memoryview]
+
+# Image URLs with this prefix are resolved from bytes attached to the handler
+RAW_IMAGE_SCHEME = "insystem-image://"
+
+_MAGIC = [
+    (b"\x89PNG\r\n\x1a\n", "image/png"),
+    (b"\xff\xd8\xff", "image/jpeg"),
+    (b"GIF87a", "image/gif"),
+    (b"GIF89a", "image/gif"),
+    (b"BM", "image/bmp"),
+]
+
+_handler_class = None
+
+
+def image_mime_type(data: ImageBytes) -> str:
+    """
+    Detect the image type from its magic bytes
+
+    Args:
+        data: Encoded image bytes
+
+    Returns:
+        MIME type (defaults to image/jpeg when unknown)
+    """
+    head = bytes(data[:12])
+    for magic, mime in _MAGIC:
+        if head.startswith(magic):
+            return mime
+    if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+        return "image/webp"
+    return "image/jpeg"
+
+
+def image_data_uri(data: ImageBytes) -> str:
+    """Encode image bytes as a data URI labeled with the real image type"""
+    b64_image = base64.b64encode(data).decode("utf-8")
+    return f"data:{image_mime_type(data)};base64,{b64_image}"
+
+
+class ImageEmbedCache:
+    """
+    LRU cache of CLIP image embeddings bounded by a byte budget
+
+    Keys combine the CLIP projector path with a BLAKE2 hash of the encoded
+    image, so asking several questions about the same image runs the CLIP
+    encoder once. Embeddings in use by a running completion are pinned and
+    never freed underneath it.
+    """
+
+    def __init__(self, budget_bytes: int = 256 * 1024 * 1024):
+        self.budget_bytes = budget_bytes
+        self.used_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries: "OrderedDict[str, list]" = OrderedDict()
+        self._owned: Dict[int, str] = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(clip_model_path: str, data) -> str:
+        digest = hashlib.blake2b(data, digest_size=16).hexdigest()
+        return f"{clip_model_path}:{digest}"
+
+    def acquire(self, key: str):
+        """Return a cached embedding pointer (pinned) or None"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._entries.move_to_end(key)
+            entry[2] += 1
+            return entry[0]
+
+    def insert(self, key: str, embed, size_bytes: int, free: Callable[[Any], None]) -> bool:
+        """
+        Take ownership of a freshly computed embedding (pinned)
+
+        Returns False, leaving the embedding to the caller, if another
+        thread already cached one for the same key.
+        """
+        with self._lock:
+            if key in self._entries:
+                return False
+            self._entries[key] = [embed, size_bytes, 1, free]
+            self._owned[ctypes.addressof(embed.contents)] = key
+            self.used_bytes += size_bytes
+            self._evict_locked()
+            return True
+
+    def release(self, embed) -> bool:
+        """Unpin an embedding; returns False if the cache does not own it"""
+        with self._lock:
+            key = self._owned.get(ctypes.addressof(embed.contents))
+            if key is None:
+                return False
+            self._entries[key][2] -= 1
+            self._evict_locked()
+            return True
+
+    def hit_rate(self) -> float:
+        lookups = self.hits + self.misses
+        return round(self.hits / lookups, 3) if lookups else 0.0
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "budget_bytes": self.budget_bytes,
+                "used_bytes": self.used_bytes,
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": self.hit_rate(),
+            }
+
+    def _evict_locked(self):
+        for key in list(self._entries):
+            if self.used_bytes <= self.budget_bytes:
+                break
+            embed, size_bytes, pins, free = self._entries[key]
+            if pins > 0:
+                continue
+            del self._entries[key]
+            del self._owned[ctypes.addressof(embed.contents)]
+            self.used_bytes -= size_bytes
+            self.evictions += 1
+            free(embed)
+
+
+class _CachingLlavaCpp:
+    """
+    Stands in for the llama_cpp.llava_cpp module inside a chat handler,
+    serving image embeddings from an ImageEmbedCache
+    """
+
+    def __init__(self, llava_cpp, cache: ImageEmbedCache, clip_model_path: str, record: Callable):
+        self._llava_cpp = llava_cpp
+        self._cache = cache
+        self._clip_model_path = clip_model_path
+        self._record = record
+        self._n_embd = None
+
+    def __getattr__(self, name):
+        return getattr(self._llava_cpp, name)
+
+    def llava_image_embed_make_with_bytes(self, ctx_clip, n_threads, image_bytes, image_bytes_length):
+        start = time.time()
+        key = self._cache.key(self._clip_model_path, memoryview(image_bytes).cast("B")[:image_bytes_length])
+        embed = self._cache.acquire(key)
+        if embed is not None:
+            self._record(True, (time.time() - start) * 1000)
+            return embed
+
+        embed = self._llava_cpp.llava_image_embed_make_with_bytes(
+            ctx_clip, n_threads, image_bytes, image_bytes_length
+        )
+        if self._n_embd is None:
+            n_mmproj_embd = getattr(self._llava_cpp, "clip_n_mmproj_embd", None)
+            self._n_embd = n_mmproj_embd(ctx_clip) if n_mmproj_embd else 4096
+        size_bytes = embed.contents.n_image_pos * self._n_embd * ctypes.sizeof(ctypes.c_float)
+        self._cache.insert(key, embed, size_bytes, self._llava_cpp.llava_image_embed_free)
+        self._record(False, (time.time() - start) * 1000)
+        return embed
+
+    def llava_image_embed_free(self, embed):
+        if not self._cache.release(embed):
+            self._llava_cpp.llava_image_embed_free(embed)
+
+
+def create_llava_chat_handler(
+    clip_model_path: str,
+    verbose: bool = False,
+    embed_cache: Optional[ImageEmbedCache] = None,
+):
+    """
+    Create a Llava15ChatHandler that also accepts raw image bytes
+
+    Use attach_image() to pass bytes to it. Plain http(s):// and data: URLs
+    keep working as before.
+
+    Args:
+        clip_model_path: Path to the mmproj (CLIP projector) GGUF file
+        verbose: Print llama.cpp CLIP loading logs
+        embed_cache: Reuse CLIP embeddings of previously seen images
+
+    Returns:
+        Chat handler instance for Llama(chat_handler=...)
+    """
+    global _handler_class
+    if _handler_class is None:
+        from llama_cpp.llama_chat_format import Llava15ChatHandler
+
+        class RawImageLlavaChatHandler(Llava15ChatHandler):
+            """Llava15ChatHandler that resolves attached images from memory"""
+
+            def __init__(
+                self,
+                clip_model_path: str,
+                verbose: bool = False,
+                embed_cache: Optional[ImageEmbedCache] = None,
+            ):
+                super().__init__(clip_model_path=clip_model_path, verbose=verbose)
+                self._images = {}
+                self._image_ids = itertools.count()
+                self._images_lock = threading.Lock()
+                self._local = threading.local()
+                if embed_cache is not None and hasattr(self, "_llava_cpp"):
+                    self._llava_cpp = _CachingLlavaCpp(
+                        self._llava_cpp, embed_cache, clip_model_path, self._record_embed
+                    )
+
+            def _record_embed(self, hit: bool, elapsed_ms: float):
+                self._local.embed = {"hit": hit, "ms": round(elapsed_ms, 2)}
+
+            def embed_stats(self) -> Optional[Dict[str, Any]]:
+                """CLIP cache outcome of the last image embedded on this thread"""
+                return getattr(self._local, "embed", None)
+
+            def attach(self, data: ImageBytes) -> str:
+                self._local.embed = None
+                with self._images_lock:
+                    url = f"{RAW_IMAGE_SCHEME}{next(self._image_ids)}"
+                    self._images[url] = data
+                return url
+
+            def detach(self, url: str):
+                with self._images_lock:
+                    self._images.pop(url, None)
+
+            def load_image(self, image_url: str) -> bytes:
+                if image_url.startswith(RAW_IMAGE_SCHEME):
+                    with self._images_lock:
+                        data = self._images[image_url]
+                    # Some llama-cpp-python versions hash the bytes, which
+                    # writable views (e.g. shared memory) do not support
+                    return data if isinstance(data, bytes) else bytes(data)
+                return super().load_image(image_url)
+
+        _handler_class = RawImageLlavaChatHandler
+
+    return _handler_class(clip_model_path=clip_model_path, verbose=verbose, embed_cache=embed_cache)
+
+
+def prepare_image(data: ImageBytes, max_side: Optional[int] = None) -> ImageBytes:
+    """
+    Downscale an image so its longest side is at most max_side
+
+    LLaVA's CLIP encoder works at a few hundred pixels, so shrinking large
+    photos ahead of time (e.g. on a worker thread) leaves CLIP a cheap
+    decode. JPEGs are decoded at reduced scale. Needs Pillow; without it,
+    or when the image is already small enough, the bytes are returned as-is.
+
+    Args:
+        data: Encoded image bytes
+        max_side: Longest side in pixels (None: no resizing)
+
+    Returns:
+        Encoded image bytes (JPEG when resized)
+    """
+    if not max_side:
+        return data
+    try:
+        from PIL import Image
+    except ImportError:
+        return data
+
+    with Image.open(io.BytesIO(data)) as source:
+        if max(source.size) <= max_side:
+            return data
+        source.draft("RGB", (max_side, max_side))
+        image = source.convert("RGB")
+    image.thumbnail((max_side, max_side), Image.BICUBIC)
+    out = io.BytesIO()
+    image.save(out, format="JPEG", quality=90)
+    return out.getvalue()
+
+
+@contextmanager
+def attach_image(chat_handler, data: ImageBytes) -> Iterator[str]:
+    """
+    Make image bytes available to a chat completion
+
+    Yields an image URL for an {"type": "image_url"} message part. With a
+    handler from create_llava_chat_handler() the bytes are handed to the
+    CLIP embedder as-is; any other handler gets a correctly labeled data URI.
+
+    Args:
+        chat_handler: The model's chat handler (llm.chat_handler)
+        data: Encoded image bytes (JPEG, PNG, ...)
+    """
+    attach = getattr(chat_handler, "attach", None)
+    if attach is None:
+        yield image_data_uri(data)
+        return
+
+    url = attach(data)
+    try:
+        yield url
+    finally:
+        chat_handler.detach(url)